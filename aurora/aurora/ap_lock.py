@@ -0,0 +1,118 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Per access point locks used to serialize dispatching to, and
+handling replies from, each access point.
+
+Threads waiting for the same access point are woken one at a time in
+the order they arrived, the lock is handed directly to the next
+waiter on release.  Access points do not share any waiting, so a busy
+access point never delays another::
+
+    locks = APLocks()
+    if not locks.acquire('ap1', timeout=5):
+        raise DispatchLockedForAPTimeout(ap='ap1')
+    try:
+        ...
+    finally:
+        locks.release('ap1')
+
+"""
+import collections
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class APLocks(object):
+    """A set of fair, non-reentrant locks keyed by access point
+    name.  ``ap_name in locks`` is true while the lock is held.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Notified whenever an access point's lock becomes free
+        self._released = threading.Condition(self._lock)
+        self._held = set()
+        # ap_name -> deque of threading.Event, one per waiting thread
+        self._waiters = {}
+
+    def __contains__(self, ap_name):
+        with self._lock:
+            return ap_name in self._held
+
+    def acquire(self, ap_name, timeout=None):
+        """Acquires the lock of an access point, waiting behind
+        earlier callers.
+
+        :param str ap_name:
+        :param float timeout: Seconds to wait, None waits forever
+        :returns: bool -- False if the timeout expired
+
+        """
+        with self._lock:
+            if ap_name not in self._held:
+                self._held.add(ap_name)
+                return True
+            turn = threading.Event()
+            self._waiters.setdefault(ap_name,
+                                     collections.deque()).append(turn)
+
+        if turn.wait(timeout):
+            return True
+
+        with self._lock:
+            waiters = self._waiters.get(ap_name)
+            if waiters is not None and turn in waiters:
+                waiters.remove(turn)
+                if not waiters:
+                    del self._waiters[ap_name]
+                return False
+        # The lock was handed over just as the wait timed out
+        return True
+
+    def release(self, ap_name):
+        """Hands the lock of an access point to the longest waiting
+        caller, or frees it.
+
+        :param str ap_name:
+
+        """
+        with self._lock:
+            if ap_name not in self._held:
+                LOGGER.warn("Released unlocked access point %s", ap_name)
+                return
+            waiters = self._waiters.get(ap_name)
+            if waiters:
+                waiters.popleft().set()
+                if not waiters:
+                    del self._waiters[ap_name]
+                return
+            self._held.discard(ap_name)
+            self._released.notify_all()
+
+    def wait_unlocked(self, ap_name, timeout=None):
+        """Waits until nobody holds or waits for the lock of an access
+        point, without taking it.
+
+        :param str ap_name:
+        :param float timeout: Seconds to wait, None waits forever
+        :returns: bool -- False if the timeout expired
+
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        with self._lock:
+            while ap_name in self._held:
+                if deadline is None:
+                    self._released.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self._released.wait(remaining)
+            return True
@@ -8,14 +8,12 @@ received messages.
 """
 
 
-import Queue
 import datetime
 import logging
 import json
 from pprint import pformat
 import sys
 import threading
-import time
 import traceback
 from types import *
 import uuid
@@ -23,8 +21,12 @@ import uuid
 from aurora import config_db
 from aurora.exc import *
 from aurora.cls_logger import get_cls_logger
+from aurora.config_versions import STATE_KEYS
 from aurora.ap_provision import writer as provision
+from aurora.poll_scheduler import PollScheduler
+from aurora.status_coalescer import StatusCoalescer
 from aurora.stop_thread import *
+from aurora.timeout_scheduler import TimeoutScheduler
 
 KB = 1024**1
 MB = 1024**2
@@ -35,8 +37,26 @@ LOGGER = logging.getLogger(__name__)
 class APMonitor(object):
     """Handles AMQP response messages from access points."""
     SLEEP_TIME = 45
+    #: Seconds between flushes of coalesced status updates
+    STATUS_FLUSH_INTERVAL = 0.5
+    #: Pending status updates which trigger an early flush
+    STATUS_FLUSH_SIZE = 200
+    #: Threads applying status updates, each to its own access points
+    STATUS_WORKERS = 4
+    #: Most access points waiting per status thread
+    STATUS_QUEUE_SIZE = 100
+    #: Attempts at applying the status updates of an access point in
+    #: one transaction, eg. after deadlocks, before applying them one
+    #: at a time
+    STATUS_APPLY_ATTEMPTS = 3
+    #: Telemetry intervals without a push after which an access point
+    #: is considered down
+    TELEMETRY_MISSED_LIMIT = 3
     # TODO: Make function to determine if dispatcher still exists
-    def __init__(self, dispatcher, aurora_db, host, username, password):
+    def __init__(self, dispatcher, aurora_db, host, username, password,
+                 poll_interval=None, poll_jitter=0.1,
+                 max_polls_per_second=None, poll_intervals=None,
+                 status_workers=None, status_queue_size=None):
         """Sets up and configures the environment required for message 
         passing using AMQP.  
 
@@ -45,86 +65,88 @@ class APMonitor(object):
         :param str host: RabbitMQ server IP 
         :param str username: RabbitMQ username 
         :param str password: RabbitMQ password 
+        :param float poll_interval: Seconds between stats polls of an 
+                                    access point, defaults to just over 
+                                    the dispatcher's reply timeout
+        :param float poll_jitter: Fraction by which poll intervals vary
+        :param float max_polls_per_second: None for no limit
+        :param dict poll_intervals: Intervals of specific access points
+        :param int status_workers: Threads applying status updates, no
+                                   more than the database pool holds
+        :param int status_queue_size: Most access points waiting per
+                                      status thread
 
         """
         self.LOGGER = get_cls_logger(self)
+        # One thread polls every access point, see poll_scheduler.  It
+        # must exist before the dispatcher can close the pollers.
+        if poll_interval is None:
+            poll_interval = dispatcher.TIMEOUT + 5
+        self.poll_intervals = poll_intervals or {}
+        self.pollers = PollScheduler(self.get_stats, poll_interval,
+                                     jitter=poll_jitter,
+                                     max_rate=max_polls_per_second)
+        self.pollers.start()
+        # Access points pushing telemetry are not polled, they are
+        # considered down if their pushes stop, see process_telemetry
+        self.telemetry_deadlines = TimeoutScheduler()
+        self.telemetry_deadlines.start()
+        self._telemetry_lapsed = set()
+        # ap -> slices whose config is saved once the full config of
+        # the access point is known again, see _request_full_config
+        self._unsaved_configs = {}
+
         # Configure dispatcher
         self.dispatcher = dispatcher
         self.dispatcher.set_timeout_callback(self.timeout)
         self.dispatcher.set_response_callback(self.process_response)
+        self.dispatcher.set_telemetry_callback(self.process_telemetry)
         self.dispatcher.set_close_pollers_callback(
-            self.close_all_poller_threads)
+            self.close_all_pollers)
         self.dispatcher.start_connection()
 
         self.aurora_db = aurora_db
         # self.ut = UptimeTracker(host, username, password)
-        self.poller_threads = {}
-
-        # To handle incoming status update requests, make a command queue
-        self.timeout_queue = Queue.Queue()
-        self._make_queue_daemon()
-
-    def _make_queue_daemon(self):
-        """Creates a queue daemon which watches for set_status calls
-        and adds them to a FIFO queue.  This ensures the _set_status
-        method does not get executed twice at the same time, which can
-        cause the manager to place slices in a confused state.
-
-        """
-        self.LOGGER.info("Creating Queue Daemon...")
-        self.qd = StoppableThread(target=self._watch_queue)
-        self.qd.start()
 
-    def _watch_queue(self, stop_event=None):
-        """Target for the queue daemon.
+        # Status updates are coalesced per AP and each AP is applied
+        # by a single thread, so _set_status never runs twice at the
+        # same time for one AP, which can cause the manager to place
+        # slices in a confused state.
+        self.LOGGER.info("Creating status coalescer...")
+        self.status_coalescer = StatusCoalescer(
+            self._apply_status_segments,
+            flush_interval=self.STATUS_FLUSH_INTERVAL,
+            flush_size=self.STATUS_FLUSH_SIZE,
+            workers=status_workers or self.STATUS_WORKERS,
+            queue_size=status_queue_size or self.STATUS_QUEUE_SIZE
+        )
+        self.status_coalescer.start()
 
-        Executes until stop_event is set.
+    def stop(self):
+        """Stops all threads created by AP Monitor."""
+        self.pollers.stop()
+        self.telemetry_deadlines.stop()
+        self.status_coalescer.stop()
 
-        :param threading.Event stop_event:
+    def close_all_pollers(self):
+        """Stops polling every access point, and waiting for their 
+        telemetry, which cannot arrive while the connection is down.
 
         """
-        while True:
-            # while len(self.timeout_queue) < 1 and not stop_event.is_set():
-            #     time.sleep(0.1)
-            if stop_event.is_set():
-                self.LOGGER.info("Queue Daemon caught stop event")
-                break
-            (args, kwargs) = self.timeout_queue.get()
-            self.LOGGER.debug("Queue Daemon is calling _set_status(%s, %s)",
-                args, kwargs
-            )
-            self._set_status(*args, **kwargs)
+        aps = self.pollers.remove_all()
+        self.telemetry_deadlines.cancel_all()
+        self.LOGGER.debug("Stopped polling %s", aps)
 
-    def _add_call_to_queue(self, *args, **kwargs):
-        """Writes a set_status call to the queue.
+    def stop_poller(self, ap_name):
+        """Stops polling a single access point, or waiting for its 
+        telemetry.
 
-        :param args: Arguments for set_status 
-        :param kwargs: Keyword arguments for set_status 
+        :param str ap_name: Name of the access point
 
         """
-        self.timeout_queue.put((args, kwargs))
-
-    def stop(self):
-        """Stops all threads created by AP Monitor."""
-        self.close_all_poller_threads()
-        self.qd.stop()
-
-    def close_all_poller_threads(self):
-        """Stops all the AP poller threads created by AP Monitor."""
-        self.LOGGER.debug("Closing all threads %s", self.poller_threads)
-        for ap_name in self.poller_threads.keys():
-            self._close_poller_thread(ap_name, 'admin')
-
-    def _close_poller_thread(self, ap_name, unique_id):
-        """Stops a single AP poller thread by ap_name."""
-        if ap_name in self.poller_threads and unique_id == 'admin':
-            poller_thread = self.poller_threads.pop(ap_name)
-            self.LOGGER.info("Stopping thread %s %s", ap_name, poller_thread)
-            poller_thread.stop()
-            try:
-                poller_thread.join()
-            except RuntimeError as e:
-                self.LOGGER.warn(e.message)
+        self.telemetry_deadlines.cancel(ap_name)
+        if self.pollers.remove(ap_name):
+            self.LOGGER.info("Stopped polling %s", ap_name)
 
 
     def _build_slice_id_ssid_map(self, config):
@@ -180,26 +202,43 @@ class APMonitor(object):
         entry = None
         
 
-        # Decode response
-        decoded_response = json.loads(body)
+        # Decode response, JSON unless the AP says otherwise
+        try:
+            decoded_response = self.dispatcher.decode_response(props, body)
+        except AuroraException as e:
+            self.LOGGER.warn(e.message)
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+            return
         message = decoded_response['message']
         ap_name = decoded_response['ap']
         config = decoded_response['config']
         region = config['region']
         self.LOGGER.info("Receiving from %s...", ap_name)
 
+        # Replies only carry what changed since the config version the
+        # manager holds, nothing is written unless something changed
+        (config, config_changed) = \
+            self.dispatcher.config_versions.resolve(ap_name, config)
+        config_known = config is not None
+        if config_known:
+            self._save_unsaved_configs(ap_name, config)
+        else:
+            # Nothing depending on the config is written until the
+            # full config is back, see _request_full_config
+            config = dict((key, {}) for key in STATE_KEYS)
+            config['region'] = region
+
         # Should wait for dispatcher to finish its dispatch method
         # before continuing.  It is possible to receive a response 
         # to a sent message before the message gets added to the
-        # requests_sent list.  Waiting here avoids needless AP reset.
+        # requests_sent registry.  Waiting here avoids needless AP reset.
         if ap_name in self.dispatcher.lock:
             self.LOGGER.info("Locked for %s, waiting...", ap_name)
-            while ap_name in self.dispatcher.lock:
-                time.sleep(0.1)
+            self.dispatcher.lock.wait_unlocked(ap_name)
 
         # First thing to do is cancel the timer, so an invalid timeout 
         # doesn't get triggered.
-        self.LOGGER.debug("\nSent requests: %s",self.dispatcher.requests_sent)
+        self.LOGGER.debug("Sent requests: %s", self.dispatcher.requests_sent)
         (have_request, entry) = self.dispatcher.have_request(
             props.correlation_id
         )
@@ -219,24 +258,31 @@ class APMonitor(object):
         self.LOGGER.debug("Pika channel: %s",channel)
         self.LOGGER.debug("Pika method: %s", method)
         self.LOGGER.debug(repr(props))
-        self.LOGGER.debug(json.dumps(json.loads(body), indent=4))
-        self.LOGGER.debug("\nSent requests: %s",self.dispatcher.requests_sent)
+        self.LOGGER.debug(json.dumps(decoded_response, indent=4))
 
         if message == 'SYN':
             #TODO: If previous message has been dispatched and we are waiting 
             #      for a response, cancel the timer and/or send the command again
             # AP has started, check if we need to recreate slices
             self.LOGGER.info("%s has connected...", ap_name)
-            self.aurora_db.ap_status_up(ap_name)
+            # Written in full once per session, in case the database
+            # was changed behind our back
+            self.aurora_db.ap_forget_reports(ap_name)
             self.dispatcher.remove_request(ap_syn=ap_name)
 
             slices_to_recreate = decoded_response['slices_to_recreate']
             self.recreate_slices(ap_name, slices_to_recreate)
-            provision.update_last_known_config(ap_name, config)
+            if config_changed:
+                provision.update_last_known_config(ap_name, config)
             self.aurora_db.ap_syn_clean_deleting_status(ap_name)
-            self.aurora_db.ap_update_hw_info(config['init_hardware_database'], 
-                                             ap_name, region)
-            self.start_poller(ap_name)
+            if config_changed:
+                self.aurora_db.ap_update_hw_info(
+                    config['init_hardware_database'], ap_name, region
+                )
+            # Queued behind any pending 'down', eg. from a timeout
+            self.set_status('AP up', ap_name=ap_name)
+            if not config_known:
+                self._request_full_config(ap_name)
             channel.basic_ack(delivery_tag=method.delivery_tag)
             return
 
@@ -246,20 +292,22 @@ class APMonitor(object):
                 self.LOGGER.warning("Warning: No request for received " +
                                     "'SYN/ACK' from %s", ap_name)
             
-            provision.update_last_known_config(ap_name, config)
-            self.aurora_db.ap_status_up(ap_name)
-            self.aurora_db.ap_update_hw_info(config['init_hardware_database'], 
-                                             ap_name, region)
+            if config_changed:
+                provision.update_last_known_config(ap_name, config)
+                self.aurora_db.ap_update_hw_info(
+                    config['init_hardware_database'], ap_name, region
+                )
 
             self.aurora_db.ap_syn_clean_deleting_status(ap_name)
-            for ap_slice_id in (ap_slice_id for ap_slice_id in \
-                    config['init_database'].keys() if \
-                    ap_slice_id != 'default_slice'):
-                try:
-                    self.aurora_db.ap_slice_status_up(ap_slice_id)
-                except AuroraException as e:
-                    self.LOGGER.warn(e.message)
-            self.start_poller(ap_name)
+            self.set_status(
+                'AP up', ap_name=ap_name,
+                ap_slice_ids=[ap_slice_id for ap_slice_id in
+                              config['init_database'].keys() if
+                              ap_slice_id != 'default_slice']
+            )
+            if not config_known:
+                # The stats in the reply set its slices 'ACTIVE'
+                self._request_full_config(ap_name)
             channel.basic_ack(delivery_tag=method.delivery_tag)
             return
 
@@ -268,12 +316,13 @@ class APMonitor(object):
             self.LOGGER.info("%s is shutting down...", ap_name)
             try:
                 self.set_status(None, None, None, False, ap_name)
-                self.aurora_db.ap_update_hw_info(
-                    config['init_hardware_database'], 
-                    ap_name, region)
-                # self.aurora_db.ap_status_down(ap_name)
-                self.LOGGER.info("Updating config files...")
-                provision.update_last_known_config(ap_name, config)
+                if config_changed:
+                    self.aurora_db.ap_update_hw_info(
+                        config['init_hardware_database'], 
+                        ap_name, region)
+                    # self.aurora_db.ap_status_down(ap_name)
+                    self.LOGGER.info("Updating config files...")
+                    provision.update_last_known_config(ap_name, config)
             except Exception as e:
                 self.LOGGER.error(e.message)
             self.LOGGER.debug("Last known config:")
@@ -289,10 +338,11 @@ class APMonitor(object):
             self.LOGGER.debug(message)
 
             # For each slice in the returned message, determine its SSID
-            # to update the SQL database.  Update SSID for each slice.
-            slice_id_ssid_map = self._build_slice_id_ssid_map(config)
-            for ap_slice_id, slice_ssid in slice_id_ssid_map.iteritems():
-                self.aurora_db.ap_slice_set_ssid(ap_slice_id, slice_ssid)
+            # to update the SQL database.  Only changed SSIDs are written.
+            if config_changed:
+                slice_id_ssid_map = self._build_slice_id_ssid_map(config)
+                self.aurora_db.ap_update_slice_ssids(ap_name, 
+                                                     slice_id_ssid_map)
 
             # Set status
             if request_subject is not None and request_subject != 'admin':
@@ -301,31 +351,21 @@ class APMonitor(object):
                 self.set_status(None, ap_slice_id, 
                                 successful, 
                                 ap_name=ap_name)
-                self.aurora_db.ap_update_hw_info(
-                    config['init_hardware_database'], 
-                    ap_name, region
-                )
-                
-                self.LOGGER.info("Updating config files...")
-                provision.update_last_known_config(ap_name, config)
-                self.LOGGER.info("Updating config_db for slice %s", 
-                                 ap_slice_id)
-                slice_cfg = config['init_database'].get(ap_slice_id)
-                slice_tenant = None
-                for tenant_id, slice_list in \
-                        config["init_user_id_database"].iteritems():
-                    if ap_slice_id in slice_list:
-                        slice_tenant = tenant_id
-                        break
-
-                try:
-                    # TODO(Mike) Don't save if request unsuccessful
-                    if successful:
-                        config_db.save_config(slice_cfg, 
-                                              ap_slice_id, 
-                                              slice_tenant)
-                except AuroraException as e:
-                    LOGGER.error(e.message)
+                if config_changed:
+                    self.aurora_db.ap_update_hw_info(
+                        config['init_hardware_database'], 
+                        ap_name, region
+                    )
+                    
+                    self.LOGGER.info("Updating config files...")
+                    provision.update_last_known_config(ap_name, config)
+                # TODO(Mike) Don't save if request unsuccessful
+                if successful and config_known:
+                    self._save_slice_config(ap_slice_id, config)
+                elif successful:
+                    self._unsaved_configs.setdefault(
+                        ap_name, set()
+                    ).add(ap_slice_id)
                 
             else:
                 if message == 'AP reset':
@@ -334,11 +374,15 @@ class APMonitor(object):
                     pass
                 else:
                     self.set_status('slice_stats', 
-                                    ap_slice_stats=message["ap_slice_stats"])
-                    self.aurora_db.ap_update_hw_info(
-                        config['init_hardware_database'], 
-                        ap_name, region
-                    )
+                                    ap_slice_stats=message["ap_slice_stats"],
+                                    ap_name=ap_name)
+                    if config_changed:
+                        self.aurora_db.ap_update_hw_info(
+                            config['init_hardware_database'], 
+                            ap_name, region
+                        )
+            if not config_known:
+                self._request_full_config(ap_name)
 
         else:
             self.LOGGER.info("Sending reset to '%s'", ap_name)
@@ -348,6 +392,127 @@ class APMonitor(object):
         # Regardless of content of message, acknowledge receipt of it
         channel.basic_ack(delivery_tag=method.delivery_tag)
 
+    def _save_slice_config(self, ap_slice_id, config):
+        """Saves the config of a slice to the config_db.
+
+        :param str ap_slice_id:
+        :param dict config: Full config of the slice's access point
+
+        """
+        self.LOGGER.info("Updating config_db for slice %s", ap_slice_id)
+        slice_cfg = config['init_database'].get(ap_slice_id)
+        slice_tenant = None
+        for tenant_id, slice_list in \
+                config["init_user_id_database"].iteritems():
+            if ap_slice_id in slice_list:
+                slice_tenant = tenant_id
+                break
+
+        try:
+            config_db.save_config(slice_cfg, ap_slice_id, slice_tenant)
+        except AuroraException as e:
+            LOGGER.error(e.message)
+
+    def _save_unsaved_configs(self, ap_name, config):
+        """Saves the configs of the slices which changed while the
+        config of their access point could not be rebuilt.
+
+        :param str ap_name:
+        :param dict config: Full config of the access point
+
+        """
+        for ap_slice_id in self._unsaved_configs.pop(ap_name, ()):
+            self._save_slice_config(ap_slice_id, config)
+
+    def _request_full_config(self, ap_name):
+        """Asks an access point for its full config, after a config it
+        sent could not be rebuilt, see
+        :func:`aurora.config_versions.ConfigVersions.resolve`.  The
+        versions of the access point were dropped, so the request
+        carries version -1 and its stats reply the full config.
+
+        :param str ap_name:
+
+        """
+        self.LOGGER.info("Requesting the full config of %s", ap_name)
+        self.get_stats(ap_name)
+
+    def process_telemetry(self, channel, method, props, body):
+        """Handles stats pushed by an access point to the telemetry 
+        queue, see :func:`aurora.dispatcher.Dispatcher.\
+        set_telemetry_callback`.  Pushes are not replies: they are 
+        consumed without acknowledgement and do not go through the 
+        dispatcher's requests, timers or locks.
+
+        An access point which pushes is no longer polled, and is 
+        considered down after :attr:`TELEMETRY_MISSED_LIMIT` intervals 
+        without a push.  If it pushes again before announcing itself 
+        with a 'SYN', it is reset as for an unexpected reply.
+
+        Pushes carry the changes since the config version pushed last.  
+        If those cannot be rebuilt, the full config is requested.
+
+        :param pika.channel.Channel channel:
+        :param pika.frame.Method.method method:
+        :param pika.frame.Header.properties props:
+        :param str body:
+
+        """
+        try:
+            decoded_response = self.dispatcher.decode_response(props, body)
+        except AuroraException as e:
+            self.LOGGER.warn(e.message)
+            return
+        message = decoded_response['message']
+        ap_name = decoded_response['ap']
+        interval = decoded_response.get('interval')
+        config = decoded_response['config']
+        region = config['region']
+        self.LOGGER.debug("Telemetry %s from %s",
+                          decoded_response.get('sequence'), ap_name)
+
+        (config, config_changed) = \
+            self.dispatcher.config_versions.resolve(ap_name, config)
+
+        if ap_name in self._telemetry_lapsed:
+            self._telemetry_lapsed.discard(ap_name)
+            self.LOGGER.info("Sending reset to '%s'", ap_name)
+            self.reset_AP(ap_name)
+            return
+
+        if config is None:
+            self._request_full_config(ap_name)
+        else:
+            self._save_unsaved_configs(ap_name, config)
+
+        if self.pollers.remove(ap_name):
+            self.LOGGER.info("%s pushes telemetry, no longer polling it",
+                             ap_name)
+        if interval:
+            self.telemetry_deadlines.schedule(
+                ap_name, interval * self.TELEMETRY_MISSED_LIMIT,
+                self._telemetry_lapsed_for, args=(ap_name,)
+            )
+
+        self.set_status('slice_stats',
+                        ap_slice_stats=message["ap_slice_stats"],
+                        ap_name=ap_name)
+        if config_changed:
+            self.aurora_db.ap_update_hw_info(
+                config['init_hardware_database'], ap_name, region
+            )
+
+    def _telemetry_lapsed_for(self, ap_name):
+        """Marks an access point down once its pushes have stopped.
+
+        :param str ap_name:
+
+        """
+        self.LOGGER.warn("No telemetry from %s for %s intervals",
+                         ap_name, self.TELEMETRY_MISSED_LIMIT)
+        self._telemetry_lapsed.add(ap_name)
+        self.set_status(None, None, None, False, ap_name)
+
     def timeout(self, ap_slice_id, ap_name, message_uuid=None):
         """This code will execute when a response is not received for 
         the command associated with the unique_id after a certain time 
@@ -386,64 +551,116 @@ class APMonitor(object):
 
         """
         self.LOGGER.debug("Updating records...")
+        slice_mb_sent = {}
         for ap_slice_id in message.keys():
-            try:
-                self.aurora_db.ap_slice_status_up(ap_slice_id)
-            except Exception:
-                traceback.print_exc(file=sys.stdout)
-
-            try:
-                self.aurora_db.ap_slice_update_time_stats(
-                    ap_slice_id=ap_slice_id
-                )
-            except Exception:
-                traceback.print_exc(file=sys.stdout)
+            slice_mb_sent[ap_slice_id] = float(message.get(ap_slice_id))/MB
+        try:
+            self.aurora_db.ap_slice_bulk_update_stats(slice_mb_sent)
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
 
-            try:
-                self.aurora_db.ap_slice_update_mb_sent(
-                    ap_slice_id, 
-                    float(message.get(ap_slice_id))/MB
-                )
-            except Exception:
-                traceback.print_exc(file=sys.stdout)
-            
     def set_status(self, cmd_category, *args, **kwargs):
-        """Adds a call to the set_status queue, to be processes in order 
-        of set_status calls.
+        """Queues a status update for the access point it concerns.
+        Updates are coalesced and applied in order of set_status calls
+        by :class:`aurora.status_coalescer.StatusCoalescer`.
 
         :param cmd_category: Determines which set_status method should 
-            run, can be one of ``[None, "AP reset", "slice_stats"]``
+            run, can be one of ``[None, "AP reset", "AP up", 
+            "slice_stats"]``
         :param args: Arguments
         :param kwargs: Keyword Arguments
 
         """
         self.LOGGER.debug("Adding set_status call to queue for (%s, %s)", 
                           args, kwargs)
-        self._add_call_to_queue(cmd_category, *args, **kwargs)
+        if cmd_category == 'slice_stats':
+            ap_name = kwargs.get('ap_name')
+            kind = 'stats'
+            payload = kwargs.get('ap_slice_stats') or {}
+        elif cmd_category == 'AP up':
+            ap_name = kwargs.get('ap_name')
+            kind = 'up'
+            payload = list(kwargs.get('ap_slice_ids') or ())
+        else:
+            (unique_id, success, ap_up, ap_name) = \
+                self._status_args(*args, **kwargs)
+            if cmd_category == 'AP reset':
+                kind = 'reset'
+                payload = ap_up
+            elif ap_up:
+                kind = 'result'
+                payload = [(unique_id, success)]
+            else:
+                kind = 'down'
+                payload = None if ap_name is not None else unique_id
+        self.status_coalescer.submit(ap_name, kind, payload)
+
+    def _status_args(self, unique_id, success, ap_up=True, ap_name=None):
+        """Binds the arguments of a standard or AP reset set_status
+        call.
 
-    def _set_status(self, cmd_category, *args, **kwargs):
-        """Sets the status of the associated request in the
+        :rtype: tuple -- (unique_id, success, ap_up, ap_name)
+
+        """
+        return (unique_id, success, ap_up, ap_name)
+
+    def _apply_status_segments(self, ap_name, segments):
+        """Sets the status of the associated requests in the
         database based on the previous status, i.e. pending -> active if
         create slice, deleting -> deleted if deleting a slice, etc.
-        If the ap_up variable is false, the access point
-        is considered to be offline and in an unknown state,
-        so \*all\* slices are marked as such (down, failed, etc.).
+        If the access point is down, it is considered to be offline and
+        in an unknown state, so \*all\* slices are marked as such
+        (down, failed, etc.).
 
-        :param cmd_category: Determines which set_status method should 
-            run, can be one of ``[None, "AP reset", "slice_stats"]``
-        :param args: Arguments
-        :param kwargs: Keyword Arguments
+        All the coalesced updates of an access point are applied in a
+        single transaction, which is retried as a whole if any
+        statement fails, eg. on a deadlock.  If it keeps failing, the
+        updates are applied one per transaction, so only those which
+        fail are lost.  Pollers are only started or stopped once the
+        transaction which changed the access point's status commits.
 
-        """
-        self.LOGGER.debug("Set status cmd category %s", cmd_category)
-        if cmd_category is None:
-            self._set_status_standard(*args, **kwargs)
-        elif cmd_category == 'AP reset':
-            self._set_status_reset(*args, **kwargs)
-        elif cmd_category == 'slice_stats':
-            self._set_status_stats(*args, **kwargs)
+        :param str ap_name:
+        :param list segments: ``[kind, payload]`` pairs, see
+                              :mod:`aurora.status_coalescer`
+        :returns: int -- Number of segments which could not be applied
 
-        return True
+        """
+        for attempt in range(self.STATUS_APPLY_ATTEMPTS):
+            try:
+                with self.aurora_db.pool.cursor(atomic=True):
+                    for segment in segments:
+                        self._apply_status_segment(ap_name, segment)
+                return 0
+            except DatabaseTransactionRolledBack as e:
+                self.LOGGER.warn("Status updates of %s rolled back: %s",
+                                 ap_name, e.message)
+
+        failed = 0
+        for segment in segments:
+            try:
+                with self.aurora_db.pool.cursor(atomic=True):
+                    self._apply_status_segment(ap_name, segment)
+            except DatabaseTransactionRolledBack as e:
+                self.LOGGER.error("Status update %s of %s lost: %s",
+                                  segment[0], ap_name, e.message)
+                failed += 1
+        return failed
+
+    def _apply_status_segment(self, ap_name, segment):
+        """Applies one segment, see :func:`_apply_status_segments`."""
+        (kind, payload) = segment
+        self.LOGGER.debug("Set status %s for %s", kind, ap_name)
+        if kind == 'stats':
+            self._set_status_stats(payload)
+        elif kind == 'reset':
+            self._set_status_reset(None, None, payload, ap_name)
+        elif kind == 'result':
+            for (unique_id, success) in payload:
+                self._set_status_standard(unique_id, success, True, ap_name)
+        elif kind == 'down':
+            self._set_status_standard(payload, False, False, ap_name)
+        elif kind == 'up':
+            self._set_status_up(ap_name, payload)
 
     def _set_status_stats(self, ap_slice_stats=None):
         """Sets the stats returned from an access point for its 
@@ -478,6 +695,25 @@ class APMonitor(object):
             self.LOGGER.error(e.message)
 
 
+    def _set_status_up(self, ap_name, ap_slice_ids):
+        """Executed once an access point announced itself with a 'SYN'
+        or answered one, after any earlier update of its status.
+
+        :param str ap_name:
+        :param list ap_slice_ids: Slices known to be running on it
+
+        """
+        try:
+            self.aurora_db.ap_status_up(ap_name)
+            for ap_slice_id in ap_slice_ids:
+                try:
+                    self.aurora_db.ap_slice_status_up(ap_slice_id)
+                except AuroraException as e:
+                    self.LOGGER.warn(e.message)
+        except Exception as e:
+            self.LOGGER.error(str(e))
+        self.aurora_db.pool.after_commit(lambda: self.start_poller(ap_name))
+
     def _set_status_standard(self, unique_id, success, 
                              ap_up=True, ap_name=None):
         """The standard case for set status, this method takes care 
@@ -523,13 +759,15 @@ class APMonitor(object):
                 # Access point down, mark all slices and failed/down
                 if ap_name is None:
                     ap_name = self.aurora_db.get_wslice_physical_ap(
-                        ap_slice_id
+                        unique_id
                     )
                 self.aurora_db.ap_slice_update_time_stats(ap_name=ap_name, 
                                                           ap_down=True)
                 self.aurora_db.ap_status_down(ap_name)
                 self.aurora_db.ap_down_slice_status_update(ap_name)
-                self._close_poller_thread(ap_name, 'admin')
+                self.aurora_db.pool.after_commit(
+                    lambda: self.stop_poller(ap_name)
+                )
 
         except Exception, e:
             self.LOGGER.error(str(e))
@@ -545,6 +783,7 @@ class APMonitor(object):
 
         """
         try:
+            messages = []
             for ap_slice_id in slice_list:
                 tenant_id = self.aurora_db.get_tenant_for_active_ap_slice(
                     ap_slice_id
@@ -554,60 +793,32 @@ class APMonitor(object):
                     self.LOGGER.info("%s for tenant %s", 
                                      ap_slice_id, tenant_id)
                     self.LOGGER.info("Recreating %s", ap_slice_id)
-                    self.dispatcher.dispatch({'slice': ap_slice_id,
-                                              'command': 'recreate_slice',
-                                              'user': tenant_id
-                                             },
-                                             ap)
+                    messages.append(({'slice': ap_slice_id,
+                                      'command': 'recreate_slice',
+                                      'user': tenant_id
+                                     },
+                                     ap, None))
                 else:
                     self.LOGGER.warn("No active slice %s", ap_slice_id)
+            if messages:
+                self.dispatcher.dispatch_many(messages)
         except Exception, e:
             traceback.print_exc(file=sys.stdout)
 
     def start_poller(self, ap_name):
-        """Starts a poller to track the status of an access point.
+        """Starts polling an access point for its slice stats.
 
         :param str ap_name: Name of the access point
 
         """
-        poller_thread = self.poller_threads.get(ap_name)
-        if poller_thread is None:
-            poller_thread = TimerThread(target=self.poll_AP, args=(ap_name,))
-            self.LOGGER.info("Starting poller for %s on thread %s", 
-                             ap_name, poller_thread)
-            self.poller_threads[ap_name] = poller_thread
-            poller_thread.start()
+        # The access point announced itself, pushes are expected again
+        self._telemetry_lapsed.discard(ap_name)
+        interval = self.poll_intervals.get(ap_name)
+        if self.pollers.add(ap_name, interval):
+            self.LOGGER.info("Polling %s every %ss", ap_name,
+                             interval or self.pollers.interval)
         else:
-            self.LOGGER.info("Poller thread for %s exists as %s", 
-                             ap_name, poller_thread)
-
-    def poll_AP(self, ap_name, stop_event=None):
-        """Poller thread target: sends the access point a message in a 
-        regular interval.  Stopped when stop_event is set, typically 
-        when an access point goes offline.
-
-        :param str ap_name: Name of the access point
-        :param threading.Event stop_event:
-
-        """
-        #print "Timeout from Dispatcher", self.dispatcher.TIMEOUT
-        STOP_EVENT_CHECK_INTERVAL = 0.2
-        own_thread = self.poller_threads[ap_name]
-        while ap_name in self.poller_threads:
-            try:
-                self.get_stats(ap_name)
-            except AuroraException as e:
-                self.LOGGER.warn(e.message)
-            for i in range(int((self.dispatcher.TIMEOUT + 5)/STOP_EVENT_CHECK_INTERVAL)):
-                if stop_event.is_set():
-                    self.LOGGER.debug("Caught stop event for %s", own_thread)
-                    break
-                time.sleep(STOP_EVENT_CHECK_INTERVAL)
-            if stop_event.is_set():
-                self.LOGGER.debug("Poller thread for %s is dying now" % 
-                                   ap_name)
-                break
-            self.LOGGER.debug("%s thread is %s", ap_name, own_thread)
+            self.LOGGER.debug("Already polling %s", ap_name)
 
     def reset_AP(self, ap):
         """Reset the access point.  If there are serious issues, however,
@@ -3,13 +3,28 @@
 #              Mike Kobierski and Hoai Phuoc Truong
 #
 
+import functools
 import json
 import logging
 import os
 from pprint import pformat
+import threading
 
 LOGGER = logging.getLogger(__name__)
 
+# Every update reads and may rewrite any provision file, and replies
+# are handled by several threads
+_lock = threading.Lock()
+
+
+def _locked(func):
+    """Runs ``func`` with the provision files lock held."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            return func(*args, **kwargs)
+    return wrapper
+
 
 def get_json_files():
     provision_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'json')
@@ -20,6 +35,7 @@ def get_json_files():
             result.append(os.path.join(provision_dir, fname))
     return result
 
+@_locked
 def update_reply_queue(reply_queue):
     flist = get_json_files()
     for fname in flist:
@@ -29,6 +45,18 @@ def update_reply_queue(reply_queue):
         with open(fname, 'w') as CONFIG_FILE:
             json.dump(config, CONFIG_FILE, indent=4)   
 
+@_locked
+def update_telemetry(telemetry_queue, telemetry_interval):
+    flist = get_json_files()
+    for fname in flist:
+        with open(fname, 'r') as CONFIG_FILE:
+            config = json.load(CONFIG_FILE)
+        config['rabbitmq_telemetry_queue'] = telemetry_queue
+        config['telemetry_interval'] = telemetry_interval
+        with open(fname, 'w') as CONFIG_FILE:
+            json.dump(config, CONFIG_FILE, indent=4)
+
+@_locked
 def update_last_known_config(ap, config):
     flist = get_json_files()
     ap_config_name = None
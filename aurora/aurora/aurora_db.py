@@ -19,12 +19,34 @@ import MySQLdb as mdb
 
 import config
 
+from aurora import db_pool
+from aurora import metering_history
 from aurora import query_agent as query
 from aurora.cls_logger import get_cls_logger
 from aurora.exc import *
+from aurora.slice_cache import SLICE_FIELDS, SliceCache
 
 LOGGER = logging.getLogger(__name__)
 
+#: Columns of the ap table set from hardware reports, see
+#: :func:`AuroraDB.ap_update_hw_info`
+HW_COLUMNS = ('region', 'firmware', 'version', 'number_radio',
+              'memory_mb', 'free_disk', 'number_radio_free',
+              'number_slice_free')
+
+
+def seconds_to_duration(seconds):
+    """Converts a duration stored in the metering table as a
+    number of seconds for display.
+
+    :param int seconds:
+    :rtype: :class:`datetime.timedelta`
+
+    """
+    if seconds is None:
+        return None
+    return datetime.timedelta(seconds=int(seconds))
+
 
 class AuroraDB(object):
     """The AuroraDB class handles interaction with the SQL database."""
@@ -34,13 +56,19 @@ class AuroraDB(object):
                  mysql_host,
                  mysql_username,
                  mysql_password,
-                 mysql_db):
+                 mysql_db,
+                 cache_size=4096,
+                 cache_ttl=30):
         """Create a new instance of AuroraDB object.
 
         :param str mysql_host:
         :param str mysql_username:
         :param str mysql_password:
         :param str mysql_db: 
+        :param int cache_size: Maximum number of slices kept by the
+                               slice lookup cache
+        :param float cache_ttl: Seconds before a cached slice is
+                                read from the database again
 
         """
         self.LOGGER = get_cls_logger(self)
@@ -51,19 +79,81 @@ class AuroraDB(object):
         self.mysql_username = mysql_username
         self.mysql_password = mysql_password
         self.mysql_db = mysql_db
+        self.pool = db_pool.get_pool(mysql_host, mysql_username,
+                                     mysql_password, mysql_db)
+        self.slice_cache = SliceCache(max_size=cache_size, ttl=cache_ttl)
+        # Last hardware columns and slice SSIDs written for each access
+        # point, so reports which change nothing cause no writes.  The
+        # entries of an access point are only used by the thread
+        # handling its replies.
+        self._hw_fingerprints = {}
+        self._ssid_fingerprints = {}
 
     def __del__(self):
         self.LOGGER.info("Destructing AuroraDB...")
 
     def _database_connection(self):
-        """Returns a handle for MySQL database access using 
+        """Returns a cursor context on a pooled connection using
         credentials assigned when AuroraDB instance was created.
 
-        :rtype: :class:`MySQLdb.Connection`
+        Nested calls from the same thread share one connection and
+        transaction, committed when the outermost block exits.
+
+        :rtype: :class:`aurora.db_pool.PooledCursor`
+
+        """
+        return self.pool.cursor()
+
+    def _get_slice_record(self, ap_slice_id):
+        """Returns the ownership and placement columns of a slice,
+        from :attr:`slice_cache` when possible.
+
+        :param str ap_slice_id:
+        :returns: dict -- Keys of :data:`aurora.slice_cache.SLICE_FIELDS`,
+                  or None if the slice does not exist
+        :raises: :class:`MySQLdb.Error`
 
         """
-        return mdb.connect(self.mysql_host, self.mysql_username,
-                           self.mysql_password, self.mysql_db)
+        record = self.slice_cache.get(ap_slice_id)
+        if record is not None:
+            return record
+        generation = self.slice_cache.generation
+        with self._database_connection() as db:
+            db.execute("SELECT " + ", ".join(SLICE_FIELDS) + " FROM "
+                       "ap_slice WHERE ap_slice_id=%s", (ap_slice_id,))
+            row = db.fetchone()
+        if row is None:
+            return None
+        record = dict(zip(SLICE_FIELDS, row))
+        self.slice_cache.put(ap_slice_id, record, generation)
+        return record
+
+    def _invalidate_slices(self, *ap_slice_ids):
+        """Drops slices from :attr:`slice_cache` now, and again once
+        the transaction writing them ends, so a lookup which read them
+        before the write was committed does not keep them cached.
+
+        :param str ap_slice_ids:
+
+        """
+        self.slice_cache.invalidate(*ap_slice_ids)
+        self.pool.after_commit(
+            lambda: self.slice_cache.invalidate(*ap_slice_ids),
+            on_rollback=True
+        )
+
+    def _invalidate_ap(self, ap_name):
+        """Drops the slices of an access point from
+        :attr:`slice_cache`, see :func:`_invalidate_slices`.
+
+        :param str ap_name:
+
+        """
+        self.slice_cache.invalidate_ap(ap_name)
+        self.pool.after_commit(
+            lambda: self.slice_cache.invalidate_ap(ap_name),
+            on_rollback=True
+        )
 
     def _count_db_slices(self, radio_list):
         """Counts the number of slices in given a radio config
@@ -93,7 +183,7 @@ class AuroraDB(object):
             raise InvalidAPNameType()
         try:
             with self._database_connection() as db:
-                db.execute("""INSERT INTO ap SET name='%s'""" % ap_name)
+                db.execute("INSERT INTO ap SET name=%s", (ap_name,))
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
 
@@ -116,11 +206,8 @@ class AuroraDB(object):
         else:
             try:
                 with self._database_connection() as db:
-                    to_execute = ("""REPLACE INTO location_tags VALUES 
-                                         ('%s', '%s')""" %
-                                         (tag, ap_name)
-                                 )
-                    db.execute(to_execute)
+                    db.execute("REPLACE INTO location_tags VALUES (%s, %s)",
+                               (tag, ap_name))
                     return "Added tag '%s' to AP '%s'.\n" % (tag, ap_name)
             except mdb.Error as e:
                 err_msg = "Error %d: %s\n" % (e.args[0], e.args[1])
@@ -139,8 +226,8 @@ class AuroraDB(object):
         self.LOGGER.info("Setting %s status 'UP'", ap_name)
         try:
             with self._database_connection() as db:
-                db.execute("UPDATE ap SET status='UP' WHERE name='%s'" %
-                                (ap_name))
+                db.execute("UPDATE ap SET status='UP' WHERE name=%s",
+                           (ap_name,))
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
 
@@ -156,8 +243,8 @@ class AuroraDB(object):
         self.LOGGER.info("Setting %s status 'DOWN'", ap_name)
         try:
             with self._database_connection() as db:
-                db.execute("UPDATE ap SET status='DOWN' WHERE name='%s'" 
-                            % (ap_name))
+                db.execute("UPDATE ap SET status='DOWN' WHERE name=%s",
+                           (ap_name,))
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
 
@@ -175,30 +262,41 @@ class AuroraDB(object):
                 if ap_name is None:
                     db.execute("UPDATE ap SET status='UNKNOWN'")
                 else:
-                    db.execute("UPDATE ap SET status='UNKNOWN' WHERE name='%s'"
-                                % (ap_name))
+                    db.execute("UPDATE ap SET status='UNKNOWN' WHERE name=%s",
+                               (ap_name,))
 
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
 
-    def _get_time_format(self, time):
-        """Helper method to create a standardized time format.
-        Input parameter is a :class:`datetime.timedelta`.
+    def _time_stats_assignments(self, now):
+        """Returns the ``SET`` assignments which record the current
+        time and bring a slice's uptime in the metering table up to
+        date, along with their query parameters.  Durations are
+        counted in whole seconds by MySQL.
 
-        :param :class:`datetime.timedelta` time:
-        :rtype: str
+        A slice which was never activated has its activation time set
+        to now and accrues no uptime.  MySQL assigns columns left to
+        right, so both durations are computed from the timestamps
+        before they are moved to now.
+
+        :param :class:`datetime.datetime` now:
+        :rtype: tuple -- (str, list)
 
         """
-        time = time.total_seconds()
-        hours = int(time // 3600)
-        time = time - hours * 3600
-        minutes = int(time // 60)
-        time = time - minutes * 60
-        seconds = int(time)
-        microseconds = int((time - seconds) * 1000000)
-        time_format = '%s:%s:%s.%s' % (str(hours), str(minutes), 
-                                       str(seconds), str(microseconds))
-        return time_format
+        assignments = """current_active_seconds=
+                      IF(last_time_activated IS NULL,
+                         current_active_seconds,
+                         TIMESTAMPDIFF(SECOND, last_time_activated, %s)),
+                  total_active_seconds=
+                      IF(last_time_activated IS NULL,
+                         total_active_seconds,
+                         total_active_seconds + TIMESTAMPDIFF(SECOND,
+                             COALESCE(last_time_updated,
+                                      last_time_activated),
+                             %s)),
+                  last_time_activated=COALESCE(last_time_activated, %s),
+                  last_time_updated=%s"""
+        return (assignments, [now] * 4)
 
     def ap_slice_set_physical_ap(self, ap_slice_id, ap_name):
         """Sets the physical_ap column entry for a slice.
@@ -211,12 +309,13 @@ class AuroraDB(object):
             with self._database_connection() as db:
                 db.execute(
                     """UPDATE ap_slice SET
-                               physical_ap='%s'
-                           WHERE ap_slice_id='%s'""" %
+                               physical_ap=%s
+                           WHERE ap_slice_id=%s""",
                        (ap_name, ap_slice_id)
                 )
         except Exception as e:
             traceback.print_exc(file=sys.stdout)
+        self._invalidate_slices(ap_slice_id)
 
     def ap_slice_set_ssid(self, ap_slice_id, new_ssid):
         """Sets the physical_ap column entry for a slice.
@@ -229,15 +328,55 @@ class AuroraDB(object):
             with self._database_connection() as db:
                 self.LOGGER.debug("Setting '%s' SSID: %s", 
                                   ap_slice_id, new_ssid)
-                to_execute = ("""UPDATE ap_slice SET
-                               ap_slice_ssid='%s'
-                           WHERE ap_slice_id='%s'""" %
-                       (new_ssid.replace("'", "\\'"), ap_slice_id))
-                self.LOGGER.debug(to_execute)
-                db.execute(to_execute)
+                db.execute("""UPDATE ap_slice SET
+                                  ap_slice_ssid=%s
+                              WHERE ap_slice_id=%s""",
+                           (new_ssid, ap_slice_id))
         except Exception as e:
             traceback.print_exc(file=sys.stdout)
+        self._invalidate_slices(ap_slice_id)
+
+    def ap_update_slice_ssids(self, ap_name, ssid_map):
+        """Sets the SSIDs reported by an access point for its slices,
+        writing only those which changed since its last report.
+
+        :param str ap_name:
+        :param dict ssid_map: SSID of each ap_slice_id
+        :returns: int -- Number of slices updated
+
+        """
+        previous = self._ssid_fingerprints.get(ap_name, {})
+        changed = [(ssid, ap_slice_id) for (ap_slice_id, ssid) in
+                   ssid_map.iteritems() if previous.get(ap_slice_id) != ssid]
+        if changed:
+            try:
+                with self._database_connection() as db:
+                    self.LOGGER.debug("Setting SSIDs of %s: %s", 
+                                      ap_name, changed)
+                    db.executemany("""UPDATE ap_slice SET
+                                          ap_slice_ssid=%s
+                                      WHERE ap_slice_id=%s""",
+                                   changed)
+            except Exception as e:
+                traceback.print_exc(file=sys.stdout)
+                self._ssid_fingerprints.pop(ap_name, None)
+                return 0
+            finally:
+                self._invalidate_slices(
+                    *[ap_slice_id for (ssid, ap_slice_id) in changed]
+                )
+        self._ssid_fingerprints[ap_name] = dict(ssid_map)
+        return len(changed)
+
+    def ap_forget_reports(self, ap_name):
+        """Drops what is known of an access point's last reports, so
+        the next ones are written in full, eg. after it restarted.
+
+        :param str ap_name:
 
+        """
+        self._hw_fingerprints.pop(ap_name, None)
+        self._ssid_fingerprints.pop(ap_name, None)
 
     def ap_slice_update_time_stats(self, ap_slice_id=None, 
                                    ap_name=None, ap_down=False):
@@ -246,7 +385,13 @@ class AuroraDB(object):
 
         If the slice ID is the only parameter given, only that
         slice is updated.  Otherwise, all the slices on the
-        access point in question will be updated.
+        access point in question will be updated with a single
+        statement.
+
+        The uptime accrued since the previous update is also appended
+        to the ``metering_samples`` history in the same transaction,
+        as in :func:`ap_slice_bulk_update_stats`, so the history adds
+        up to the metering totals, eg. when an access point goes down.
 
         .. note::
 
@@ -263,92 +408,52 @@ class AuroraDB(object):
         self.LOGGER.debug("Updating time stats for %s", 
                           (ap_slice_id or ap_name))
         if ap_name is not None:
-            slice_list = self.get_physical_ap_slices(ap_name, 
-                                                     not_deleted_only=True)
+            criteria = """ap_slice_id IN
+                              (SELECT ap_slice_id FROM ap_slice
+                                   WHERE physical_ap=%s AND
+                                       status<>'DELETED' AND
+                                       status<>'DELETING')"""
+            key = ap_name
         else:
-            slice_list = [ap_slice_id]
-        self.LOGGER.debug("slice list: %s", slice_list)
-        for s_id in slice_list:
-            try:
-                with self._database_connection() as db:
-                    db.execute(
-                        """SELECT last_time_activated, last_time_updated, 
-                                  total_active_duration FROM metering 
-                               WHERE ap_slice_id='%s'""" % s_id)
-                    previous_time_stats = db.fetchone()
-                    self.LOGGER.debug("previous_time_stats: %s", 
-                                      previous_time_stats)
-                    time_active = None
-                    now = datetime.datetime.now()
-
-                    (
-                        last_time_activated, 
-                        last_time_updated,
-                        current_active_duration, 
-                        total_active_duration
-                    ) = (None, None, None, None)
-
-                    if previous_time_stats is not None:
-                        (
-                            last_time_activated, 
-                            last_time_updated, 
-                            total_active_duration
-                        ) = previous_time_stats
-                    if last_time_activated is None and ap_down:
-                        # Slice was never activated and ap didn't 
-                        # respond, don't update stats
-                        continue
-                        
-                    if last_time_activated is None:
-                        self.LOGGER.warn(
-                            "No value for last time activated for slice %s", 
-                            s_id
-                        )
-                        self.LOGGER.info("Setting last time activated %s", now)
-                        to_execute = ("""UPDATE metering SET
-                                             last_time_activated='%s'
-                                             WHERE ap_slice_id='%s'""" %
-                                         (now, s_id)
-                                     )
-                        last_time_activated = now
-                    else:
-                        current_active_duration = self._get_time_format(
-                            now - last_time_activated
-                        )
-                        to_execute = ("""UPDATE metering SET 
-                                             current_active_duration='%s'
-                                             WHERE ap_slice_id='%s'""" % 
-                                             (current_active_duration, s_id)
-                                     )
-                    self.LOGGER.debug(to_execute)
-                    db.execute(to_execute)
-                    if last_time_updated is None:
-                        self.LOGGER.warn(
-                            "No value for last time updated for slice %s", 
-                            s_id
-                        )
-                        self.LOGGER.info(
-                            "Using value for last time activated %s", 
-                            last_time_activated
-                        )
-                        last_time_updated = last_time_activated
-
-                    time_diff = now - last_time_updated
-                    total_active_duration = self._get_time_format(
-                        total_active_duration + time_diff
-                    )
-                    to_execute = ("""UPDATE metering SET 
-                                         total_active_duration='%s',
-                                         last_time_updated='%s'
-                                         WHERE ap_slice_id='%s'""" % 
-                                         (total_active_duration, now, s_id)
-                                 )
-                    self.LOGGER.debug(to_execute)
-                    db.execute(to_execute)
+            criteria = "ap_slice_id=%s"
+            key = ap_slice_id
+        # Slices never activated have no uptime to sample
+        sample_criteria = criteria + " AND last_time_activated IS NOT NULL"
+        if ap_down:
+            # Slices never activated on an AP which didn't respond
+            # have no uptime to record
+            criteria = sample_criteria
 
-            except Exception:
-                traceback.print_exc(file=sys.stdout)
-                #self.LOGGER.error("Error: %s", str(e))
+        now = datetime.datetime.now()
+        (assignments, params) = self._time_stats_assignments(now)
+        # Taken against the metering row before it is updated below,
+        # no traffic is reported so none is accrued
+        sample = (
+            """INSERT INTO metering_samples
+                   (ap_slice_id, sampled_at, mb_sent, mb_delta,
+                    active_seconds)
+               SELECT ap_slice_id, %%s, current_mb_sent, 0,
+                   TIMESTAMPDIFF(SECOND,
+                       COALESCE(last_time_updated, last_time_activated),
+                       %%s)
+               FROM metering
+               WHERE %s
+               ON DUPLICATE KEY UPDATE
+                   active_seconds=metering_samples.active_seconds
+                       + VALUES(active_seconds)""" % sample_criteria
+        )
+        to_execute = ("UPDATE metering SET %s WHERE %s" %
+                      (assignments, criteria))
+        try:
+            with self._database_connection() as db:
+                self.LOGGER.debug(sample)
+                db.execute(sample, [now, now, key])
+                self.LOGGER.debug(to_execute)
+                updated = db.execute(to_execute, params + [key])
+                self.LOGGER.debug("Updated time stats of %s slices",
+                                  updated)
+        except mdb.Error:
+            traceback.print_exc(file=sys.stdout)
 
     def ap_slice_update_mb_sent(self, ap_slice_id, mb_sent):
         """Updates the metering traffic log for a specific slice.
@@ -365,20 +470,115 @@ class AuroraDB(object):
                                              + %s,
                                      current_mb_sent=
                                          %s
-                                     WHERE ap_slice_id='%s'""" %
-                                 (mb_sent, mb_sent, ap_slice_id)
-                             )
+                                     WHERE ap_slice_id=%s""")
                 self.LOGGER.debug(to_execute)
-                db.execute(to_execute)
+                db.execute(to_execute, (mb_sent, mb_sent, ap_slice_id))
         except Exception:
             traceback.print_exc(file=sys.stdout)
 
+    def ap_slice_bulk_update_stats(self, slice_mb_sent):
+        """Applies a complete slice stats report from one access
+        point in a single transaction.
+
+        Equivalent to calling :func:`ap_slice_status_up`,
+        :func:`ap_slice_update_time_stats` and
+        :func:`ap_slice_update_mb_sent` for every slice in the
+        report, but the number of statements executed does not
+        depend on the number of slices.  The traffic and uptime
+        accrued since the previous report are also appended to the
+        ``metering_samples`` history, see
+        :mod:`aurora.metering_history`.
+
+        :param dict slice_mb_sent: Maps each reported slice ID to the
+                                   MB it has sent
+        :returns: int -- Number of slices set to 'ACTIVE'
+
+        """
+        if not slice_mb_sent:
+            return 0
+        slice_ids = list(slice_mb_sent.keys())
+        id_list = ", ".join(["%s"] * len(slice_ids))
+        now = datetime.datetime.now()
+        (assignments, time_params) = self._time_stats_assignments(now)
+        activated = 0
+        try:
+            with self._database_connection() as db:
+                # FAILED slices go through PENDING to ACTIVE, slices
+                # being deleted are left alone
+                activated = db.execute(
+                    """UPDATE ap_slice SET status='ACTIVE'
+                           WHERE ap_slice_id IN (%s)
+                               AND status IN ('PENDING', 'DOWN', 'FAILED')"""
+                    % id_list, slice_ids
+                )
+                self.LOGGER.debug("Set %s slices 'ACTIVE'", activated)
+
+                # Samples are taken against the metering row before it
+                # is updated below.  A counter lower than the previous
+                # report means the slice restarted and counts from 0.
+                reported = " UNION ALL ".join(
+                    ["SELECT %s AS ap_slice_id, %s AS mb_sent"] +
+                    ["SELECT %s, %s"] * (len(slice_ids) - 1)
+                )
+                to_execute = (
+                    """INSERT INTO metering_samples
+                           (ap_slice_id, sampled_at, mb_sent, mb_delta,
+                            active_seconds)
+                       SELECT metering.ap_slice_id, %%s, reported.mb_sent,
+                           IF(reported.mb_sent >= metering.current_mb_sent,
+                              reported.mb_sent - metering.current_mb_sent,
+                              reported.mb_sent),
+                           IF(metering.last_time_activated IS NULL, 0,
+                              TIMESTAMPDIFF(SECOND,
+                                  COALESCE(metering.last_time_updated,
+                                           metering.last_time_activated),
+                                  %%s))
+                       FROM metering INNER JOIN (%s) AS reported
+                           ON metering.ap_slice_id=reported.ap_slice_id
+                       ON DUPLICATE KEY UPDATE
+                           mb_sent=VALUES(mb_sent),
+                           mb_delta=metering_samples.mb_delta
+                               + VALUES(mb_delta),
+                           active_seconds=metering_samples.active_seconds
+                               + VALUES(active_seconds)""" % reported
+                )
+                mb_params = []
+                for ap_slice_id in slice_ids:
+                    mb_params.extend([ap_slice_id,
+                                      slice_mb_sent[ap_slice_id]])
+                self.LOGGER.debug(to_execute)
+                db.execute(to_execute, [now, now] + mb_params)
+
+                # total_mb_sent is assigned before current_mb_sent
+                # is replaced, see _time_stats_assignments
+                mb_case = " ".join(["WHEN %s THEN %s"] * len(slice_ids))
+                to_execute = (
+                    """UPDATE metering SET %s,
+                           total_mb_sent=(total_mb_sent-current_mb_sent)
+                               + CASE ap_slice_id %s END,
+                           current_mb_sent=CASE ap_slice_id %s END
+                       WHERE ap_slice_id IN (%s)""" %
+                    (assignments, mb_case, mb_case, id_list)
+                )
+                params = time_params + mb_params + mb_params + slice_ids
+                self.LOGGER.debug(to_execute)
+                db.execute(to_execute, params)
+        except mdb.Error as e:
+            traceback.print_exc(file=sys.stdout)
+        if activated:
+            self._invalidate_slices(*slice_ids)
+        return activated
+
     def ap_update_hw_info(self, hw_database, ap_name, region):
         """Given a hardware database report from an access
         point, updates information in MySQL DB to remain
         current.  Obvious update criteria are free disk
         space and number_slice_free.
 
+        Only the columns which changed since the last report of the
+        access point are written, nothing if none did.  The first
+        report after :func:`ap_forget_reports` is written in full.
+
         :param dict hw_database: Database containing all
                                  hardware info for a given
                                  access point
@@ -405,36 +605,61 @@ class AuroraDB(object):
                 )
                 number_slice_free = int(max_available_slices) - current_slices
 
+                row = dict(zip(HW_COLUMNS, (
+                    region, firmware, firmware_version, number_radio,
+                    memory_mb, free_disk, number_radio_free,
+                    number_slice_free
+                )))
+                previous = self._hw_fingerprints.get(ap_name)
+                if previous == row:
+                    return
+                if previous is not None:
+                    changed = [column for column in HW_COLUMNS
+                               if previous[column] != row[column]]
+                    db.execute(
+                        "UPDATE ap SET " + 
+                        ", ".join("%s=%%s" % column for column in changed) +
+                        " WHERE name=%s",
+                        [row[column] for column in changed] + [ap_name]
+                    )
+                    # No row changed if it was deleted since
+                    if db.rowcount > 0:
+                        if 'region' in changed:
+                            self.ap_add_tag(ap_name, region)
+                        self._hw_fingerprints[ap_name] = row
+                        return
+
                 to_execute = (
                     """INSERT INTO ap SET 
-                               name='%s', region='%s', firmware='%s', 
-                               version='%s', number_radio=%s, 
+                               name=%s, region=%s, firmware=%s, 
+                               version=%s, number_radio=%s, 
                                memory_mb=%s, free_disk=%s, 
                                number_radio_free=%s, number_slice_free=%s, 
                                status='UP'
                            ON DUPLICATE KEY UPDATE 
-                               name='%s', region='%s', firmware='%s', 
-                               version='%s', number_radio=%s, 
-                               memory_mb=%s, free_disk=%s, 
-                               number_radio_free=%s, number_slice_free=%s""" %
-                       (ap_name, region, firmware,
-                       firmware_version, number_radio,
-                       memory_mb, free_disk,
-                       number_radio_free, number_slice_free,
-                       ap_name, region, firmware,
-                       firmware_version, number_radio,
-                       memory_mb, free_disk,
-                       number_radio_free, number_slice_free,
-                       )
+                               region=VALUES(region),
+                               firmware=VALUES(firmware), 
+                               version=VALUES(version),
+                               number_radio=VALUES(number_radio), 
+                               memory_mb=VALUES(memory_mb),
+                               free_disk=VALUES(free_disk), 
+                               number_radio_free=VALUES(number_radio_free),
+                               number_slice_free=VALUES(number_slice_free)"""
                 )
 
                 self.LOGGER.debug(to_execute)
-                db.execute(to_execute)
+                db.execute(to_execute,
+                           (ap_name, region, firmware,
+                            firmware_version, number_radio,
+                            memory_mb, free_disk,
+                            number_radio_free, number_slice_free))
 
                 self.ap_add_tag(ap_name, region)
+                self._hw_fingerprints[ap_name] = row
 
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
+            self._hw_fingerprints.pop(ap_name, None)
 
     def ap_slice_status_up(self, ap_slice_id):
         """Sets status to 'ACTIVE' for given ap_slice_id.
@@ -446,7 +671,10 @@ class AuroraDB(object):
         """
         try:
             with self._database_connection() as db:
-                num_results = db.execute("SELECT status FROM ap_slice WHERE ap_slice_id='%s'" % ap_slice_id)
+                num_results = db.execute(
+                    "SELECT status FROM ap_slice WHERE ap_slice_id=%s",
+                    (ap_slice_id,)
+                )
                 status = None
 
                 if num_results == 1:
@@ -464,13 +692,12 @@ class AuroraDB(object):
 
                     if status != 'ACTIVE':
                         self.LOGGER.info("Setting status 'ACTIVE' for %s", ap_slice_id)
-                        to_execute = ("UPDATE ap_slice SET "
-                                              "status='ACTIVE' "
-                                          "WHERE ap_slice_id='%s'" % ap_slice_id)
-                        self.LOGGER.debug(to_execute)
-                        db.execute(to_execute)
+                        db.execute("UPDATE ap_slice SET "
+                                       "status='ACTIVE' "
+                                   "WHERE ap_slice_id=%s", (ap_slice_id,))
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
+        self._invalidate_slices(ap_slice_id)
         return True
 
     def ap_slice_status_pending(self, ap_slice_id):
@@ -484,8 +711,8 @@ class AuroraDB(object):
         try:
             with self._database_connection() as db:
                 num_results = db.execute(
-                    "SELECT status FROM ap_slice WHERE ap_slice_id='%s'" % 
-                    ap_slice_id
+                    "SELECT status FROM ap_slice WHERE ap_slice_id=%s",
+                    (ap_slice_id,)
                 )
                 status = None
 
@@ -503,13 +730,12 @@ class AuroraDB(object):
                     self.LOGGER.info("Setting status 'PENDING' for %s", 
                                      ap_slice_id
                     )
-                    to_execute = ("UPDATE ap_slice SET "
-                                          "status='PENDING' "
-                                      "WHERE ap_slice_id='%s'" % ap_slice_id)
-                    self.LOGGER.debug(to_execute)
-                    db.execute(to_execute)
+                    db.execute("UPDATE ap_slice SET "
+                                   "status='PENDING' "
+                               "WHERE ap_slice_id=%s", (ap_slice_id,))
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
+        self._invalidate_slices(ap_slice_id)
         return True
 
     def ap_syn_clean_deleting_status(self, ap_name):
@@ -532,13 +758,12 @@ class AuroraDB(object):
                                              WHEN 'DELETING' THEN 'DELETED'
                                          ELSE status END
                                      WHERE
-                                         physical_ap='%s'""" %
-                                 ap_name
-                             )
+                                         physical_ap=%s""")
                 self.LOGGER.debug(to_execute)
-                db.execute(to_execute)
-        except mdb.ERROR as e:
+                db.execute(to_execute, (ap_name,))
+        except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
+        self._invalidate_ap(ap_name)
 
     def ap_up_slice_status_update(self, ap_slice_id, ap_name, success=False):
         """Invoked upon receipt of a message from an active
@@ -554,14 +779,14 @@ class AuroraDB(object):
         try:
             with self._database_connection() as db:
                 db.execute("""SELECT status FROM ap_slice
-                                  WHERE ap_slice_id='%s'""" % ap_slice_id)
+                                  WHERE ap_slice_id=%s""", (ap_slice_id,))
                 self.LOGGER.debug("status = %s", db.fetchone()[0])
                 if success:
                     to_execute = ("""UPDATE metering, ap_slice SET 
                                          metering.last_time_activated=
                                              CASE ap_slice.status
-                                                 WHEN 'PENDING' THEN '%s'
-                                                 WHEN 'DOWN' THEN '%s'
+                                                 WHEN 'PENDING' THEN %s
+                                                 WHEN 'DOWN' THEN %s
                                              ELSE metering.last_time_activated END,
                                          metering.current_mb_sent=
                                              CASE ap_slice.status
@@ -571,15 +796,14 @@ class AuroraDB(object):
                                          metering.last_time_updated=
                                              NULL
                                          WHERE 
-                                             metering.ap_slice_id='%s' AND
-                                             ap_slice.ap_slice_id='%s' AND
-                                             ap_slice.physical_ap='%s'""" %
-                                     (now, now, ap_slice_id, ap_slice_id, ap_name)
-                                 )
+                                             metering.ap_slice_id=%s AND
+                                             ap_slice.ap_slice_id=%s AND
+                                             ap_slice.physical_ap=%s""")
                     self.LOGGER.debug(to_execute)
-                    db.execute(to_execute)
+                    db.execute(to_execute, (now, now, ap_slice_id,
+                                            ap_slice_id, ap_name))
                 db.execute("""SELECT last_time_activated FROM metering 
-                                  WHERE ap_slice_id='%s'""" % ap_slice_id)
+                                  WHERE ap_slice_id=%s""", (ap_slice_id,))
                 self.LOGGER.debug("new last_time_activated = %s", db.fetchone()[0])
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
@@ -595,19 +819,19 @@ class AuroraDB(object):
                                                  WHEN 'DOWN' THEN 'ACTIVE' 
                                              ELSE status END
                                          WHERE 
-                                             ap_slice_id='%s' AND
-                                             physical_ap='%s'""" %
-                                     (ap_slice_id, ap_name)
-                                 )
+                                             ap_slice_id=%s AND
+                                             physical_ap=%s""")
+                    params = (ap_slice_id, ap_name)
                 else:
                     to_execute = ("""UPDATE ap_slice SET 
                                          status='FAILED' 
-                                         WHERE ap_slice_id='%s'""" % ap_slice_id
-                                 )
+                                         WHERE ap_slice_id=%s""")
+                    params = (ap_slice_id,)
                 self.LOGGER.debug(to_execute)
-                db.execute(to_execute)
+                db.execute(to_execute, params)
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
+        self._invalidate_slices(ap_slice_id)
 
     def ap_down_slice_status_update(self, ap_name=None, ap_slice_id=None):
         """Invoked upon non-receipt timeout of a message, or by 
@@ -628,12 +852,12 @@ class AuroraDB(object):
                                              WHEN 'DELETING' THEN 'DELETED'
                                              WHEN 'PENDING' THEN 'FAILED'
                                          ELSE status END
-                                     WHERE physical_ap='%s'""" % ap_name
-                             )
+                                     WHERE physical_ap=%s""")
                 self.LOGGER.debug(to_execute)
-                db.execute(to_execute)
+                db.execute(to_execute, (ap_name,))
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
+        self._invalidate_ap(ap_name)
 
     def wslice_belongs_to(self, tenant_id, project_id, ap_slice_id):
         """Method to check the ownership of a slice.  Returns true if
@@ -650,18 +874,11 @@ class AuroraDB(object):
             return True
         else:
             try:
-                with self._database_connection() as db:
-                    to_execute = ( "SELECT ap_slice_id FROM ap_slice WHERE "
-                                   "tenant_id = '%s' AND "
-                                   "project_id = '%s'" % (tenant_id, project_id) )
-                    db.execute(to_execute)
-                    tenant_ap_slices_tt = db.fetchall()
-                    tenant_ap_slices = []
-                    for tenant_t in tenant_ap_slices_tt:
-                        tenant_ap_slices.append(tenant_t[0])
-                    if ap_slice_id in tenant_ap_slices:
-                        return True
-
+                record = self._get_slice_record(ap_slice_id)
+                if (record is not None and
+                        str(record['tenant_id']) == str(tenant_id) and
+                        str(record['project_id']) == str(project_id)):
+                    return True
             except mdb.Error as e:
                 traceback.print_exc(file=sys.stdout)
         return False
@@ -682,10 +899,9 @@ class AuroraDB(object):
         else:
             try:
                 with self._database_connection() as db:
-                    to_execute = ( "SELECT name, wnet_id FROM wnet WHERE "
-                                   "tenant_id = '%s' AND "
-                                   "project_id = '%s'" % (tenant_id, project_id) )
-                    db.execute(to_execute)
+                    db.execute("SELECT name, wnet_id FROM wnet WHERE "
+                               "tenant_id = %s AND "
+                               "project_id = %s", (tenant_id, project_id))
                     tenant_wnets_tt = db.fetchall()
 
                     tenant_wnets = []
@@ -706,14 +922,11 @@ class AuroraDB(object):
 
         """
         try:
-           with self._database_connection() as db:
-                to_execute = ( "SELECT status FROM ap_slice WHERE "
-                               "ap_slice_id = '%s'" % (ap_slice_id) )
-                db.execute(to_execute)
-                status = db.fetchone()
-                if (status[0] == 'DELETED' or
-                    status[0] == 'DELETING'):
-                    return True
+            record = self._get_slice_record(ap_slice_id)
+            if (record is not None and
+                    (record['status'] == 'DELETED' or
+                     record['status'] == 'DELETING')):
+                return True
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
         return False
@@ -729,14 +942,10 @@ class AuroraDB(object):
         """
         try:
             with self._database_connection() as db:
-                to_execute = ( "SELECT name FROM tenant_tags WHERE "
-                               "ap_slice_id = '%s'" % ap_slice_id )
-                db.execute(to_execute)
-                ap_slice_tags_tt = db.fetchall()
-                ap_slice_tags = []
-                for tag_t in ap_slice_tags_tt:
-                    ap_slice_tags.append(tag_t[0])
-                if tag in ap_slice_tags:
+                db.execute("SELECT name FROM tenant_tags WHERE "
+                           "ap_slice_id = %s AND name = %s",
+                           (ap_slice_id, tag))
+                if db.fetchone() is not None:
                     return True
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
@@ -753,14 +962,9 @@ class AuroraDB(object):
         """
         try:
             with self._database_connection() as db:
-                to_execute = ( "SELECT name FROM location_tags WHERE "
-                               "ap_name='%s'" % ap_name )
-                db.execute(to_execute)
-                ap_tags_tt = db.fetchall()
-                ap_tags = []
-                for tag_t in ap_tags_tt:
-                    ap_tags.append(tag_t[0])
-                if tag in ap_tags:
+                db.execute("SELECT name FROM location_tags WHERE "
+                           "ap_name = %s AND name = %s", (ap_name, tag))
+                if db.fetchone() is not None:
                     return True
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
@@ -795,30 +999,25 @@ class AuroraDB(object):
                     """SELECT wnet_id FROM 
                                wnet 
                            WHERE 
-                               wnet_id='%s' AND tenant_id = '%s' OR 
-                               name='%s' AND tenant_id = '%s'""" % 
-                       (name, tenant_id, name, tenant_id)
+                               wnet_id=%s AND tenant_id = %s OR 
+                               name=%s AND tenant_id = %s"""
                 )
-                num_results = db.execute(to_execute)
+                num_results = db.execute(to_execute, (name, tenant_id,
+                                                      name, tenant_id))
                 if num_results < 1:
                     raise NoWnetExistsForTenantException(wnet=name)
 
                 wnetID = db.fetchone()[0]
-                to_execute = ( "SELECT ap_slice_id FROM ap_slice WHERE "
-                               "wnet_id = '%s'" % wnetID )
-                db.execute(to_execute)
-                ap_slice_id_tt = db.fetchall()
-                ap_slice_id = []
-                for id_t in ap_slice_id_tt:
-                    ap_slice_id.append(id_t[0])
-                if slice_id in ap_slice_id:
+                db.execute("SELECT ap_slice_id FROM ap_slice WHERE "
+                           "wnet_id = %s AND ap_slice_id = %s",
+                           (wnetID, slice_id))
+                if db.fetchone() is not None:
                     raise APSliceAlreadyInWnetException(ap_slice_id=slice_id, 
                                                         wnet=name)
                 else:
                     #Update to SQL database
-                    to_execute = ( "UPDATE ap_slice SET wnet_id='%s' WHERE "
-                                   "ap_slice_id='%s'" % (wnetID, slice_id) )
-                    db.execute(to_execute)
+                    db.execute("UPDATE ap_slice SET wnet_id=%s WHERE "
+                               "ap_slice_id=%s", (wnetID, slice_id))
                     return "Added '%s' to '%s'.\n" % (slice_id, name)
 
         except mdb.Error as e:
@@ -858,11 +1057,10 @@ class AuroraDB(object):
 
 
                 #Update to SQL database
-                to_execute = ( "UPDATE ap_slice SET wnet_id=NULL WHERE "
-                               "ap_slice_id='%s' AND "
-                               "wnet_id='%s' AND tenant_id = '%s'" % 
-                               (slice_id, wnet_id, tenant_id))
-                db.execute(to_execute)
+                db.execute("UPDATE ap_slice SET wnet_id=NULL WHERE "
+                           "ap_slice_id=%s AND "
+                           "wnet_id=%s AND tenant_id = %s",
+                           (slice_id, wnet_id, tenant_id))
                 return "%s: %s removed\n" % (wnet_name, slice_id)
                 #TODO: Add messaging
         except mdb.Error as e:
@@ -883,19 +1081,15 @@ class AuroraDB(object):
         #Update the SQL database
         try:
             with self._database_connection() as db:
-                to_execute = ( "SELECT wnet_id FROM wnet WHERE "
-                               "name='%s' AND tenant_id='%s'" % 
-                               (name, tenant_id) )
-                db.execute(to_execute)
+                db.execute("SELECT wnet_id FROM wnet WHERE "
+                           "name=%s AND tenant_id=%s", (name, tenant_id))
                 wnet_id_tt = db.fetchall()
                 if len(wnet_id_tt) > 0:
                     return "You already own '%s'.\n" % name
                 else:
 
-                    to_execute = ("""INSERT INTO wnet VALUES 
-                                         ('%s', '%s', '%s', '%s')""" %
-                                   (wnet_id, name, tenant_id, project_id))
-                    db.execute(to_execute)
+                    db.execute("INSERT INTO wnet VALUES (%s, %s, %s, %s)",
+                               (wnet_id, name, tenant_id, project_id))
                     return "Created '%s'.\n" % name
         except mdb.Error as e:
             err_msg = "Error %d: %s" % (e.args[0], e.args[1])
@@ -927,22 +1121,23 @@ class AuroraDB(object):
 
                 if tenant_id == 0:
                     to_execute = ( "SELECT ap_slice_id FROM ap_slice WHERE "
-                                   "wnet_id = '%s'" % wnet_id )
-                    to_execute_wnet = ( "DELETE FROM wnet WHERE wnet_id = '%s'" % wnet_id )
+                                   "wnet_id = %s" )
+                    to_execute_wnet = "DELETE FROM wnet WHERE wnet_id = %s"
+                    params = (wnet_id,)
                 else:
                     to_execute = ( "SELECT ap_slice_id FROM ap_slice WHERE "
-                                   "wnet_id = '%s' AND tenant_id = '%s'" %
-                                   (wnet_id, tenant_id) )
-                    to_execute_wnet = ( "DELETE FROM wnet WHERE wnet_id = '%s'"
-                                        "AND tenant_id = '%s'" % (wnet_id, tenant_id) )
-                db.execute(to_execute)
+                                   "wnet_id = %s AND tenant_id = %s" )
+                    to_execute_wnet = ( "DELETE FROM wnet WHERE wnet_id = %s "
+                                        "AND tenant_id = %s" )
+                    params = (wnet_id, tenant_id)
+                db.execute(to_execute, params)
                 slice_id_tt = db.fetchall()
                 if slice_id_tt:
                     for slice_id_t in slice_id_tt:
                         message += self.wnet_remove_wslice(tenant_id, slice_id_t[0], wnet_id)
                     message += '\n'
                 message += "Deleting '%s'.\n" % wnet_arg
-                db.execute(to_execute_wnet)
+                db.execute(to_execute_wnet, params)
 
         except mdb.Error as e:
             err_msg = "Error %d: %s" % (e.args[0], e.args[1])
@@ -964,16 +1159,14 @@ class AuroraDB(object):
         """
         try:
             with self._database_connection() as db:
-                to_execute = ("""INSERT INTO ap_slice VALUES 
-                                    ('%s', '%s', '%s', '%s', '%s', %s, '%s')"""
-                               % (slice_uuid, slice_ssid, tenant_id, physAP,
-                                  project_id, "NULL", "PENDING")
-                             )
-                db.execute(to_execute)
-                to_execute = ("INSERT INTO metering SET ap_slice_id='%s'" % 
-                              slice_uuid)
-                db.execute(to_execute)
-                return None
+                db.execute("""INSERT INTO ap_slice VALUES 
+                                  (%s, %s, %s, %s, %s, NULL, 'PENDING')""",
+                           (slice_uuid, slice_ssid, tenant_id, physAP,
+                            project_id))
+                db.execute("INSERT INTO metering SET ap_slice_id=%s",
+                           (slice_uuid,))
+            self._invalidate_slices(slice_uuid)
+            return None
         except mdb.Error as e:
             err_msg = "Error %d: %s" % (e.args[0], e.args[1])
             self.LOGGER.error(err_msg)
@@ -990,13 +1183,12 @@ class AuroraDB(object):
         #Remove tags
         try:
             with self._database_connection() as db:
-                to_execute = ( "UPDATE ap_slice SET status='DELETING' WHERE "
-                               "ap_slice_id='%s'" % slice_id )
-                db.execute(to_execute)
-                to_execute = ( "DELETE FROM tenant_tags WHERE "
-                               "ap_slice_id='%s'" % slice_id )
-                db.execute(to_execute)
-                return "Deleting slice %s.\n" % slice_id
+                db.execute("UPDATE ap_slice SET status='DELETING' WHERE "
+                           "ap_slice_id=%s", (slice_id,))
+                db.execute("DELETE FROM tenant_tags WHERE "
+                           "ap_slice_id=%s", (slice_id,))
+            self._invalidate_slices(slice_id)
+            return "Deleting slice %s.\n" % slice_id
         except mdb.Error as e:
             err_msg = "Error %d: %s" % (e.args[0], e.args[1])
             self.LOGGER.error(err_msg)
@@ -1015,11 +1207,8 @@ class AuroraDB(object):
         else:
             try:
                 with self._database_connection() as db:
-                    to_execute = ("""REPLACE INTO tenant_tags VALUES 
-                                         ('%s', '%s')""" %
-                                         (tag, ap_slice_id)
-                                 )
-                    db.execute(to_execute)
+                    db.execute("REPLACE INTO tenant_tags VALUES (%s, %s)",
+                               (tag, ap_slice_id))
                     return "Added tag '%s' to ap_slice '%s'.\n" % (tag, ap_slice_id)
             except mdb.Error as e:
                 err_msg = "Error %d: %s\n" % (e.args[0], e.args[1])
@@ -1037,10 +1226,9 @@ class AuroraDB(object):
         if self.wslice_has_tag(ap_slice_id, tag):
             try:
                 with self._database_connection() as db:
-                    to_execute = ( "DELETE FROM tenant_tags WHERE "
-                                   "name='%s' AND ap_slice_id='%s'" %
-                                   (tag, ap_slice_id) )
-                    db.execute(to_execute)
+                    db.execute("DELETE FROM tenant_tags WHERE "
+                               "name=%s AND ap_slice_id=%s",
+                               (tag, ap_slice_id))
                     return "Deleted tag '%s' from ap_slice '%s'\n" % (tag, ap_slice_id)
             except mdb.Error as e:
                 err_msg = "Error %d: %s\n" % (e.args[0], e.args[1])
@@ -1086,17 +1274,11 @@ class AuroraDB(object):
 
         """
         try:
-            with self._database_connection() as db:
-                to_execute = ("""SELECT tenant_id 
-                                 FROM ap_slice 
-                                 WHERE 
-                                     ap_slice_id='%s' AND 
-                                     status<>'DELETED' AND 
-                                     status<>'DELETING'""" % ap_slice_id)
-                self.LOGGER.debug(to_execute)
-                num_lines = db.execute(to_execute)
-                if num_lines > 0:
-                    return db.fetchone()[0]
+            record = self._get_slice_record(ap_slice_id)
+            if (record is not None and
+                    record['status'] != 'DELETED' and
+                    record['status'] != 'DELETING'):
+                return record['tenant_id']
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
         return
@@ -1110,18 +1292,13 @@ class AuroraDB(object):
 
         """
         try:
-            with self._database_connection() as db:
-                to_execute = ( "SELECT physical_ap FROM ap_slice WHERE "
-                               "ap_slice_id='%s'" % ap_slice_id )
-                db.execute(to_execute)
-                physical_ap = db.fetchone()
-                if physical_ap:
-                    return physical_ap[0]
-                else:
-                    raise NoSliceExistsException(ap_slice_id=ap_slice_id)
+            record = self._get_slice_record(ap_slice_id)
         except mdb.Error, e:
             self.LOGGER.error("Error %d: %s", e.args[0], e.args[1])
             sys.exit(1)
+        if record is None:
+            raise NoSliceExistsException(ap_slice_id=ap_slice_id)
+        return record['physical_ap']
 
     def get_wslice_ssid(self, ap_slice_id):
         """Returns the SSID of a given AP slice.
@@ -1131,14 +1308,10 @@ class AuroraDB(object):
 
         """
         try:
-            with self._database_connection() as db:
-                to_execute = ("""SELECT ap_slice_ssid FROM
-                                     ap_slice WHERE
-                                     ap_slice_id='%s'""" % ap_slice_id)
-                result = None
-                if db.execute(to_execute) == 1:
-                    result = db.fetchone()[0]
-                return result
+            record = self._get_slice_record(ap_slice_id)
+            if record is not None:
+                return record['ap_slice_ssid']
+            return None
         except mdb.Error as e:
             self.LOGGER.error("Error %d: %s", e.args[0], e.args[1])
             sys.exit(1)
@@ -1158,18 +1331,14 @@ class AuroraDB(object):
                 if not_deleted_only:
                     to_execute = ("""SELECT ap_slice_id
                                          FROM ap_slice
-                                         WHERE physical_ap='%s' AND 
+                                         WHERE physical_ap=%s AND 
                                              status<>'DELETED' AND
-                                             status<>'DELETING'""" %
-                                     (ap_name)
-                                 )
+                                             status<>'DELETING'""")
                 else:
                     to_execute = ("""SELECT ap_slice_id
                                          FROM ap_slice
-                                         WHERE physical_ap='%s'""" %
-                                     (ap_name)
-                                 )
-                db.execute(to_execute)
+                                         WHERE physical_ap=%s""")
+                db.execute(to_execute, (ap_name,))
                 result = db.fetchall()
                 slice_list = []
                 for ap_slice_id in result:
@@ -1193,15 +1362,16 @@ class AuroraDB(object):
             with self._database_connection() as db:
                 if str(tenant_id) == "0":
                     to_execute = "SELECT * FROM wnet"
+                    params = ()
                 elif wnet_arg:
                     to_execute = ( "SELECT * FROM wnet WHERE "
-                                   "tenant_id = '%s' AND wnet_id = '%s' OR "
-                                   "tenant_id = '%s' AND name = '%s'" %
-                                   (tenant_id, wnet_arg, tenant_id, wnet_arg) )
+                                   "tenant_id = %s AND wnet_id = %s OR "
+                                   "tenant_id = %s AND name = %s" )
+                    params = (tenant_id, wnet_arg, tenant_id, wnet_arg)
                 else:
-                    to_execute = ("SELECT * FROM wnet WHERE tenant_id = '%s'" % 
-                                  tenant_id)
-                num_results = db.execute(to_execute)
+                    to_execute = "SELECT * FROM wnet WHERE tenant_id = %s"
+                    params = (tenant_id,)
+                num_results = db.execute(to_execute, params)
                 if num_results < 1:
                     if wnet_arg is None:
                         raise NoWnetExistsForTenantException()
@@ -1222,13 +1392,16 @@ class AuroraDB(object):
             sys.exit(1)
         return wnet_list
 
-    def get_wnet_slices(self, wnet_arg, tenant_id, include_deleted=False):
+    def get_wnet_slices(self, wnet_arg, tenant_id, include_deleted=False,
+                        limit=None, after=None):
         """Returns slice data associated with slices in a wnet.
 
         :param str wnet_arg: Wnet ID or name 
         :param str tenant_id:
         :param bool include_deleted: Include deleted slices in returned 
                                      list
+        :param int limit: Maximum number of slices, ordered by ID
+        :param str after: Only return slices with a greater ID
         :rtype: list 
 
         """
@@ -1236,16 +1409,22 @@ class AuroraDB(object):
 
         selected_columns = ['metering.ap_slice_id', 'ap_slice_ssid', 'tenant_id', 'physical_ap', 
                             'project_id', 'wnet_id', 'status', 'current_mb_sent', 
-                            'current_active_duration', 'total_active_duration']
+                            'current_active_seconds', 'total_active_seconds']
         table_name = query.join_table('ap_slice', 'metering', 'ap_slice_id', 'ap_slice_id')
-        condition = ['wnet_id = "%s"' % wnet_id]
+        condition = [('wnet_id = %s', wnet_id)]
 
         if not include_deleted:
             condition.append('status <> "DELETING"')
             condition.append('status <> "DELETED"')
+        appendix = ''
+        if after is not None:
+            condition.append(('ap_slice.ap_slice_id > %s', after))
+        if limit is not None:
+            appendix = "ORDER BY ap_slice.ap_slice_id LIMIT %d" % limit
 
         # Get slices associated with this wnet
-        slice_info_tt = query.query(table_name, selected_columns, condition)
+        slice_info_tt = query.query(table_name, selected_columns, condition,
+                                    appendix) or ()
 
         #Prune through list
         slice_list = []
@@ -1256,8 +1435,115 @@ class AuroraDB(object):
                 slice_list[i][item] = slice_t[index]
                 index += 1
             slice_list[i]['ap_slice_id'] = slice_list[i].pop('metering.ap_slice_id')
+            slice_list[i]['current_active_duration'] = seconds_to_duration(
+                slice_list[i].pop('current_active_seconds')
+            )
+            slice_list[i]['total_active_duration'] = seconds_to_duration(
+                slice_list[i].pop('total_active_seconds')
+            )
         return slice_list
 
+    def _get_usage(self, columns, joins, criteria, params, group_by,
+                   start, end, resolution):
+        """Reads metering rollups between ``start`` and ``end``,
+        choosing the resolution if none is given.
+
+        :rtype: tuple -- (int, tuple of rows)
+
+        """
+        if resolution is None:
+            resolution = metering_history.choose_resolution(
+                start, end, metering_history.rollup_settings()['retention']
+            )
+        start = metering_history.floor_time(start, resolution)
+        to_execute = ("""SELECT %s FROM metering_rollup %s
+                             WHERE metering_rollup.resolution=%%s AND
+                                 metering_rollup.bucket_start >= %%s AND
+                                 metering_rollup.bucket_start < %%s AND %s
+                             GROUP BY %s
+                             ORDER BY %s""" %
+                      (columns, joins, criteria, group_by, group_by))
+        with self._database_connection() as db:
+            self.LOGGER.debug(to_execute)
+            db.execute(to_execute, [resolution, start, end] + list(params))
+            return (resolution, db.fetchall())
+
+    def get_slice_usage(self, ap_slice_ids, start, end, resolution=None):
+        """Returns the traffic and uptime of slices over a time range,
+        per bucket of the chosen rollup level.
+
+        Rollups trail the samples by up to the rollup interval, see
+        :mod:`aurora.metering_history`.
+
+        :param list ap_slice_ids:
+        :param :class:`datetime.datetime` start:
+        :param :class:`datetime.datetime` end:
+        :param int resolution: Bucket size in seconds, one of
+                               :data:`aurora.metering_history.RESOLUTIONS`,
+                               chosen from the range if None
+        :returns: list -- One dict per slice and bucket, with keys
+                  ap_slice_id, bucket_start, resolution, mb_sent and
+                  active_seconds
+
+        """
+        if not ap_slice_ids:
+            return []
+        criteria = ("metering_rollup.ap_slice_id IN (%s)" %
+                    ", ".join(["%s"] * len(ap_slice_ids)))
+        usage = []
+        try:
+            (resolution, rows) = self._get_usage(
+                """metering_rollup.ap_slice_id, bucket_start,
+                   SUM(mb_sent), SUM(active_seconds)""",
+                "", criteria, ap_slice_ids,
+                "metering_rollup.ap_slice_id, bucket_start",
+                start, end, resolution
+            )
+            for row in rows:
+                usage.append({
+                    'ap_slice_id': row[0],
+                    'bucket_start': row[1],
+                    'resolution': resolution,
+                    'mb_sent': float(row[2]),
+                    'active_seconds': int(row[3]),
+                })
+        except mdb.Error:
+            traceback.print_exc(file=sys.stdout)
+        return usage
+
+    def get_tenant_usage(self, tenant_id, start, end, resolution=None):
+        """Returns the traffic and uptime of all of a tenant's slices
+        over a time range, summed per bucket of the chosen rollup
+        level.  See :func:`get_slice_usage`.
+
+        :param str tenant_id:
+        :param :class:`datetime.datetime` start:
+        :param :class:`datetime.datetime` end:
+        :param int resolution:
+        :returns: list -- One dict per bucket, with keys bucket_start,
+                  resolution, mb_sent and active_seconds
+
+        """
+        usage = []
+        try:
+            (resolution, rows) = self._get_usage(
+                "bucket_start, SUM(mb_sent), SUM(active_seconds)",
+                """INNER JOIN ap_slice
+                       ON ap_slice.ap_slice_id=metering_rollup.ap_slice_id""",
+                "ap_slice.tenant_id=%s", [tenant_id], "bucket_start",
+                start, end, resolution
+            )
+            for row in rows:
+                usage.append({
+                    'bucket_start': row[0],
+                    'resolution': resolution,
+                    'mb_sent': float(row[1]),
+                    'active_seconds': int(row[2]),
+                })
+        except mdb.Error:
+            traceback.print_exc(file=sys.stdout)
+        return usage
+
     def get_wnet_name_id(self, wnet_arg, tenant_id):
         """For a wnet given by either name or ID, return both ID and 
         name.
@@ -1273,13 +1559,14 @@ class AuroraDB(object):
                 wnet_info = {}
                 if tenant_id == 0:
                     to_execute = ( "SELECT wnet_id, name FROM wnet WHERE "
-                                   "name='%s' OR wnet_id = '%s'" % (wnet_arg, wnet_arg) )
+                                   "name=%s OR wnet_id = %s" )
+                    params = (wnet_arg, wnet_arg)
                 else:
                     to_execute = ( "SELECT wnet_id, name FROM wnet WHERE "
-                                   "name='%s' AND tenant_id = '%s' OR "
-                                   "wnet_id='%s' AND tenant_id = '%s'" %
-                                   (wnet_arg, tenant_id, wnet_arg, tenant_id) )
-                db.execute(to_execute)
+                                   "name=%s AND tenant_id = %s OR "
+                                   "wnet_id=%s AND tenant_id = %s" )
+                    params = (wnet_arg, tenant_id, wnet_arg, tenant_id)
+                db.execute(to_execute, params)
                 wnet_info_tt = db.fetchall()
                 if not wnet_info_tt:
                     raise Exception("AuroraDB Error: No wnet '%s'.\n" % wnet_arg)
@@ -1312,15 +1599,15 @@ class AuroraDB(object):
                         wnet_id, 
                         tenant_id
                     )['wnet_id']
-                    to_execute = ("""UPDATE wnet SET name='%s' WHERE 
-                                        wnet_id='%s' AND tenant_id='%s'""" %
-                                    (new_name, wnet_id, tenant_id))
+                    to_execute = ("""UPDATE wnet SET name=%s WHERE 
+                                        wnet_id=%s AND tenant_id=%s""")
+                    params = (new_name, wnet_id, tenant_id)
                 else:
                     # Assume that wnet_id is actually an ID and not a name
-                    to_execute = ("""UPDATE wnet SET name='%s' WHERE 
-                                        wnet_id='%s'""" %
-                                    (new_name, wnet_id))
-                db.execute(to_execute)
+                    to_execute = ("""UPDATE wnet SET name=%s WHERE 
+                                        wnet_id=%s""")
+                    params = (new_name, wnet_id)
+                db.execute(to_execute, params)
                 
         except mdb.Error as e:
             traceback.print_exc(file=sys.stdout)
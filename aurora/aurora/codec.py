@@ -0,0 +1,144 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Encoding of the message bodies exchanged with access points.
+
+Bodies are serialized as JSON, or as msgpack when the ``msgpack``
+package is installed, and may be compressed with zlib.  The choice is
+carried by the ``content_type`` and ``content_encoding`` AMQP
+properties, messages without them are plain JSON.
+
+Each side lists what it can decode in the :data:`ACCEPT_HEADER` and
+:data:`ACCEPT_ENCODING_HEADER` headers of its messages, and the other
+side only uses an encoding it saw advertised, so peers which predate
+this module keep receiving JSON::
+
+    (content_type, content_encoding) = negotiate(props.headers,
+                                                 binary=True,
+                                                 compress=True)
+    (body, content_encoding) = encode(message, content_type,
+                                      content_encoding)
+    message = decode(body, content_type, content_encoding)
+
+"""
+import json
+import logging
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from aurora.exc import *
+
+LOGGER = logging.getLogger(__name__)
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+DEFLATE = 'deflate'
+
+#: Header listing the content types a peer decodes, comma separated
+ACCEPT_HEADER = 'x-aurora-accept'
+#: Header listing the content encodings a peer decodes
+ACCEPT_ENCODING_HEADER = 'x-aurora-accept-encoding'
+
+#: Bodies shorter than this are not worth compressing
+COMPRESS_MIN_SIZE = 256
+COMPRESS_LEVEL = 6
+
+
+def content_types():
+    """Returns the content types which can be decoded, preferred
+    first.
+
+    :rtype: list
+
+    """
+    if msgpack is not None:
+        return [MSGPACK, JSON]
+    return [JSON]
+
+
+def accept_headers():
+    """Returns the headers advertising what can be decoded.
+
+    :rtype: dict
+
+    """
+    return {
+        ACCEPT_HEADER: ','.join(content_types()),
+        ACCEPT_ENCODING_HEADER: DEFLATE,
+    }
+
+
+def negotiate(headers, binary=False, compress=False):
+    """Chooses how to encode messages for a peer.
+
+    :param dict headers: Headers of a message from the peer, may be
+                         None
+    :param bool binary: Use msgpack if the peer accepts it
+    :param bool compress: Compress if the peer accepts it
+    :returns: tuple -- The content type and content encoding, which
+              is None for uncompressed bodies
+
+    """
+    if not headers:
+        return (JSON, None)
+    accepted = headers.get(ACCEPT_HEADER, '').split(',')
+    encodings = headers.get(ACCEPT_ENCODING_HEADER, '').split(',')
+    content_type = JSON
+    if binary and MSGPACK in accepted and msgpack is not None:
+        content_type = MSGPACK
+    content_encoding = None
+    if compress and DEFLATE in encodings:
+        content_encoding = DEFLATE
+    return (content_type, content_encoding)
+
+
+def encode(message, content_type=JSON, content_encoding=None):
+    """Serializes and compresses a message.
+
+    :param message: Object to encode
+    :param str content_type: :data:`JSON` or :data:`MSGPACK`
+    :param str content_encoding: :data:`DEFLATE` or None
+    :returns: tuple -- The body, and the content encoding actually
+              used, None if the body was too short to compress
+    :raises: :exc:`UnsupportedContentType \
+        <aurora.exc.UnsupportedContentType>`
+
+    """
+    if content_type == MSGPACK and msgpack is not None:
+        body = msgpack.packb(message)
+    elif content_type in (JSON, None):
+        body = json.dumps(message)
+    else:
+        raise UnsupportedContentType(content_type=content_type)
+    if content_encoding == DEFLATE and len(body) >= COMPRESS_MIN_SIZE:
+        return (zlib.compress(body, COMPRESS_LEVEL), DEFLATE)
+    return (body, None)
+
+
+def decode(body, content_type=None, content_encoding=None):
+    """Decompresses and deserializes a message body.
+
+    :param str body:
+    :param str content_type: None is taken as JSON
+    :param str content_encoding: None for uncompressed bodies
+    :returns: The decoded message
+    :raises: :exc:`UnsupportedContentType \
+        <aurora.exc.UnsupportedContentType>`\n
+        :exc:`UnsupportedContentEncoding \
+        <aurora.exc.UnsupportedContentEncoding>`
+
+    """
+    if content_encoding == DEFLATE:
+        body = zlib.decompress(body)
+    elif content_encoding not in (None, '', 'identity'):
+        raise UnsupportedContentEncoding(content_encoding=content_encoding)
+    if content_type in (None, '', JSON):
+        return json.loads(body)
+    if content_type == MSGPACK and msgpack is not None:
+        return msgpack.unpackb(body)
+    raise UnsupportedContentType(content_type=content_type)
@@ -41,8 +41,11 @@ def save_config(config, ap_slice_id, tenant_id):
             try:
                 os.makedirs(dir_path)
             except os.error:
-                traceback.print_exc(file=sys.stdout)
-                raise CannotCreateTenantConfigDir(dir_path=dir_path)
+                # Replies are handled concurrently, another slice of
+                # the tenant may have created it first
+                if not os.path.isdir(dir_path):
+                    traceback.print_exc(file=sys.stdout)
+                    raise CannotCreateTenantConfigDir(dir_path=dir_path)
         file_path = get_file_path(ap_slice_id, tenant_id)
         with open(file_path, 'w') as CONFIG_FILE:
             LOGGER.debug("File: %s", CONFIG_FILE.name)
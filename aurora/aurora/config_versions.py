@@ -0,0 +1,252 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Versioned access point configurations, so that replies only carry
+what changed.
+
+Agents number the states of their ``init_database``,
+``init_user_id_database`` and ``init_hardware_database`` with a version
+which increases whenever the content hash changes.  Messages sent to an
+access point carry the version the manager holds in the
+:data:`CONFIG_VERSION_HEADER` header, and the access point replies with
+
+* only ``version`` and ``hash`` when the manager already has them,
+* a ``diff`` from that ``base`` version, see :func:`diff`,
+* or the full state, when the header is missing or -1, or the base
+  version is no longer known to the agent.
+
+A broadcast reaches every access point with the same headers, so its
+header holds a table of the versions held by access point name, see
+:func:`ConfigVersions.known_versions`.  Access points missing from it
+reply with their full state.
+
+:class:`ConfigVersions` turns these back into full configurations and
+tells whether anything changed, so unchanged replies cause no writes::
+
+    (config, changed) = versions.resolve(ap_name, reply['config'])
+    if changed:
+        provision.update_last_known_config(ap_name, config)
+
+Both sides keep the last :data:`HISTORY` versions, so a version the
+agent can diff from is always one the manager still holds.
+
+Access points which push their stats are not polled, so they diff
+each push from the version they pushed last.  Pushes which carry
+changes are marked with the :data:`CONFIG_CHANGED_HEADER` header and
+are never dropped by the manager, see :func:`carries_changes`.
+
+"""
+import collections
+import copy
+import hashlib
+import json
+import logging
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+#: Header holding the version the manager has of an access point's
+#: configuration, -1 if none
+CONFIG_VERSION_HEADER = 'x-aurora-config-version'
+#: Header set by access points on messages whose configuration holds a
+#: diff or the full state, which must not be lost
+CONFIG_CHANGED_HEADER = 'x-aurora-config-changed'
+#: Keys of the versioned state in a configuration
+STATE_KEYS = ('init_database', 'init_user_id_database',
+              'init_hardware_database')
+#: Versions kept per access point, must match the agent's
+HISTORY = 8
+
+
+def state_hash(state):
+    """Returns the content hash of a state, identical on the agents.
+
+    :param dict state: The :data:`STATE_KEYS` of a configuration
+    :rtype: str
+
+    """
+    return hashlib.sha1(
+        json.dumps(state, sort_keys=True, separators=(',', ':'))
+    ).hexdigest()
+
+
+def carries_changes(config):
+    """Returns True if the configuration of a message holds a diff or
+    the full state, rather than only the version and hash.
+
+    :param dict config:
+    :rtype: bool
+
+    """
+    return config is not None and ('diff' in config or
+                                   STATE_KEYS[0] in config)
+
+
+def diff(old, new, path=()):
+    """Returns the changes turning ``old`` into ``new``.  Nested
+    dictionaries are compared key by key, any other changed value,
+    lists included, is replaced whole.
+
+    :param dict old:
+    :param dict new:
+    :returns: dict -- ``set``, a list of ``[path, value]``, and
+              ``unset``, a list of paths, where a path is the list of
+              keys leading to a value
+
+    """
+    changes = {'set': [], 'unset': []}
+    for key in old:
+        if key not in new:
+            changes['unset'].append(list(path) + [key])
+    for (key, value) in new.iteritems():
+        if key not in old:
+            changes['set'].append([list(path) + [key], value])
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                nested = diff(old[key], value, tuple(path) + (key,))
+                changes['set'].extend(nested['set'])
+                changes['unset'].extend(nested['unset'])
+            else:
+                changes['set'].append([list(path) + [key], value])
+    return changes
+
+
+def apply_diff(state, changes):
+    """Returns a copy of ``state`` with the changes of :func:`diff`
+    applied.
+
+    :raises: KeyError, TypeError if the changes do not fit the state
+
+    """
+    state = copy.deepcopy(state)
+    for path in changes.get('unset', []):
+        parent = state
+        for key in path[:-1]:
+            parent = parent[key]
+        del parent[path[-1]]
+    for (path, value) in changes.get('set', []):
+        parent = state
+        for key in path[:-1]:
+            parent = parent.setdefault(key, {})
+        parent[path[-1]] = value
+    return state
+
+
+#: A known version of an access point's state
+Version = collections.namedtuple('Version', ['version', 'hash', 'state'])
+
+
+class ConfigVersions(object):
+    """Thread-safe store of the last configuration versions of each
+    access point.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ap -> OrderedDict of version -> Version, oldest first
+        self._aps = {}
+
+    def known_version(self, ap):
+        """Returns the latest version held for an access point, or -1.
+
+        :rtype: int
+
+        """
+        with self._lock:
+            history = self._aps.get(ap)
+            if not history:
+                return -1
+            return next(reversed(history))
+
+    def known_versions(self, aps):
+        """Returns the latest versions held for many access points.
+
+        :param list aps:
+        :returns: dict -- Version by access point name, access points
+                  of which no version is held are left out
+
+        """
+        versions = {}
+        with self._lock:
+            for ap in aps:
+                history = self._aps.get(ap)
+                if history:
+                    versions[str(ap)] = next(reversed(history))
+        return versions
+
+    def forget(self, ap):
+        """Drops the versions of an access point, its next reply will
+        carry its full configuration.
+
+        """
+        with self._lock:
+            self._aps.pop(ap, None)
+
+    def resolve(self, ap, config):
+        """Rebuilds the full configuration of a reply.
+
+        :param str ap:
+        :param dict config: ``config`` of a reply, with its ``region``
+        :returns: tuple -- The full configuration, or None if it cannot
+                  be rebuilt, and True if it differs from the latest
+                  one held.  Configurations from agents which predate
+                  versions are returned as they are, as changed.
+
+        """
+        if 'version' not in config:
+            return (config, True)
+        version = config['version']
+        reported_hash = config['hash']
+        with self._lock:
+            history = self._aps.setdefault(ap, collections.OrderedDict())
+            latest = None
+            if history:
+                latest = history[next(reversed(history))]
+
+            known = history.get(version)
+            if known is not None and known.hash == reported_hash:
+                state = known.state
+            elif all(key in config for key in STATE_KEYS):
+                state = dict((key, config[key]) for key in STATE_KEYS)
+                if known is not None or (latest is not None and
+                                         version < latest.version):
+                    # The agent restarted and counts from scratch
+                    history.clear()
+                    latest = None
+                self._store(history, Version(version, reported_hash, state))
+            elif 'diff' in config and config.get('base') in history:
+                try:
+                    state = apply_diff(history[config['base']].state,
+                                       config['diff'])
+                except (KeyError, TypeError):
+                    state = None
+                if state is None or state_hash(state) != reported_hash:
+                    return self._diverged(ap, version)
+                self._store(history, Version(version, reported_hash, state))
+            else:
+                return self._diverged(ap, version)
+
+        changed = latest is None or (version > latest.version and
+                                     reported_hash != latest.hash)
+        full_config = dict(state)
+        full_config['region'] = config.get('region')
+        return (full_config, changed)
+
+    def _store(self, history, entry):
+        """Must be called with the lock held."""
+        out_of_order = history and entry.version < next(reversed(history))
+        history[entry.version] = entry
+        if out_of_order:
+            # Keep the history ordered when replies arrive out of order
+            for version in sorted(history):
+                history[version] = history.pop(version)
+        while len(history) > HISTORY:
+            history.popitem(last=False)
+
+    def _diverged(self, ap, version):
+        """Must be called with the lock held."""
+        LOGGER.warn("Config version %s of %s cannot be rebuilt, "
+                    "requesting a full configuration", version, ap)
+        self._aps.pop(ap, None)
+        return (None, False)
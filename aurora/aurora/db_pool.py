@@ -0,0 +1,472 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Thread-safe pool of MySQL connections shared by
+:class:`aurora.aurora_db.AuroraDB`, :mod:`aurora.query_agent` and
+:class:`aurora.manager.Manager`.
+
+Connections are checked out with :func:`ConnectionPool.cursor`, which
+behaves like ``with MySQLdb.Connection as cursor``: the transaction is
+committed when the block exits cleanly and rolled back if it raises::
+
+    from aurora import db_pool
+
+    pool = db_pool.get_pool(host, username, password, database)
+    with pool.cursor() as db:
+        db.execute("SELECT name FROM ap")
+
+Nested ``cursor()`` blocks on the same thread reuse the connection
+already held by that thread and only the outermost block commits,
+so a method which calls other database methods runs in a single
+transaction and never waits on the pool for a second connection.
+
+Database methods usually catch their own errors, so a statement which
+fails in a nested block does not stop the outermost one from
+committing the others.  Blocks which must apply all or nothing use
+``cursor(atomic=True)``: an error raised through any nested block
+rolls the whole transaction back, and
+:exc:`DatabaseTransactionRolledBack
+<aurora.exc.DatabaseTransactionRolledBack>` is raised when the
+outermost block exits::
+
+    try:
+        with pool.cursor(atomic=True):
+            aurora_db.ap_status_up(ap_name)
+            aurora_db.ap_slice_status_up(ap_slice_id)
+    except DatabaseTransactionRolledBack:
+        # Neither update was written
+        ...
+
+Work which must only happen once a write is visible to other
+connections, eg. dropping cached rows, is deferred with
+:func:`ConnectionPool.after_commit` until the outermost block of the
+calling thread has committed.
+
+"""
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+import MySQLdb as mdb
+
+from aurora import config
+from aurora.cls_logger import get_cls_logger
+from aurora.exc import *
+
+LOGGER = logging.getLogger(__name__)
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+class _PooledConnection(object):
+    """Bookkeeping wrapper around a :class:`MySQLdb.Connection`."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = time.time()
+        self.last_used = self.created
+
+
+class ConnectionPool(object):
+    """A bounded pool of MySQL connections.
+
+    At most ``max_size`` connections are open at once.  A thread
+    checking out a connection while all of them are in use waits up
+    to ``checkout_timeout`` seconds before
+    :exc:`DatabasePoolTimeout <aurora.exc.DatabasePoolTimeout>` is
+    raised.  Connections idle for more than ``ping_after`` seconds are
+    pinged before being handed out, and connections idle for more than
+    ``max_idle`` seconds are closed.
+
+    """
+    def __init__(self, mysql_host, mysql_username, mysql_password,
+                 mysql_db, max_size=10, checkout_timeout=10,
+                 max_idle=300, ping_after=5):
+        """Creates an empty pool, connections are opened on demand.
+
+        :param str mysql_host:
+        :param str mysql_username:
+        :param str mysql_password:
+        :param str mysql_db:
+        :param int max_size: Maximum number of open connections
+        :param float checkout_timeout: Seconds to wait for a free
+                                       connection
+        :param float max_idle: Seconds after which an unused
+                               connection is closed
+        :param float ping_after: Seconds of idleness after which a
+                                 connection is health checked on
+                                 checkout
+
+        """
+        self.LOGGER = get_cls_logger(self)
+
+        self.mysql_host = mysql_host
+        self.mysql_username = mysql_username
+        self.mysql_password = mysql_password
+        self.mysql_db = mysql_db
+
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+
+        self._condition = threading.Condition(threading.Lock())
+        # Most recently used connections are kept at the right
+        self._idle = collections.deque()
+        self._open_count = 0
+        self._local = threading.local()
+
+        self._counters = {
+            'created': 0,
+            'closed': 0,
+            'evicted_idle': 0,
+            'failed_health_check': 0,
+            'checkouts': 0,
+            'checkout_timeouts': 0,
+            'checkout_waits': 0,
+            'checkout_wait_total': 0.0,
+            'checkout_wait_max': 0.0,
+        }
+
+    def _connect(self):
+        """Opens a new MySQL connection.
+
+        :rtype: :class:`_PooledConnection`
+
+        """
+        connection = mdb.connect(self.mysql_host, self.mysql_username,
+                                 self.mysql_password, self.mysql_db)
+        return _PooledConnection(connection)
+
+    def _close(self, pooled):
+        """Closes a connection, ignoring errors from dead sockets."""
+        try:
+            pooled.connection.close()
+        except mdb.Error:
+            pass
+
+    def _evict_idle(self, now):
+        """Removes connections idle longer than ``max_idle`` from the
+        pool.  Must be called with ``self._condition`` held.
+
+        :returns: list -- Connections to close outside the lock
+
+        """
+        evicted = []
+        # Least recently used connections are on the left
+        while self._idle and now - self._idle[0].last_used > self.max_idle:
+            evicted.append(self._idle.popleft())
+        self._open_count -= len(evicted)
+        self._counters['evicted_idle'] += len(evicted)
+        return evicted
+
+    def _checkout(self):
+        """Takes a connection from the pool, opening a new one if the
+        pool has not reached ``max_size``.
+
+        :rtype: :class:`_PooledConnection`
+        :raises: DatabasePoolTimeout
+
+        """
+        start = time.time()
+        waited = False
+        to_close = []
+        pooled = None
+        with self._condition:
+            to_close = self._evict_idle(start)
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._open_count < self.max_size:
+                    self._open_count += 1
+                    break
+                remaining = self.checkout_timeout - (time.time() - start)
+                if remaining <= 0:
+                    self._counters['checkout_timeouts'] += 1
+                    raise DatabasePoolTimeout(size=self.max_size)
+                waited = True
+                self._condition.wait(remaining)
+
+            wait_time = time.time() - start
+            self._counters['checkouts'] += 1
+            if waited:
+                self._counters['checkout_waits'] += 1
+            self._counters['checkout_wait_total'] += wait_time
+            if wait_time > self._counters['checkout_wait_max']:
+                self._counters['checkout_wait_max'] = wait_time
+
+        for evicted in to_close:
+            self._close(evicted)
+
+        if pooled is not None:
+            if time.time() - pooled.last_used > self.ping_after:
+                try:
+                    pooled.connection.ping()
+                except mdb.Error:
+                    self.LOGGER.info("Discarding dead MySQL connection")
+                    self._close(pooled)
+                    with self._condition:
+                        self._counters['failed_health_check'] += 1
+                        self._counters['closed'] += 1
+                    pooled = None
+            if pooled is not None:
+                return pooled
+
+        # Either the pool had room or the idle connection was dead,
+        # a slot is reserved for us in both cases
+        try:
+            pooled = self._connect()
+        except Exception:
+            with self._condition:
+                self._open_count -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._counters['created'] += 1
+        return pooled
+
+    def _checkin(self, pooled, discard=False):
+        """Returns a connection to the pool.
+
+        :param pooled: Connection previously checked out
+        :param bool discard: Close the connection instead of reusing it
+
+        """
+        pooled.last_used = time.time()
+        with self._condition:
+            if discard:
+                self._open_count -= 1
+                self._counters['closed'] += 1
+            else:
+                self._idle.append(pooled)
+            self._condition.notify()
+        if discard:
+            self._close(pooled)
+
+    def cursor(self, cursorclass=None, atomic=False):
+        """Returns a context manager yielding a cursor on a pooled
+        connection.  See the module documentation for transaction
+        semantics.
+
+        :param cursorclass: Optional :mod:`MySQLdb.cursors` class
+        :param bool atomic: Roll back everything if any nested block
+                            fails, only for an outermost block
+        :rtype: :class:`PooledCursor`
+
+        """
+        return PooledCursor(self, cursorclass, atomic)
+
+    def after_commit(self, callback, on_rollback=False):
+        """Calls ``callback()`` once the outermost ``cursor()`` block
+        of the calling thread has committed, or straight away if the
+        thread holds no connection.
+
+        :param callable callback:
+        :param bool on_rollback: Also call it if the transaction is
+                                 rolled back
+
+        """
+        local = self._local
+        if getattr(local, 'depth', 0) == 0:
+            callback()
+        else:
+            local.callbacks.append((callback, on_rollback))
+
+    def close_all(self):
+        """Closes every idle connection.  Connections currently in use
+        are closed when they are checked back in past ``max_idle``.
+
+        """
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open_count -= len(idle)
+            self._counters['closed'] += len(idle)
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self):
+        """Returns a snapshot of the pool counters.
+
+        :rtype: dict
+
+        """
+        with self._condition:
+            stats = dict(self._counters)
+            stats['open'] = self._open_count
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._open_count - len(self._idle)
+            stats['max_size'] = self.max_size
+        if stats['checkouts']:
+            stats['checkout_wait_avg'] = (stats['checkout_wait_total'] /
+                                          stats['checkouts'])
+        else:
+            stats['checkout_wait_avg'] = 0.0
+        return stats
+
+
+class PooledCursor(object):
+    """Context manager returned by :func:`ConnectionPool.cursor`."""
+
+    def __init__(self, pool, cursorclass=None, atomic=False):
+        self.pool = pool
+        self.cursorclass = cursorclass
+        self.atomic = atomic
+        self._cursor = None
+        self._outermost = False
+
+    def __enter__(self):
+        local = self.pool._local
+        if getattr(local, 'depth', 0) == 0:
+            local.pooled = self.pool._checkout()
+            local.depth = 0
+            local.atomic = self.atomic
+            # First error raised through a nested block, if atomic
+            local.failure = None
+            # Deferred by after_commit
+            local.callbacks = []
+            self._outermost = True
+        local.depth += 1
+        connection = local.pooled.connection
+        try:
+            if self.cursorclass is None:
+                self._cursor = connection.cursor()
+            else:
+                self._cursor = connection.cursor(self.cursorclass)
+        except Exception:
+            if self._outermost:
+                self._release(discard=True)
+            else:
+                # The outer block still holds the connection
+                local.depth -= 1
+            raise
+        return self._cursor
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            self._cursor.close()
+        except mdb.Error:
+            pass
+        local = self.pool._local
+        if not self._outermost:
+            local.depth -= 1
+            if (local.atomic and local.failure is None and
+                    exc_type is not None and issubclass(exc_type, mdb.Error)):
+                local.failure = (exc_type, exc_value)
+            return False
+
+        connection = local.pooled.connection
+        callbacks = local.callbacks
+        # A nested block failed and its error was caught
+        failure = None
+        if exc_type is None and local.failure is not None:
+            failure = local.failure
+            (exc_type, exc_value) = failure
+        discard = False
+        try:
+            if exc_type is None:
+                connection.commit()
+            else:
+                connection.rollback()
+        except mdb.Error:
+            # The connection is unusable, make sure it is not reused
+            discard = True
+            if exc_type is None:
+                self._release(discard)
+                _run_callbacks(callbacks, committed=False)
+                raise
+        if exc_type is not None and issubclass(exc_type,
+                                               mdb.OperationalError):
+            discard = True
+        self._release(discard)
+        _run_callbacks(callbacks, committed=exc_type is None)
+        if failure is not None:
+            raise DatabaseTransactionRolledBack(error=failure[1])
+        return False
+
+    def _release(self, discard=False):
+        """Hands the thread's connection back to the pool."""
+        local = self.pool._local
+        pooled = local.pooled
+        local.pooled = None
+        local.depth = 0
+        local.failure = None
+        local.callbacks = []
+        self.pool._checkin(pooled, discard)
+
+
+def _run_callbacks(callbacks, committed):
+    """Calls the callbacks deferred by
+    :func:`ConnectionPool.after_commit` once a transaction has ended.
+
+    :param list callbacks: ``(callback, on_rollback)`` pairs
+    :param bool committed: Whether the transaction was committed
+
+    """
+    for (callback, on_rollback) in callbacks:
+        if committed or on_rollback:
+            try:
+                callback()
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+
+
+def _pool_settings():
+    """Reads the optional ``pool_*`` keys of the ``mysql`` section of
+    the configuration file.
+
+    :rtype: dict
+
+    """
+    mysql_config = config.CONFIG.get('mysql', {})
+    return {
+        'max_size': mysql_config.get('pool_size', 10),
+        'checkout_timeout': mysql_config.get('pool_checkout_timeout', 10),
+        'max_idle': mysql_config.get('pool_max_idle', 300),
+        'ping_after': mysql_config.get('pool_ping_after', 5),
+    }
+
+
+def get_pool(mysql_host, mysql_username, mysql_password, mysql_db):
+    """Returns the pool for the given credentials, creating it on the
+    first call.  Every caller using the same credentials shares a
+    single pool.
+
+    :param str mysql_host:
+    :param str mysql_username:
+    :param str mysql_password:
+    :param str mysql_db:
+    :rtype: :class:`ConnectionPool`
+
+    """
+    key = (mysql_host, mysql_username, mysql_password, mysql_db)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            LOGGER.info("Creating MySQL connection pool for %s@%s/%s",
+                        mysql_username, mysql_host, mysql_db)
+            pool = ConnectionPool(mysql_host, mysql_username,
+                                  mysql_password, mysql_db,
+                                  **_pool_settings())
+            _POOLS[key] = pool
+        return pool
+
+
+def get_default_pool():
+    """Returns the pool for the credentials in the manager
+    configuration file.
+
+    :rtype: :class:`ConnectionPool`
+
+    """
+    mysql_config = config.CONFIG['mysql']
+    return get_pool(mysql_config['mysql_host'],
+                    mysql_config['mysql_username'],
+                    mysql_config['mysql_password'],
+                    mysql_config['mysql_db'])
@@ -0,0 +1,174 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Measures the dispatch throughput and the timeout behaviour of
+:class:`aurora.dispatcher.Dispatcher` over the in-process broker of
+:mod:`aurora.local_broker`, so runs are repeatable and need neither a
+RabbitMQ server nor access points::
+
+    python dispatch_benchmark.py --aps 200 --messages 20 --workers 4
+
+Three phases are reported, each with its wall time and the latency
+percentiles of its messages:
+
+* ``replies`` -- every access point is sent ``--messages`` messages
+  with :func:`dispatch_many <aurora.dispatcher.Dispatcher.\
+dispatch_many>` and answers each of them.
+* ``timeouts`` -- ``--silent`` access points drop every message, so
+  their requests time out after ``--timeout`` seconds.  The latency
+  past the timeout shows how late the timeout scheduler fires.
+* ``returns`` -- messages to access points without a queue are
+  returned by the broker and fail without waiting for the timeout.
+
+"""
+import argparse
+import logging
+import threading
+import time
+
+from aurora.dispatcher import Dispatcher
+from aurora.local_broker import LocalBroker, LocalTransport, SimulatedAgent
+from aurora.request_registry import REPLIED, TIMED_OUT, FAILED, wait_all
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _NoDatabase(object):
+    """Stands in for :class:`aurora.aurora_db.AuroraDB`, the dispatcher
+    only needs it to send its startup 'SYN' to known access points.
+
+    """
+    def ap_status_unknown(self):
+        pass
+
+    def get_ap_list(self):
+        return []
+
+
+class Recorder(object):
+    """Response and timeout callbacks of the dispatcher, recording
+    when each request got its outcome.
+
+    """
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self._lock = threading.Lock()
+        self.finished = {}
+
+    def _finish(self, correlation_id):
+        with self._lock:
+            self.finished[correlation_id] = time.time()
+
+    def on_response(self, channel, method, props, body):
+        self.dispatcher.remove_request(props.correlation_id)
+        self._finish(props.correlation_id)
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    def on_timeout(self, ap_slice_id, ap, correlation_id):
+        self._finish(correlation_id)
+
+
+def percentile(values, fraction):
+    """Returns the value below which ``fraction`` of values fall."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run_phase(label, dispatcher, recorder, aps, messages, timeout,
+              expected, offset=0.0):
+    """Dispatches ``messages`` messages to each access point and
+    prints how long they took to get their outcome.
+
+    :param float timeout: Seconds before the requests time out
+    :param str expected: Outcome every handle should have
+    :param float offset: Subtracted from each latency, eg. the timeout
+
+    """
+    dispatcher.TIMEOUT = timeout
+    batch = [({'command': 'get_stats', 'slice': 'admin'}, ap, None)
+             for _ in range(messages) for ap in aps]
+    start = time.time()
+    handles = dispatcher.dispatch_many(batch)
+    queued = time.time() - start
+    outcomes = wait_all(handles, timeout + 10)
+    elapsed = time.time() - start
+
+    latencies = []
+    for handle in handles:
+        finished = recorder.finished.get(handle.correlation_id)
+        if finished is not None:
+            latencies.append((finished - start - offset) * 1000)
+    unexpected = len([outcome for outcome in outcomes
+                      if outcome != expected])
+    print "\n%s: %s messages in %.3f s (queued in %.3f s), %.0f/s" % (
+        label, len(handles), elapsed, queued, len(handles) / elapsed)
+    print "    latency ms  p50=%.1f  p90=%.1f  p99=%.1f  max=%.1f" % (
+        percentile(latencies, 0.5), percentile(latencies, 0.9),
+        percentile(latencies, 0.99), max(latencies or [0.0]))
+    if unexpected:
+        print "    %s messages did not end %s" % (unexpected, expected)
+
+
+def main():
+    """Interface for running the dispatch benchmark."""
+    # Returned messages and timeouts are expected, only errors matter
+    logging.basicConfig(level=logging.ERROR)
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--aps', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=10,
+                        help="Messages per access point")
+    parser.add_argument('--silent', type=int, default=10,
+                        help="Access points which never reply")
+    parser.add_argument('--missing', type=int, default=10,
+                        help="Access points without a queue")
+    parser.add_argument('--timeout', type=float, default=2.0,
+                        help="Seconds before a request to a silent "
+                             "access point times out")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Threads handling replies")
+    parser.add_argument('--delay', type=float, default=0,
+                        help="Seconds each access point takes to reply")
+    args = parser.parse_args()
+
+    broker = LocalBroker()
+    agents = []
+    for index in range(args.aps):
+        agents.append(SimulatedAgent(broker, 'bench-ap-%s' % index,
+                                     delay=args.delay))
+    for index in range(args.silent):
+        agents.append(SimulatedAgent(broker, 'bench-silent-%s' % index,
+                                     drop=lambda message: True))
+    for agent in agents:
+        agent.start()
+
+    dispatcher = Dispatcher('localhost', None, None, None, None,
+                            _NoDatabase(), transport=LocalTransport(broker),
+                            response_workers=args.workers)
+    recorder = Recorder(dispatcher)
+    dispatcher.set_response_callback(recorder.on_response)
+    dispatcher.set_timeout_callback(recorder.on_timeout)
+    dispatcher.set_close_pollers_callback(lambda: None)
+    dispatcher.start_connection()
+    try:
+        run_phase("replies", dispatcher, recorder,
+                  ['bench-ap-%s' % index for index in range(args.aps)],
+                  args.messages, Dispatcher.TIMEOUT, REPLIED)
+        run_phase("timeouts", dispatcher, recorder,
+                  ['bench-silent-%s' % index for index in range(args.silent)],
+                  1, args.timeout, TIMED_OUT, offset=args.timeout)
+        run_phase("returns", dispatcher, recorder,
+                  ['bench-missing-%s' % index
+                   for index in range(args.missing)],
+                  1, Dispatcher.TIMEOUT, FAILED)
+        print "\nbroker %s" % broker.stats()
+    finally:
+        dispatcher.stop()
+        for agent in agents:
+            agent.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -17,12 +17,18 @@ import time
 import uuid
 import weakref
 
-import pika
-
+from aurora import codec
+from aurora.ap_lock import APLocks
 from aurora.cls_logger import get_cls_logger
-from aurora.ap_provision import writer as provision
+from aurora.config_versions import CONFIG_VERSION_HEADER, ConfigVersions
+from aurora.config_versions import CONFIG_CHANGED_HEADER
 from aurora.stop_thread import *
+from aurora.timeout_scheduler import TimeoutScheduler
 from aurora.exc import *
+from aurora.publisher import DeferredAckChannel, Publisher
+from aurora.request_registry import *
+from aurora.transport import PikaTransport
+from aurora.worker_pool import ShardedWorkerPool
 
 PIKA_LOGGER = logging.getLogger('pika')
 PIKA_LOGGER.setLevel(logging.INFO)
@@ -36,21 +42,52 @@ class Dispatcher(object):
     to a specific access point.
 
     """
-    lock = []
     TIMEOUT = 45
+    #: Seconds to wait for the replies to a broadcast 'SYN'
+    SYN_BROADCAST_TIMEOUT = 15
     RESTART_TIMEOUT = 30
     WAIT_TO_DISPATCH_TIMEOUT = 5
-    SPLIT_SECOND = 1
-    WAIT_TIME_INTERVAL = 0.25
 
     dispatch_count = 0
     status_closing = False
 
     def __init__(self, host, username, password, mysql_username, 
-                 mysql_password, aurora_db, queue=''):
+                 mysql_password, aurora_db, queue='', confirms=False, 
+                 confirm_window=100, publish_retries=3, 
+                 broadcast_exchange=None, transport=None, compress=False,
+                 binary=False, telemetry_queue=None, 
+                 telemetry_interval=None, response_workers=0, prefetch=0):
         """Configures a dispatcher instance in order to set up 
         connections, channels, and queues.
 
+        :param bool confirms: Enables publisher confirms, see 
+                              :class:`aurora.publisher.Publisher`
+        :param int confirm_window: Most messages awaiting a confirm
+        :param int publish_retries: Times a nacked message is resent
+        :param str broadcast_exchange: Fanout exchange to which access 
+                                       point queues are bound, see 
+                                       :func:`broadcast`
+        :param transport: :class:`Transport \
+            <aurora.transport.Transport>` connecting to the broker, 
+            :class:`PikaTransport <aurora.transport.PikaTransport>` 
+            if None
+        :param bool compress: Compresses the messages sent to access 
+                              points which accept it, see 
+                              :mod:`aurora.codec`
+        :param bool binary: Serializes the messages sent to access 
+                            points which accept it with msgpack
+        :param str telemetry_queue: Queue to which access points push 
+                                    their stats, see 
+                                    :func:`set_telemetry_callback`
+        :param float telemetry_interval: Seconds between pushes
+        :param int response_workers: Threads handling replies and 
+                                     telemetry, in order per access 
+                                     point, see :func:`_on_response`.  
+                                     Replies are handled on the IOLoop 
+                                     thread if 0.
+        :param int prefetch: Most replies delivered and not yet acked, 
+                             0 for no limit
+
         """
         self.LOGGER = get_cls_logger(self)
         self.LOGGER.info("Constructing Dispatcher...")
@@ -59,16 +96,54 @@ class Dispatcher(object):
         self.host = host
         self.username = username
         self.password = password
-        Dispatcher.lock = []
+        if transport is None:
+            transport = PikaTransport()
+        self.transport = transport
+        # Dispatches and replies are serialized per access point
+        self.lock = APLocks()
+        # pika channels are not thread-safe, messages are queued and 
+        # published by the IOLoop thread
+        self.publisher = Publisher(confirms=confirms, 
+                                   window=confirm_window,
+                                   max_retries=publish_retries,
+                                   on_returned=self._message_returned)
+        # Set while a channel is open and consuming replies
+        self._channel_ready = threading.Event()
         self.restarting_connection = False
         self.aurora_db = aurora_db
         self.timeout_callback = None
         self.response_callback = None
         self.close_pollers_callback = None
+        self.telemetry_callback = None
         self.queue = queue
-
-        # Create list for requests sent out
-        self.requests_sent = []
+        self.telemetry_queue = telemetry_queue
+        self.telemetry_interval = telemetry_interval
+        self.broadcast_exchange = broadcast_exchange
+        self.compress = compress
+        self.binary = binary
+        # ap -> (content_type, content_encoding) of the messages sent 
+        # to it, negotiated from its last message
+        self._encodings = {}
+        # Configuration versions of the access points, sent with each 
+        # message so replies only carry what changed
+        self.config_versions = ConfigVersions()
+
+        # Requests sent out, indexed by correlation ID and AP
+        self.requests_sent = RequestRegistry()
+        # Reply timeouts of all requests run on one thread, grouped by
+        # access point
+        self.timeouts = TimeoutScheduler()
+        self.timeouts.start()
+
+        self.prefetch = prefetch
+        # Replies are acked once handled, so a worker queue the size of
+        # the prefetch never makes the IOLoop wait
+        self.response_workers = None
+        if response_workers:
+            self.response_workers = ShardedWorkerPool(
+                response_workers, queue_size=prefetch or 1000
+            )
+            self.response_workers.start()
 
 
     def __del__(self):
@@ -93,10 +168,22 @@ class Dispatcher(object):
         """
         self.response_callback = response_callback
 
+    def set_telemetry_callback(self, telemetry_callback):
+        """Stores a method which will be executed upon receipt of 
+        stats pushed by an access point.  Telemetry is consumed 
+        without acknowledgements and is not matched to any request, 
+        so no timers or locks are involved.  Only used if a 
+        telemetry queue is configured.
+
+        :param callable telemetry_callback:
+
+        """
+        self.telemetry_callback = telemetry_callback
+
     def set_close_pollers_callback(self, close_pollers_callback):
         """Stores a method which will close all AP pollers (see 
-        :func:`close_all_poller_threads \
-            <aurora.ap_monitor.APMonitor.close_all_poller_threads>`) in 
+        :func:`close_all_pollers \
+            <aurora.ap_monitor.APMonitor.close_all_pollers>`) in 
         case the connection dies and needs to be restarted.
 
         :param callable close_pollers_callback:
@@ -118,13 +205,10 @@ class Dispatcher(object):
         """
         self.channel = None
         self.connection = None
-        credentials = pika.PlainCredentials(self.username, self.password)
-        self.connection = pika.SelectConnection(
-            pika.ConnectionParameters(
-                host=self.host,
-                credentials=credentials
-            ),
-            self.on_connected)
+        self.connection = self.transport.connect(self.host, 
+                                                 self.username, 
+                                                 self.password,
+                                                 self.on_connected)
 
         # Start ioloop, this will quit by itself when 
         # Dispatcher().stop() is run
@@ -164,13 +248,31 @@ class Dispatcher(object):
 
     def on_queue_declared(self, frame):
         """Step 4: Store the returned reply queue and track it for 
-        future reference by access points in AP provision database.
+        future reference by access points, in the AP provision database 
+        with pika (see :func:`Transport.announce_reply_queue \
+            <aurora.transport.Transport.announce_reply_queue>`).
 
         :param pika.frame.Method frame:
 
         """
         self.callback_queue = frame.method.queue
-        provision.update_reply_queue(self.callback_queue)
+        self.transport.announce_reply_queue(self.callback_queue)
+        if self.broadcast_exchange:
+            # Positional arguments, the keyword for the exchange type 
+            # differs between pika versions
+            self.channel.exchange_declare(self.on_exchange_declared,
+                                          self.broadcast_exchange,
+                                          'fanout')
+        else:
+            self.consume_on_queue(self.callback_queue)
+
+    def on_exchange_declared(self, frame):
+        """Step 4b: The broadcast exchange exists, continue with 
+        :func:`consume_on_queue`.
+
+        :param pika.frame.Method frame:
+
+        """
         self.consume_on_queue(self.callback_queue)
 
     def consume_on_queue(self, queue):
@@ -189,14 +291,44 @@ class Dispatcher(object):
         :param str queue: The queue to which access points will respond
 
         """
-        self.channel.basic_consume(self.response_callback,
-                                   queue=queue)
+        if self.prefetch:
+            self.channel.basic_qos(prefetch_count=self.prefetch)
+        if self.response_workers is not None:
+            self.channel.basic_consume(self._on_response, queue=queue)
+        else:
+            self.channel.basic_consume(self.response_callback,
+                                       queue=queue)
+        if self.telemetry_queue and self.telemetry_callback is not None:
+            self.channel.queue_declare(
+                auto_delete=True,
+                queue=self.telemetry_queue,
+                callback=self.on_telemetry_queue_declared
+            )
+        self.publisher.attach(self.connection, self.channel)
+        self._channel_ready.set()
         if self.restarting_connection:
             self.restarting_connection = False
         else:
             self._start_pika_channel_open_monitor()
             self._send_manager_up_status()
 
+    def on_telemetry_queue_declared(self, frame):
+        """Step 5b: Consume the telemetry queue with 
+        :func:`set_telemetry_callback`, and tell access points to push 
+        their stats to it.
+
+        :param pika.frame.Method frame:
+
+        """
+        telemetry_callback = self.telemetry_callback
+        if self.response_workers is not None:
+            telemetry_callback = self._on_telemetry
+        self.channel.basic_consume(telemetry_callback,
+                                   queue=frame.method.queue,
+                                   no_ack=True)
+        self.transport.announce_telemetry(frame.method.queue,
+                                          self.telemetry_interval)
+
     def ioloop_thread_start_target(self):
         """A target method for a thread in which pika's IOLoop can run.
         Since some exceptions can happen in the IOLoop thread, catch 
@@ -228,25 +360,32 @@ class Dispatcher(object):
 
         """
         self._stop_pika_channel_open_monitor()
+        if self.response_workers is not None:
+            # Replies already received are handled and acked first
+            self.response_workers.stop()
         self._stop_connection()
+        self.timeouts.stop()
 
         del self.connection
         del self.listener
         del self.timeout_callback
         del self.response_callback
+        del self.telemetry_callback
         del self.close_pollers_callback
 
     def _stop_connection(self):
         """Runs cleanup to stop the dispatcher's connection with 
         RabbitMQ.  
 
-        Stops the poller threads created in AP Monitor so 
+        Stops the AP Monitor pollers so 
         they will not try and send a message while the connection is 
         down. Also stops the timers associated with sent messages - 
         if we cannot receive a reply it doesn't make sense to wait for 
         one.
 
         """
+        self._channel_ready.clear()
+        self.publisher.detach()
         self.close_pollers_callback()
         self.LOGGER.info("Stopping all request timers")
         self._stop_all_request_sent_timers()
@@ -256,7 +395,6 @@ class Dispatcher(object):
                              self.connection.connection_state)
             Dispatcher.status_closing = True
             self.connection.close()
-            Dispatcher.lock = []
         except AttributeError as e:
             self.LOGGER.debug("Connection already closed...")
             
@@ -309,29 +447,44 @@ class Dispatcher(object):
         self._send_manager_up_status()
 
     def _stop_all_request_sent_timers(self):
-        """Empties the list tracking sent requests, and cancels all 
-        associated timers.
+        """Empties the registry tracking sent requests, and cancels 
+        all associated timers.
 
         """
-        while self.requests_sent:
-            entry = self.requests_sent.pop()
-            self.LOGGER.info("Cancelling timer %s", entry[1])
-            entry[1].cancel()
+        self.LOGGER.info("Cancelling %s timers", len(self.requests_sent))
+        self.timeouts.cancel_all()
+        for request in self.requests_sent.pop_all():
+            if request.handle is not None:
+                request.handle.resolve(CANCELLED)
 
     def _send_manager_up_status(self):
         """Dispatches a 'SYN' message to all known access points.  If 
         the access points respond, they are marked as 'UP', otherwise, 
         after some timeout, they will be marked as 'DOWN'.
 
+        With a broadcast exchange a single message reaches every 
+        access point.  Those which do not answer in 
+        :attr:`SYN_BROADCAST_TIMEOUT`, eg. because their agent does not 
+        bind to the exchange, are sent their own 'SYN'.
+
         """
         self.aurora_db.ap_status_unknown()
-        for ap in self.aurora_db.get_ap_list():
-            try:
-                self.dispatch({'command':'SYN'}, ap)
-            except AuroraException as e:
-                self.LOGGER.warn(e.message)
-            except Exception as e:
-                traceback.print_exc(file=sys.stdout)
+        aps = self.aurora_db.get_ap_list()
+        try:
+            if self.broadcast_exchange:
+                self.broadcast({'command':'SYN'}, aps, 
+                               self.SYN_BROADCAST_TIMEOUT,
+                               on_missing=self._send_syn)
+            else:
+                self._send_syn(aps)
+        except AuroraException as e:
+            self.LOGGER.warn(e.message)
+        except Exception as e:
+            traceback.print_exc(file=sys.stdout)
+
+    def _send_syn(self, aps):
+        """Dispatches a 'SYN' message to each access point."""
+        self.dispatch_many([({'command':'SYN'}, ap, None) for ap in aps])
 
     def _start_pika_channel_open_monitor(self):
         """Creates a thread which will monitor the pika connection.  
@@ -391,20 +544,18 @@ class Dispatcher(object):
 
         Some issues occur if this method is called many times in 
         parallel for the same AP, thus a access-point dependent lock 
-        is used. Everything should be OK when dispatching in parallel 
-        to many different APs.
+        is used (see :class:`aurora.ap_lock.APLocks`).  Callers for 
+        the same AP are served in order, dispatching in parallel to 
+        many different APs never waits.
 
         .. note::
 
             This issue also happens when sending and receiving for 
             the same AP in parallel, thus when the messages are 
             received by the callable in ``self.response_callback``, 
-            this lock should be checked::
+            this lock should be waited on::
 
-                if ap_name in Dispatcher.lock:
-                    LOGGER.info("Locked for %s, waiting...", ap_name)
-                    while ap_name in Dispatcher.lock:
-                        time.sleep(0.1)
+                self.dispatcher.lock.wait_unlocked(ap_name)
 
         .. note::
 
@@ -415,6 +566,9 @@ class Dispatcher(object):
         :param str ap: Access point on which slice should be created 
         :param str unique_id: Unique ID to be assigned as the AMQP
                               correlation ID
+        :returns: :class:`DispatchHandle \
+            <aurora.request_registry.DispatchHandle>` -- Resolved once 
+            the access point replies or the request times out
         :raises: 
             :exc:`DispatchLockedForAPTimeout \
                 <aurora.exc.DispatchLockedForAPTimeout>`\n
@@ -422,19 +576,10 @@ class Dispatcher(object):
                 <aurora.exc.MessageSendAttemptWhileClosing>`\n
             :exc:`DispatchWaitForOpenChannelTimeout \
                 <aurora.exc.DispatchWaitForOpenChannelTimeout>`\n
-            :exc:`KeyboardInterrupt`\n
 
         """
 
-        # Create unique_id if none exists
-        if unique_id is None:
-            unique_id = "%s-%s" % (ap, str(uuid.uuid4()))
-        else:
-            unique_id = "%s-%s" % (ap, unique_id)
-
-        # Convert JSON to string
-        message = json.dumps(config)
-        self.LOGGER.debug(message)
+        unique_id = self._correlation_id(ap, unique_id)
 
         # Send JSON
         # We attach a reply_to and correlation ID to tell the AP to send 
@@ -445,113 +590,406 @@ class Dispatcher(object):
         # for more info
         
         # Errors happen if too many people try and publish and receive
-        # at the same time, thus a primitive lock for each access
-        # point is used.  The lock contains a list of access point
-        # names which are currently being dispatched to.  If another
-        # dispatch call is running, the list will have a non-zero
-        # length, but as long as we are not dispatching to the same
-        # access point we can continue.
-        wait_timer = 0
-        if ap in Dispatcher.lock:
+        # at the same time for the same access point, thus a lock per
+        # access point is held until the message is queued for the
+        # IOLoop thread.  Dispatches to other access points are not 
+        # delayed.
+        if ap in self.lock:
             self.LOGGER.info("Locked for %s, waiting...", ap)
-            wait_timer = 0
-            while ap in Dispatcher.lock:
-                if wait_timer > self.WAIT_TO_DISPATCH_TIMEOUT:
-                    raise DispatchLockedForAPTimeout(ap=ap)
-                wait_timer += self.WAIT_TIME_INTERVAL
-                time.sleep(self.WAIT_TIME_INTERVAL)
-
-        # For safety, in the case that another call to this method is 
-        # already executing, delay by a split second.
-        
+        if not self.lock.acquire(ap, self.WAIT_TO_DISPATCH_TIMEOUT):
+            raise DispatchLockedForAPTimeout(ap=ap)
+        self.LOGGER.debug("Locked for %s", ap)
+        try:
+            return self._dispatch_locked(config, ap, unique_id)
+        finally:
+            self.LOGGER.debug("Unlocking for %s...", ap)
+            self.lock.release(ap)
+
+    def _dispatch_locked(self, config, ap, unique_id):
+        """Starts the reply timer of a message and queues it for 
+        publishing, once the access point's lock is held.  See 
+        :func:`dispatch`.
+
+        """
+        self._check_channel()
+        handle = DispatchHandle(unique_id, ap, self._subject(config))
+        # Start a timeout countdown
+        self.LOGGER.debug("ap_slice_id %s", handle.subject)
+        (request,) = self._register([(config, handle)])
+        self._publish(config, request)
+        return handle
+
+    def dispatch_many(self, messages):
+        """Sends many messages in one pass, eg. the same command to 
+        many access points.
+
+        The channel is checked once, every request and its reply 
+        timeout is registered in bulk, then all messages are queued 
+        for the IOLoop thread, which publishes them back to back.  The 
+        access point locks of :func:`dispatch` are not taken: requests 
+        are registered before being published, so a reply always finds 
+        its request.
+
+        :param list messages: ``(config, ap, unique_id)`` tuples, see 
+                              :func:`dispatch`.  unique_id may be None.
+        :returns: list -- One :class:`DispatchHandle \
+            <aurora.request_registry.DispatchHandle>` per message, in 
+            order.  Handles of messages which cannot be published are 
+            resolved as failed.
+        :raises: 
+            :exc:`MessageSendAttemptWhileClosing \
+                <aurora.exc.MessageSendAttemptWhileClosing>`\n
+            :exc:`DispatchWaitForOpenChannelTimeout \
+                <aurora.exc.DispatchWaitForOpenChannelTimeout>`\n
+
+        """
+        self._check_channel()
+        entries = []
+        for (config, ap, unique_id) in messages:
+            unique_id = self._correlation_id(ap, unique_id)
+            entries.append(
+                (config, DispatchHandle(unique_id, ap, self._subject(config)))
+            )
+        requests = self._register(entries)
+        for ((config, handle), request) in zip(entries, requests):
+            self._publish(config, request)
+        self.LOGGER.info("Queued %s messages", len(requests))
+        return [handle for (config, handle) in entries]
+
+    def broadcast(self, config, aps, timeout, on_missing=None):
+        """Sends one message to every access point through the fanout 
+        exchange, waiting for the replies of ``aps``.
+
+        Access points reply with their name prepended to the message's 
+        correlation ID, so each reply finds its own request.  The 
+        requests share a single deadline instead of a timeout each.  
+        Access points which have not replied by then are passed to 
+        ``on_missing``, or handled by the timeout callback if it is 
+        None.  The same happens right away if the broker returns the 
+        message.
+
+        :param dict config: Message to send
+        :param list aps: Names of the access points expected to reply
+        :param float timeout: Seconds to wait for all replies
+        :param on_missing: Callable taking a list of access point names
+        :returns: list -- One :class:`DispatchHandle \
+            <aurora.request_registry.DispatchHandle>` per access point
+        :raises: 
+            :exc:`MessageSendAttemptWhileClosing \
+                <aurora.exc.MessageSendAttemptWhileClosing>`\n
+            :exc:`DispatchWaitForOpenChannelTimeout \
+                <aurora.exc.DispatchWaitForOpenChannelTimeout>`\n
+
+        """
+        self._check_channel()
+        broadcast_id = str(uuid.uuid4())
+        group = Broadcast(broadcast_id, aps)
+        subject = self._subject(config)
+        handles = []
+        for ap in aps:
+            correlation_id = self._correlation_id(ap, broadcast_id)
+            handle = DispatchHandle(correlation_id, ap, subject)
+            self.requests_sent.add(correlation_id, group.member(ap), 
+                                   subject, ap, config['command'], handle)
+            handles.append(handle)
+        self.timeouts.schedule(broadcast_id, timeout, 
+                               self._broadcast_expired,
+                               args=(group, subject, on_missing))
+
+        headers = codec.accept_headers()
+        headers[CONFIG_VERSION_HEADER] = \
+            self.config_versions.known_versions(aps)
+        future = self.publisher.publish(
+            '', 
+            json.dumps(config),
+            self.transport.properties(
+                reply_to = self.callback_queue, 
+                correlation_id = broadcast_id, 
+                content_type=codec.JSON,
+                headers=headers
+            ),
+            correlation_id=broadcast_id,
+            exchange=self.broadcast_exchange
+        )
+        for handle in handles:
+            handle.published = future
+        future.add_done_callback(
+            lambda future: self._broadcast_published(group, subject, 
+                                                     on_missing, future)
+        )
+        self.LOGGER.info("Broadcast %s to %s access points", 
+                         config['command'], len(aps))
+        return handles
+
+    def _broadcast_published(self, group, subject, on_missing, future):
+        """Publish future callback of a broadcast."""
+        if not future.published:
+            self.LOGGER.warn("Broadcast %s not dispatched: %s", 
+                             group.broadcast_id, future.error)
+            # Expire now, from the timeout scheduler rather than the 
+            # IOLoop thread
+            if self.timeouts.cancel(group.broadcast_id) is not None:
+                self.timeouts.schedule(group.broadcast_id, 0, 
+                                       self._broadcast_expired,
+                                       args=(group, subject, on_missing))
+
+    def _broadcast_expired(self, group, subject, on_missing):
+        """Stops waiting for the replies to a broadcast, handling the 
+        access points which did not reply.
+
+        """
+        missing = []
+        for ap in group.take_pending():
+            correlation_id = self._correlation_id(ap, group.broadcast_id)
+            request = self.requests_sent.pop(correlation_id)
+            # Requests removed in the meantime, eg. by a 'SYN' from 
+            # the access point, are no longer waited for
+            if request is not None:
+                request.handle.resolve(TIMED_OUT)
+                missing.append(ap)
+        if not missing:
+            return
+        self.LOGGER.info("%s access points did not reply to broadcast %s",
+                         len(missing), group.broadcast_id)
+        if on_missing is not None:
+            try:
+                on_missing(missing)
+            except AuroraException as e:
+                self.LOGGER.warn(e.message)
+            return
+        for ap in missing:
+            self._request_timed_out(subject, ap, 
+                                    self._correlation_id(
+                                        ap, group.broadcast_id))
 
+    def _check_channel(self):
+        """Raises if no message can be published right now, waiting a 
+        little for a channel if none is open.
+
+        """
         if Dispatcher.status_closing:
             raise MessageSendAttemptWhileClosing()
+        # Dispatch, wait for a channel if none exists
+        if not self._channel_ready.wait(self.WAIT_TO_DISPATCH_TIMEOUT):
+            raise DispatchWaitForOpenChannelTimeout()
 
-        self.LOGGER.debug("Locking for %s...", ap)
-        Dispatcher.lock.append(ap)
+    def _correlation_id(self, ap, unique_id):
+        """Returns the correlation ID of a message, prepended by the 
+        access point name.  A UUID is generated if none is given.
 
-        current_dispatch_calls = len(Dispatcher.lock) - 1
-        if current_dispatch_calls > 0:
-            # If others are using method, wait for some variable amount
-            # of time, dependent on how many others are using it.
-            time.sleep(self.SPLIT_SECOND*current_dispatch_calls)
+        """
+        if unique_id is None:
+            unique_id = str(uuid.uuid4())
+        return "%s-%s" % (ap, unique_id)
 
-        # Dispatch, catch if no channel exists
-        wait_timer = 0
-        while True:
-            if wait_timer > self.WAIT_TO_DISPATCH_TIMEOUT:
-                raise DispatchWaitForOpenChannelTimeout()
-            try:
-                if self.connection.is_open and self.channel.is_open:
-                    break
-            except AttributeError:
-                pass
-            wait_timer += self.WAIT_TIME_INTERVAL
-            time.sleep(self.WAIT_TIME_INTERVAL)
-        die_by_kb = False
+    def _subject(self, config):
+        """Returns the ap_slice_id a message is about, or 'SYN'."""
+        if config['command'] == 'SYN':
+            return 'SYN'
+        return config['slice']
+
+    def _publish(self, config, request):
+        """Queues the message of a registered request for publishing.  
+        The request is dropped and its handle fails if the message 
+        cannot be published.
+
+        """
+        self.LOGGER.debug(config)
+        # Plain JSON unless the access point said it accepts better
+        (content_type, content_encoding) = self._encodings.get(
+            request.ap, (codec.JSON, None)
+        )
+        (message, content_encoding) = codec.encode(config, content_type,
+                                                   content_encoding)
+        headers = codec.accept_headers()
+        headers[CONFIG_VERSION_HEADER] = \
+            self.config_versions.known_version(request.ap)
+        future = self.publisher.publish(
+            request.ap, 
+            message, 
+            self.transport.properties(
+                reply_to = self.callback_queue, 
+                correlation_id = request.correlation_id, 
+                content_type=content_type,
+                content_encoding=content_encoding,
+                headers=headers
+            ),
+            correlation_id=request.correlation_id
+        )
+        request.handle.published = future
+        future.add_done_callback(
+            lambda future: self._published(request, future)
+        )
+
+    def _published(self, request, future):
+        """Publish future callback, runs on the IOLoop thread."""
+        if future.published:
+            self.LOGGER.info("Message for %s dispatched", request.ap)
+        elif isinstance(future.error, (MessageReturned, MessageNacked)):
+            self._message_lost(request, future.error)
+        else:
+            self.LOGGER.warn("Message for %s not dispatched: %s", 
+                             request.ap, future.error)
+            self._unregister(request, FAILED, future.error)
+
+    def _message_returned(self, correlation_id, error):
+        """Publisher callback for a message returned after its future 
+        completed, ie. without publisher confirms.
+
+        """
+        request = self.requests_sent.get(correlation_id)
+        if request is not None:
+            self._message_lost(request, error)
+
+    def _message_lost(self, request, error):
+        """Handles a message which the broker could not deliver as if 
+        its reply had timed out, without waiting for the timeout.
+
+        """
+        self.LOGGER.warn("%s, not waiting for a reply", error.message)
+        self._unregister(request, FAILED, error)
         try:
-            self.channel.basic_publish(
-                exchange='', 
-                routing_key=ap, 
-                body=message, 
-                properties=pika.BasicProperties(
-                    reply_to = self.callback_queue, 
-                    correlation_id = unique_id, 
-                    content_type="application/json"
-                )
-            )
-        except IndexError as e:
-            # Likely publishing the message didn't work
+            timeout_callback = self.timeout_callback
+        except AttributeError as e:
+            # Shutting down, see _request_timed_out
             self.LOGGER.warn(e.message)
-            try:
-                # Force the channel to close, the channel monitor should
-                # notice, and restart the channel
-                self.LOGGER.info("Forcing a channel close")
-                self._stop_connection()
-            except Exception:
-                traceback.print_exc(file=sys.stdout)
-        except KeyboardInterrupt:
-            die_by_kb = True
-        except Exception as e:
-            # A more serious error occured
-            traceback.print_exc(file=sys.stdout)
-            #self.LOGGER.error(e.message)
-        else:
-            self.LOGGER.info("Message for %s dispatched", ap)
-            ap_slice_id = 'NONE'
-            if config['command'] == 'SYN':
-                ap_slice_id = 'SYN'
-            else:
-                ap_slice_id = config['slice']
-            # Start a timeout countdown
-            self.LOGGER.debug("ap_slice_id %s",ap_slice_id)
-            
-            try:
-                timer = threading.Timer(self.TIMEOUT, 
-                                        self.timeout_callback, 
-                                        args=(ap_slice_id,ap,unique_id))
-            except AttributeError as e:
-                # Likely tried to start a timer while shutting down
-                # resulting in non-existance of timeout_callback 
-                self.LOGGER.warn(e.message)
+            return
+        timeout_callback(request.subject, request.ap, 
+                         request.correlation_id)
 
-            self.LOGGER.debug("Adding timer %s", timer)
-            self.requests_sent.append((unique_id, timer, ap_slice_id))
-            timer.start()
-            self.LOGGER.debug("requests_sent %s",self.requests_sent)
-            if len(self.requests_sent) > 0:
-                self.LOGGER.debug("Starting timer: %s",self.requests_sent[-1])
-            else:
-                self.LOGGER.error("Cannot start nonexistant timer")
+    def _register(self, entries):
+        """Starts the reply timeouts and tracks the requests of 
+        messages, in bulk.
+
+        :param list entries: ``(config, handle)`` tuples
+        :returns: list -- :class:`Request \
+            <aurora.request_registry.Request>` objects, in order
+
+        """
+        timers = self.timeouts.schedule_many([
+            (handle.correlation_id, self.TIMEOUT, self._request_timed_out,
+             (handle.subject, handle.ap, handle.correlation_id), handle.ap)
+            for (config, handle) in entries
+        ])
+        requests = []
+        for ((config, handle), timer) in zip(entries, timers):
+            requests.append(self.requests_sent.add(
+                handle.correlation_id, timer, handle.subject, handle.ap,
+                config['command'], handle
+            ))
+        return requests
+
+    def _unregister(self, request, outcome, error=None):
+        """Stops tracking a request and resolves its handle."""
+        self.requests_sent.pop(request.correlation_id)
+        request.timer.cancel()
+        if request.handle is not None:
+            request.handle.resolve(outcome, error)
+
+    def _request_timed_out(self, ap_slice_id, ap, unique_id):
+        """Timeout scheduler callback, resolves the request's handle 
+        and runs the timeout callback.
+
+        """
+        request = self.requests_sent.get(unique_id)
+        if request is not None and request.handle is not None:
+            request.handle.resolve(TIMED_OUT)
+        try:
+            timeout_callback = self.timeout_callback
+        except AttributeError as e:
+            # Likely timed out while shutting down, resulting in 
+            # non-existance of timeout_callback 
+            self.LOGGER.warn(e.message)
+            return
+        timeout_callback(ap_slice_id, ap, unique_id)
 
-        self.LOGGER.debug("Unlocking for %s...", ap)
+    def _on_response(self, channel, method, props, body):
+        """Consumer of the reply queue when replies are handled by 
+        workers.  Runs on the IOLoop thread and only finds which access 
+        point a reply is from, so the worker of that access point 
+        handles it with :func:`set_response_callback`.  The reply is 
+        acked from the IOLoop once handled, see 
+        :class:`aurora.publisher.DeferredAckChannel`.
+
+        """
+        self.response_workers.submit(
+            self.reply_ap(props, body), self._handle_response,
+            args=(DeferredAckChannel(self.publisher, channel), method, 
+                  props, body)
+        )
+
+    def _handle_response(self, channel, method, props, body):
+        """Runs the response callback on a worker thread."""
         try:
-            Dispatcher.lock.remove(ap)
-        except ValueError as e:
-            self.LOGGER.warn("Tried to remove nonexistant ap_name from lock")
-        if die_by_kb:
-            raise KeyboardInterrupt()
+            self.response_callback(channel, method, props, body)
+        finally:
+            if not channel.acked:
+                # Would hold a prefetch slot for good
+                channel.basic_ack(delivery_tag=method.delivery_tag)
+
+    def _on_telemetry(self, channel, method, props, body):
+        """Consumer of the telemetry queue when replies are handled by
+        workers, see :func:`_on_response`.  Pushes are dropped rather 
+        than making the IOLoop wait when the worker is busy, the next 
+        push carries newer stats anyway.  Pushes carrying config 
+        changes are waited for instead, as the next ones are diffed 
+        from them, see :data:`CONFIG_CHANGED_HEADER \
+        <aurora.config_versions.CONFIG_CHANGED_HEADER>`.
+
+        """
+        ap = self.reply_ap(props, body)
+        queued = self.response_workers.submit(
+            ap, self.telemetry_callback,
+            args=(DeferredAckChannel(self.publisher, channel), method, 
+                  props, body),
+            block=bool((props.headers or {}).get(CONFIG_CHANGED_HEADER))
+        )
+        if not queued:
+            self.LOGGER.debug("Workers busy, dropped telemetry from %s", 
+                              ap)
+
+    def reply_ap(self, props, body):
+        """Returns the name of the access point a message is from.  
+        Agents set it as the ``app_id`` of their messages, the body of 
+        messages from older agents is decoded to find it.
+
+        :param props: Properties of the message
+        :param str body:
+        :returns: str -- None if the message cannot be decoded
+
+        """
+        if props.app_id:
+            return props.app_id
+        try:
+            return codec.decode(body, props.content_type,
+                                props.content_encoding).get('ap')
+        except Exception:
+            # Left to the response callback to report
+            return None
+
+    def decode_response(self, props, body):
+        """Decodes the body of a message from an access point, and 
+        notes which encodings the access point accepts for the 
+        messages sent to it.
+
+        :param props: Properties of the message
+        :param str body:
+        :returns: dict -- The decoded message
+        :raises: 
+            :exc:`UnsupportedContentType \
+                <aurora.exc.UnsupportedContentType>`\n
+            :exc:`UnsupportedContentEncoding \
+                <aurora.exc.UnsupportedContentEncoding>`\n
+
+        """
+        decoded = codec.decode(body, props.content_type, 
+                               props.content_encoding)
+        ap = decoded.get('ap')
+        if ap is not None:
+            self._encodings[ap] = codec.negotiate(props.headers, 
+                                                  self.binary, 
+                                                  self.compress)
+        return decoded
 
     def get_open_channel(self):
         """Returns ``self.channel`` if it is open, otherwise 
@@ -562,19 +1000,6 @@ class Dispatcher(object):
             return self.channel
         return None
 
-    def _get_uuid_for_ap_syn(self, ap_syn):
-        """A factory for finding all messages by UUID sent to the 
-        access point name ``ap_syn``.
-
-        :param str ap_syn: Name of the access point for which messages 
-                           should be found.
-        :yields: List of message UUIDs for messages sent to AP
-
-        """
-        for request in self.requests_sent:
-            if request[0].startswith(ap_syn + '-'):
-                yield request[0]
-
     def have_request(self, correlation_id):
         """Checks whether a request for ``correlation_id`` was 
         previously sent.  If it was, returns a tuple containing a bool
@@ -582,16 +1007,29 @@ class Dispatcher(object):
 
         :param str correlation_id: Correlation ID to check
         :returns: tuple -- Index 0 is true if request exists, 
-                  index 1 contains the request or ``None``.
+                  index 1 contains the 
+                  :class:`Request <aurora.request_registry.Request>` 
+                  or ``None``.
 
         """
-        for request in self.requests_sent:
-            if request[0] == correlation_id:
-                return (True, request)
+        request = self.requests_sent.get(correlation_id)
+        if request is not None:
+            return (True, request)
         return (False, None)
 
+    def outstanding_requests(self, ap_name=None):
+        """Describes the requests still waiting for a reply, see 
+        :func:`RequestRegistry.outstanding \
+            <aurora.request_registry.RequestRegistry.outstanding>`.
+
+        :param str ap_name: Only describe requests sent to this AP
+        :rtype: dict
+
+        """
+        return self.requests_sent.outstanding(ap_name)
+
     def remove_request(self, message_uuid=None, ap_syn=None):
-        """Removes a request from the requests sent list and cancels 
+        """Removes a request from the requests sent and cancels 
         the associated timer.  If ap_syn is set, all requests for that 
         AP are removed and their timers cancelled -- at this point it 
         is known that the AP will not respond to any of the previously 
@@ -606,20 +1044,19 @@ class Dispatcher(object):
         # cancel them to create a clean slate.  User will have to 
         # manually restart failed slices. 
         if ap_syn:
-            for message_uuid in self._get_uuid_for_ap_syn(ap_syn):
-                (have_request, request) = self.have_request(message_uuid)
-                if have_request:
-                    self.LOGGER.debug("Cancelling timer %s", request[1])
-                    request[1].cancel()
-                    self.LOGGER.debug("Removing request %s", str(request))
-                    self.requests_sent.remove(request)
+            self.timeouts.cancel_group(ap_syn)
+            for request in self.requests_sent.pop_ap(ap_syn):
+                self.LOGGER.debug("Removing request %s", str(request))
+                if request.handle is not None:
+                    request.handle.resolve(CANCELLED)
         else:
-            (have_request, request) = self.have_request(message_uuid)
-            if have_request:
+            request = self.requests_sent.pop(message_uuid)
+            if request is not None:
                 self.LOGGER.debug("Cancelling timer %s", request[1])
                 request[1].cancel()
                 self.LOGGER.debug("Removing request %s", str(request))
-                self.requests_sent.remove(request)
+                if request.handle is not None:
+                    request.handle.resolve(REPLIED)
 
 
 # Menu loop; thanks Kevin
@@ -87,6 +87,24 @@ class APSliceAlreadyInWnetException(AuroraException):
 class NoSliceExistsException(AuroraException):
     message = "No slice %(ap_slice_id)s exists"
 
+class DatabasePoolTimeout(AuroraException):
+    message = "Timed out waiting for one of %(size)s database connections"
+
+class DatabaseTransactionRolledBack(AuroraException):
+    message = "Transaction rolled back after: %(error)s"
+
+#---------
+# Manager listing exceptions
+#
+class InvalidPageSize(AuroraException):
+    message = "Invalid --limit '%(limit)s', expected a positive number"
+
+class InvalidPageCursor(AuroraException):
+    message = "Invalid --cursor '%(cursor)s' for this listing"
+
+class InvalidUsageArgument(AuroraException):
+    message = "Invalid --%(option)s '%(value)s', expected %(expected)s"
+
 #---------
 # Provision Server exceptions
 #
@@ -121,4 +139,37 @@ class DispatchLockedForAPTimeout(DispatchTimeout):
     message = "Timeout occured during dispatch for %(ap)s"
 
 class DispatchWaitForOpenChannelTimeout(DispatchTimeout):
-    message = "Timeout occured waiting for open channel during dispatch"
\ No newline at end of file
+    message = "Timeout occured waiting for open channel during dispatch"
+
+class MessageReturned(AuroraException):
+    message = "Message for %(ap)s returned by the broker: %(reason)s"
+
+class MessageNacked(AuroraException):
+    message = "Message for %(ap)s rejected by the broker %(attempts)s times"
+
+#---------
+# Local broker related exceptions
+#
+class BrokerConnectionClosed(AuroraException):
+    message = "Connection to the local broker is closed"
+
+class BrokerChannelClosed(AuroraException):
+    message = "Channel %(channel)s of the local broker is closed"
+
+class BrokerQueueNotFound(AuroraException):
+    message = "No queue '%(queue)s' on the local broker"
+
+class BrokerExchangeNotFound(AuroraException):
+    message = "No exchange '%(exchange)s' on the local broker"
+
+class BrokerExchangeTypeNotSupported(AuroraException):
+    message = "Exchange type '%(exchange_type)s' is not supported"
+
+#---------
+# Message codec related exceptions
+#
+class UnsupportedContentType(AuroraException):
+    message = "Unsupported message content type %(content_type)s"
+
+class UnsupportedContentEncoding(AuroraException):
+    message = "Unsupported message content encoding %(content_encoding)s"
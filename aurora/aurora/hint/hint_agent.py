@@ -24,7 +24,7 @@ def hint(manager, args, tenant_id, user_id, project_id):
         else:
             tempList = filter.query(filter.join_table("ap", "location_tags", "name", "ap_name"), \
                     ["ap_name", "location_tags.name", "number_slice_free"], 
-                    ["status = 'UP'", 'number_slice_free > 0', 'ap_name = "%s"' % favored_ap])
+                    ["status = 'UP'", 'number_slice_free > 0', ('ap_name = %s', favored_ap)])
 
         message = {}
         message['ap_location'] = ""
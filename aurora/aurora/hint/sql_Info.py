@@ -15,10 +15,10 @@ import sys
 def verify_ssid(ap_slice_ssid, tenant_id):
     if len(ap_slice_ssid) == 0:
         return False
-    result = filter.query('ap_slice', ['ap_slice_ssid'], ['ap_slice_ssid = "%s"' % ap_slice_ssid, \
-                                                          'tenant_id = %s' % str(tenant_id), \
+    result = filter.query('ap_slice', ['ap_slice_ssid'], [('ap_slice_ssid = %s', ap_slice_ssid), \
+                                                          ('tenant_id = %s', str(tenant_id)), \
                                                           'status <> "DELETED"'])
     return len(result) == 0
 
 def checkSliceNumber(args):
-    return filter.query('ap', ['name', '(4 * number_radio - number_slice_free) AS occupied'], ['name = "%s"' % str(args)])
+    return filter.query('ap', ['name', '(4 * number_radio - number_slice_free) AS occupied'], [('name = %s', str(args))])
@@ -0,0 +1,1007 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""An in-process stand-in for the RabbitMQ server, so the dispatch and
+reply paths of :class:`aurora.dispatcher.Dispatcher` can be run and
+benchmarked without a broker or access points::
+
+    broker = LocalBroker()
+    agents = [SimulatedAgent(broker, 'ap%s' % i) for i in range(100)]
+    for agent in agents:
+        agent.start()
+    dispatcher = Dispatcher(host, username, password, mysql_username,
+                            mysql_password, aurora_db,
+                            transport=LocalTransport(broker))
+
+The broker keeps named queues and fanout exchanges.  Messages sent to
+the default exchange ``''`` are routed to the queue named by their
+routing key and keep their properties, eg. ``reply_to`` and
+``correlation_id``.  They are delivered to the consumers of a queue in
+turn, or kept until a consumer arrives.  Consumers without ``no_ack``
+hold at most the prefetch count set by ``basic_qos`` unacked, and
+unacked messages are not redelivered.  Mandatory messages which reach
+no queue are returned, and publishes are confirmed as soon as they
+are routed.
+
+Connections follow the pika API used by the dispatcher, see
+:mod:`aurora.transport`.  Their callbacks run on the thread calling
+``connection.ioloop.start()``, which returns once the connection
+closes.  Unlike pika, errors such as publishing to a missing exchange
+raise right away instead of closing the channel.
+
+"""
+import collections
+import copy
+import functools
+import heapq
+import itertools
+import logging
+import random
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+from aurora import codec
+from aurora import config_versions
+from aurora.cls_logger import get_cls_logger
+from aurora.exc import *
+from aurora.transport import Transport
+
+LOGGER = logging.getLogger(__name__)
+
+#: Reply code and text of a returned message
+NO_ROUTE = (312, 'NO_ROUTE')
+
+
+class Method(object):
+    """Body of a method frame, eg. ``Basic.Deliver``, with the
+    attributes of its pika counterpart.
+
+    """
+    def __init__(self, NAME, **fields):
+        self.NAME = NAME
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        return "<%s %s>" % (self.NAME,
+                            dict((key, value) for (key, value) in
+                                 self.__dict__.iteritems()
+                                 if key != 'NAME'))
+
+
+class Frame(object):
+    """A method frame, as passed to channel callbacks."""
+
+    def __init__(self, method):
+        self.method = method
+
+    def __repr__(self):
+        return "<Frame %r>" % self.method
+
+
+class BasicProperties(object):
+    """Message properties, taking the keywords of
+    :class:`pika.BasicProperties`.
+
+    """
+    __slots__ = ('content_type', 'content_encoding', 'headers',
+                 'delivery_mode', 'priority', 'correlation_id',
+                 'reply_to', 'expiration', 'message_id', 'timestamp',
+                 'type', 'user_id', 'app_id', 'cluster_id')
+
+    def __init__(self, **kwargs):
+        for field in self.__slots__:
+            setattr(self, field, kwargs.pop(field, None))
+        if kwargs:
+            raise TypeError("Unknown properties %s" % ', '.join(kwargs))
+
+    def __repr__(self):
+        return "<BasicProperties %s>" % dict(
+            (field, getattr(self, field)) for field in self.__slots__
+            if getattr(self, field) is not None
+        )
+
+
+class IOLoop(object):
+    """Runs the callbacks and timers of one connection on the thread
+    calling :func:`start`.  Any thread may add callbacks.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._callbacks = collections.deque()
+        # [deadline, sequence, callback], callback is None if removed
+        self._timers = []
+        self._sequence = itertools.count()
+        self._stopped = False
+
+    def add_callback_threadsafe(self, callback):
+        """Calls ``callback()`` on the IOLoop thread."""
+        with self._lock:
+            self._callbacks.append(callback)
+            self._wakeup.notify()
+
+    def add_timeout(self, deadline, callback):
+        """Calls ``callback()`` on the IOLoop thread in ``deadline``
+        seconds.
+
+        :returns: Handle for :func:`remove_timeout`
+
+        """
+        timer = [time.time() + deadline, next(self._sequence), callback]
+        with self._lock:
+            heapq.heappush(self._timers, timer)
+            if self._timers[0] is timer:
+                self._wakeup.notify()
+        return timer
+
+    def remove_timeout(self, timer):
+        with self._lock:
+            timer[2] = None
+
+    def start(self):
+        """Runs callbacks until :func:`stop` is called."""
+        while True:
+            with self._lock:
+                ready = self._pop_ready()
+                while not ready and not self._stopped:
+                    if self._timers:
+                        self._wakeup.wait(self._timers[0][0] - time.time())
+                    else:
+                        self._wakeup.wait()
+                    ready = self._pop_ready()
+                if self._stopped:
+                    break
+            for callback in ready:
+                try:
+                    callback()
+                except Exception:
+                    traceback.print_exc(file=sys.stdout)
+
+    def _pop_ready(self):
+        """Removes and returns the queued callbacks and those of the
+        timers which are due.  Must be called with the lock held.
+
+        """
+        ready = list(self._callbacks)
+        self._callbacks.clear()
+        now = time.time()
+        while self._timers and self._timers[0][0] <= now:
+            callback = heapq.heappop(self._timers)[2]
+            if callback is not None:
+                ready.append(callback)
+        return ready
+
+    def stop(self):
+        """Makes :func:`start` return, dropping pending callbacks."""
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify()
+
+
+class LocalConnection(object):
+    """A connection to a :class:`LocalBroker`."""
+
+    INIT = 'INIT'
+    OPEN = 'OPEN'
+    CLOSING = 'CLOSING'
+    CLOSED = 'CLOSED'
+
+    def __init__(self, broker, on_open_callback=None):
+        self.broker = broker
+        self.ioloop = IOLoop()
+        self.connection_state = self.INIT
+        self._channels = {}
+        self._channel_numbers = itertools.count(1)
+        self.ioloop.add_callback_threadsafe(
+            functools.partial(self._on_open, on_open_callback)
+        )
+
+    def __repr__(self):
+        return "<LocalConnection %s, %s channels>" % (self.connection_state,
+                                                      len(self._channels))
+
+    @property
+    def is_open(self):
+        return self.connection_state == self.OPEN
+
+    @property
+    def is_closing(self):
+        return self.connection_state == self.CLOSING
+
+    @property
+    def is_closed(self):
+        return self.connection_state == self.CLOSED
+
+    def _on_open(self, on_open_callback):
+        if self.connection_state != self.INIT:
+            return
+        self.connection_state = self.OPEN
+        if on_open_callback is not None:
+            on_open_callback(self)
+
+    def add_callback_threadsafe(self, callback):
+        self.ioloop.add_callback_threadsafe(callback)
+
+    def add_timeout(self, deadline, callback):
+        return self.ioloop.add_timeout(deadline, callback)
+
+    def remove_timeout(self, timer):
+        self.ioloop.remove_timeout(timer)
+
+    def channel(self, on_open_callback, channel_number=None):
+        """Opens a channel, passed to ``on_open_callback(channel)``.
+
+        :rtype: :class:`LocalChannel`
+
+        """
+        if not self.is_open:
+            raise BrokerConnectionClosed()
+        if channel_number is None:
+            channel_number = next(self._channel_numbers)
+        channel = LocalChannel(self, channel_number)
+        self._channels[channel_number] = channel
+        self.ioloop.add_callback_threadsafe(
+            functools.partial(on_open_callback, channel)
+        )
+        return channel
+
+    def close(self, reply_code=200, reply_text='Normal shutdown'):
+        """Closes every channel, then the connection, which stops the
+        IOLoop.
+
+        """
+        if self.connection_state in (self.CLOSING, self.CLOSED):
+            return
+        self.connection_state = self.CLOSING
+        self.ioloop.add_callback_threadsafe(self._on_close)
+
+    def _on_close(self):
+        for channel in self._channels.values():
+            channel.close()
+        self._channels.clear()
+        self.connection_state = self.CLOSED
+        self.ioloop.stop()
+
+
+class LocalChannel(object):
+    """A channel of a :class:`LocalConnection`.  Callbacks run on the
+    connection's IOLoop.
+
+    """
+    def __init__(self, connection, channel_number):
+        self.connection = connection
+        self.channel_number = channel_number
+        self.is_open = True
+        # consumer tag -> _Consumer
+        self._consumers = {}
+        self._consumer_tags = itertools.count(1)
+        self._delivery_tags = itertools.count(1)
+        self._on_confirm = None
+        self._confirming = False
+        # Prefetch count of the consumers created from now on
+        self._prefetch = 0
+        # delivery tag -> _Consumer, of messages awaiting an ack
+        self._unacked = {}
+        self._publish_tag = 0
+        self._on_return = []
+
+    def __repr__(self):
+        return "<LocalChannel %s %s>" % (
+            self.channel_number, 'open' if self.is_open else 'closed'
+        )
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    @property
+    def broker(self):
+        return self.connection.broker
+
+    def _call(self, callback, *args):
+        """Runs a callback on the IOLoop."""
+        if callback is not None:
+            self.connection.ioloop.add_callback_threadsafe(
+                functools.partial(callback, *args)
+            )
+
+    def _check_open(self):
+        if not self.is_open:
+            raise BrokerChannelClosed(channel=self.channel_number)
+
+    def queue_declare(self, callback=None, queue='', passive=False,
+                      durable=False, exclusive=False, auto_delete=False,
+                      nowait=False, arguments=None):
+        """Declares a queue, with a generated name if ``queue`` is
+        empty.  ``callback`` is passed a ``Queue.DeclareOk`` frame.
+
+        """
+        self._check_open()
+        (queue, message_count, consumer_count) = \
+            self.broker.queue_declare(queue, auto_delete, passive)
+        self._call(callback, Frame(Method('Queue.DeclareOk',
+                                          queue=queue,
+                                          message_count=message_count,
+                                          consumer_count=consumer_count)))
+
+    def exchange_declare(self, callback=None, exchange=None,
+                         exchange_type='direct', passive=False,
+                         durable=False, auto_delete=False, internal=False,
+                         nowait=False, arguments=None, type=None):
+        """Declares an exchange, only fanout exchanges are supported.
+        Older pika versions name the exchange type ``type``.
+
+        """
+        self._check_open()
+        self.broker.exchange_declare(exchange, type or exchange_type)
+        self._call(callback, Frame(Method('Exchange.DeclareOk')))
+
+    def queue_bind(self, callback, queue, exchange, routing_key=None,
+                   nowait=False, arguments=None):
+        self._check_open()
+        self.broker.queue_bind(queue, exchange)
+        self._call(callback, Frame(Method('Queue.BindOk')))
+
+    def basic_consume(self, consumer_callback, queue='', no_ack=False,
+                      exclusive=False, consumer_tag=None, arguments=None):
+        """Delivers the messages of a queue to
+        ``consumer_callback(channel, method, properties, body)``.
+
+        :returns: str -- The consumer tag
+
+        """
+        self._check_open()
+        if consumer_tag is None:
+            consumer_tag = 'ctag%s.%s' % (self.channel_number,
+                                          next(self._consumer_tags))
+        consumer = _Consumer(self, consumer_tag, queue, consumer_callback,
+                             no_ack, 0 if no_ack else self._prefetch)
+        self._consumers[consumer_tag] = consumer
+        self.broker.basic_consume(consumer)
+        return consumer_tag
+
+    def basic_cancel(self, callback=None, consumer_tag='', nowait=False):
+        consumer = self._consumers.pop(consumer_tag, None)
+        if consumer is not None:
+            self.broker.basic_cancel(consumer)
+        self._call(callback, Frame(Method('Basic.CancelOk',
+                                          consumer_tag=consumer_tag)))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None,
+                      mandatory=False, immediate=False):
+        """Routes a message to its queues.  A mandatory message which
+        reaches none is passed to the return callbacks, before being
+        confirmed if confirms are enabled.
+
+        """
+        self._check_open()
+        if properties is None:
+            properties = BasicProperties()
+        routed = self.broker.publish(exchange, routing_key, body,
+                                     properties)
+        if not routed and mandatory:
+            method = Method('Basic.Return', reply_code=NO_ROUTE[0],
+                            reply_text=NO_ROUTE[1], exchange=exchange,
+                            routing_key=routing_key)
+            for callback in self._on_return:
+                self._call(callback, self, method, properties, body)
+        if self._confirming:
+            self._publish_tag += 1
+            self._call(self._on_confirm,
+                       Frame(Method('Basic.Ack',
+                                    delivery_tag=self._publish_tag,
+                                    multiple=False)))
+
+    def basic_qos(self, callback=None, prefetch_size=0, prefetch_count=0,
+                  all_channels=False):
+        """Limits the consumers created from now on to
+        ``prefetch_count`` unacked messages each, 0 for no limit.
+
+        """
+        self._check_open()
+        self._prefetch = prefetch_count
+        self._call(callback, Frame(Method('Basic.QosOk')))
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        """Acks a message, or every message up to ``delivery_tag`` if
+        ``multiple``, making room for the next ones.
+
+        """
+        if multiple:
+            tags = [tag for tag in self._unacked.keys()
+                    if tag <= delivery_tag]
+        else:
+            tags = [delivery_tag]
+        for tag in tags:
+            consumer = self._unacked.pop(tag, None)
+            if consumer is not None:
+                self.broker.basic_ack(consumer)
+
+    def confirm_delivery(self, callback=None, nowait=False):
+        """Sends a ``Basic.Ack`` frame to ``callback`` for each publish
+        from now on.
+
+        """
+        self._check_open()
+        self._confirming = True
+        self._on_confirm = callback
+
+    def add_on_return_callback(self, callback):
+        """Calls ``callback(channel, method, properties, body)`` for
+        each returned message.
+
+        """
+        self._on_return.append(callback)
+
+    def close(self, reply_code=200, reply_text='Normal shutdown'):
+        """Cancels the channel's consumers and closes it."""
+        if not self.is_open:
+            return
+        self.is_open = False
+        for consumer in self._consumers.values():
+            self.broker.basic_cancel(consumer)
+        self._consumers.clear()
+
+    def _deliver(self, consumer, exchange, routing_key, properties, body):
+        """Runs a consumer callback on the IOLoop, from any thread."""
+        method = Method('Basic.Deliver',
+                        consumer_tag=consumer.consumer_tag,
+                        delivery_tag=next(self._delivery_tags),
+                        redelivered=False, exchange=exchange,
+                        routing_key=routing_key)
+        if not consumer.no_ack:
+            self._unacked[method.delivery_tag] = consumer
+        self._call(self._on_deliver, consumer, method, properties, body)
+
+    def _on_deliver(self, consumer, method, properties, body):
+        # Consumers cancelled after the delivery was queued miss it
+        if self.is_open and consumer.consumer_tag in self._consumers:
+            consumer.callback(self, method, properties, body)
+
+
+class _Consumer(object):
+    """A consumer of a queue."""
+
+    __slots__ = ('channel', 'consumer_tag', 'queue', 'callback', 'no_ack',
+                 'prefetch', 'unacked')
+
+    def __init__(self, channel, consumer_tag, queue, callback,
+                 no_ack=True, prefetch=0):
+        self.channel = channel
+        self.consumer_tag = consumer_tag
+        self.queue = queue
+        self.callback = callback
+        self.no_ack = no_ack
+        self.prefetch = prefetch
+        # Only changed with the broker lock held
+        self.unacked = 0
+
+    def has_room(self):
+        """True if the consumer can take another message."""
+        return not self.prefetch or self.unacked < self.prefetch
+
+    def take(self):
+        """Counts a message delivered to the consumer.  Must be called
+        with the broker lock held.
+
+        """
+        if not self.no_ack:
+            self.unacked += 1
+
+    def deliver(self, exchange, routing_key, properties, body):
+        self.channel._deliver(self, exchange, routing_key, properties, body)
+
+
+class _Queue(object):
+    """Messages waiting for a consumer, and the consumers of a queue."""
+
+    __slots__ = ('name', 'auto_delete', 'messages', 'consumers')
+
+    def __init__(self, name, auto_delete):
+        self.name = name
+        self.auto_delete = auto_delete
+        # (exchange, routing_key, properties, body)
+        self.messages = collections.deque()
+        self.consumers = collections.deque()
+
+
+class LocalBroker(object):
+    """Thread-safe, in-process message broker with queues and fanout
+    exchanges.
+
+    """
+    def __init__(self):
+        self.LOGGER = get_cls_logger(self)
+        self._lock = threading.Lock()
+        # name -> _Queue
+        self._queues = {}
+        # name -> set of bound queue names
+        self._exchanges = {}
+        #: Reply queue announced by the manager, see
+        #: :func:`LocalTransport.announce_reply_queue`
+        self.reply_queue = None
+        #: Telemetry queue and interval announced by the manager, see
+        #: :func:`LocalTransport.announce_telemetry`
+        self.telemetry_queue = None
+        self.telemetry_interval = None
+        self._counters = {
+            'published': 0,
+            'published_bytes': 0,
+            'delivered': 0,
+            'returned': 0,
+        }
+
+    def __repr__(self):
+        with self._lock:
+            return "<LocalBroker %s queues, %s exchanges>" % (
+                len(self._queues), len(self._exchanges)
+            )
+
+    def queue_declare(self, queue, auto_delete=False, passive=False):
+        """Creates a queue unless it exists.
+
+        :returns: tuple -- The queue name, and its number of messages
+                  and consumers
+
+        """
+        with self._lock:
+            if not queue:
+                queue = 'amq.gen-%s' % uuid.uuid4()
+            existing = self._queues.get(queue)
+            if existing is None:
+                if passive:
+                    raise BrokerQueueNotFound(queue=queue)
+                existing = self._queues[queue] = _Queue(queue, auto_delete)
+            return (queue, len(existing.messages), len(existing.consumers))
+
+    def exchange_declare(self, exchange, exchange_type='fanout'):
+        if exchange_type != 'fanout':
+            raise BrokerExchangeTypeNotSupported(exchange_type=exchange_type)
+        with self._lock:
+            self._exchanges.setdefault(exchange, set())
+
+    def queue_bind(self, queue, exchange):
+        with self._lock:
+            if queue not in self._queues:
+                raise BrokerQueueNotFound(queue=queue)
+            if exchange not in self._exchanges:
+                raise BrokerExchangeNotFound(exchange=exchange)
+            self._exchanges[exchange].add(queue)
+
+    def basic_consume(self, consumer):
+        """Adds a consumer to its queue, and hands it the messages
+        waiting there.
+
+        """
+        with self._lock:
+            queue = self._queues.get(consumer.queue)
+            if queue is None:
+                raise BrokerQueueNotFound(queue=consumer.queue)
+            queue.consumers.append(consumer)
+            messages = []
+            while queue.messages and consumer.has_room():
+                messages.append(queue.messages.popleft())
+                consumer.take()
+            self._counters['delivered'] += len(messages)
+        for message in messages:
+            consumer.deliver(*message)
+
+    def basic_ack(self, consumer):
+        """Counts an ack of a consumer, handing it the next message
+        waiting in its queue.
+
+        """
+        with self._lock:
+            consumer.unacked -= 1
+            queue = self._queues.get(consumer.queue)
+            if queue is None or consumer not in queue.consumers or \
+                    not queue.messages or not consumer.has_room():
+                return
+            message = queue.messages.popleft()
+            consumer.take()
+            self._counters['delivered'] += 1
+        consumer.deliver(*message)
+
+    def basic_cancel(self, consumer):
+        """Removes a consumer, deleting its queue if it is auto-delete
+        and has no consumer left.
+
+        """
+        with self._lock:
+            queue = self._queues.get(consumer.queue)
+            if queue is None or consumer not in queue.consumers:
+                return
+            queue.consumers.remove(consumer)
+            if queue.auto_delete and not queue.consumers:
+                del self._queues[queue.name]
+                for bound in self._exchanges.itervalues():
+                    bound.discard(queue.name)
+
+    def publish(self, exchange, routing_key, body, properties):
+        """Routes a message to the queue named by ``routing_key`` on
+        the default exchange, or to every queue bound to a fanout
+        exchange.
+
+        :returns: bool -- False if the message reached no queue
+
+        """
+        message = (exchange, routing_key, properties, body)
+        deliveries = []
+        with self._lock:
+            self._counters['published'] += 1
+            self._counters['published_bytes'] += len(body)
+            if exchange == '':
+                names = [routing_key] if routing_key in self._queues else []
+            elif exchange in self._exchanges:
+                names = self._exchanges[exchange]
+            else:
+                raise BrokerExchangeNotFound(exchange=exchange)
+            for name in names:
+                queue = self._queues[name]
+                consumer = None
+                if not queue.messages:
+                    consumer = self._next_consumer(queue)
+                if consumer is not None:
+                    consumer.take()
+                    deliveries.append(consumer)
+                else:
+                    # Kept in order behind the messages already waiting
+                    queue.messages.append(message)
+            self._counters['delivered'] += len(deliveries)
+            if not names:
+                self._counters['returned'] += 1
+        for consumer in deliveries:
+            consumer.deliver(*message)
+        return bool(names)
+
+    def _next_consumer(self, queue):
+        """Returns the next consumer of a queue with room for a
+        message, consumers taking turns, or None.  Must be called with
+        the lock held.
+
+        """
+        for i in range(len(queue.consumers)):
+            consumer = queue.consumers[0]
+            queue.consumers.rotate(-1)
+            if consumer.has_room():
+                return consumer
+        return None
+
+    def stats(self):
+        """Returns a snapshot of the broker counters.
+
+        :rtype: dict
+
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['queues'] = len(self._queues)
+            stats['exchanges'] = len(self._exchanges)
+            stats['waiting'] = sum(len(queue.messages) for queue in
+                                   self._queues.itervalues())
+        return stats
+
+
+class LocalTransport(Transport):
+    """Connects to a :class:`LocalBroker`, credentials are ignored."""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def connect(self, host, username, password, on_connected):
+        return LocalConnection(self.broker, on_connected)
+
+    def properties(self, **kwargs):
+        return BasicProperties(**kwargs)
+
+    def announce_reply_queue(self, queue):
+        """Stores the reply queue on the broker, where
+        :class:`SimulatedAgent` reads it as agents read their provision
+        file.
+
+        """
+        self.broker.reply_queue = queue
+
+    def announce_telemetry(self, queue, interval):
+        """Stores the telemetry settings on the broker, read by
+        :class:`SimulatedAgent` as by agents from their provision file.
+
+        """
+        self.broker.telemetry_queue = queue
+        self.broker.telemetry_interval = interval
+
+
+class SimulatedAgent(object):
+    """An access point attached to a :class:`LocalBroker`, answering
+    the manager as the agent's ``Receive`` class does, without
+    configuring anything.
+
+    Commands are answered with the return value of
+    ``handler(message)``, or unsuccessfully if it raises.  By default
+    'SYN' is answered with 'SYN/ACK' and other commands with None.
+    Replies are sent ``delay`` seconds after the command arrives, and
+    commands for which ``drop(message)`` is true are never answered,
+    so that the manager's timeouts can be exercised.
+
+    ``database`` holds the ``init_database``, ``init_user_id_database``
+    and ``init_hardware_database``.  Replies carry its version, or
+    what changed since the version the manager holds, see
+    :mod:`aurora.config_versions`, and are encoded as the manager
+    accepts, see :mod:`aurora.codec`.
+
+    With ``telemetry`` set, the agent pushes the stats returned by
+    ``slice_stats()`` to the telemetry queue announced by the manager,
+    at the interval it announced, see
+    :func:`aurora.ap_monitor.APMonitor.process_telemetry`.
+
+    """
+    #: Seconds :func:`start` waits for the queue to be consumed
+    START_TIMEOUT = 5
+
+    def __init__(self, broker, queue, region=None, handler=None, delay=0,
+                 drop=None, broadcast_exchange='aurora_broadcast',
+                 compress=True, binary=True, telemetry=False,
+                 slice_stats=None):
+        """
+        :param broker: :class:`LocalBroker` to attach to
+        :param str queue: Name of the access point
+        :param str region:
+        :param callable handler: Takes the decoded command
+        :param float delay: Seconds before replying
+        :param callable drop: Takes the decoded command
+        :param str broadcast_exchange: Fanout exchange to bind the
+                                       queue to, None to not bind it
+        :param bool compress: Compresses replies if the manager 
+                              accepts it
+        :param bool binary: Encodes replies with msgpack if the 
+                            manager accepts it
+        :param bool telemetry: Pushes stats instead of waiting for 
+                               'get_stats'
+        :param callable slice_stats: Returns the bytes sent by each 
+                                     slice, no slices if None
+
+        """
+        self.LOGGER = get_cls_logger(self)
+        self.broker = broker
+        self.transport = LocalTransport(broker)
+        self.queue = queue
+        self.region = region
+        self.handler = handler
+        self.delay = delay
+        self.drop = drop
+        self.broadcast_exchange = broadcast_exchange
+        self.compress = compress
+        self.binary = binary
+        self.telemetry = telemetry
+        self.slice_stats = slice_stats
+        # Plain JSON until the manager says what it accepts
+        self.encoding = (codec.JSON, None)
+        # Config version the manager held in its last message
+        self.manager_version = None
+        self._telemetry_sequence = 0
+        self.database = {
+            'init_database': {},
+            'init_user_id_database': {},
+            'init_hardware_database': {},
+        }
+        self.version = 0
+        self.version_hash = None
+        # version -> copy of the database, oldest first
+        self.versions = collections.OrderedDict()
+        self.connection = None
+        self.channel = None
+        self.listener = None
+        self._consuming = threading.Event()
+        self._counters = {
+            'received': 0,
+            'replied': 0,
+            'dropped': 0,
+            'pushed': 0,
+        }
+
+    def __repr__(self):
+        return "<SimulatedAgent %s>" % self.queue
+
+    def start(self):
+        """Connects and starts consuming the access point's queue.
+
+        :returns: bool -- False if the queue is not consumed within
+                  :attr:`START_TIMEOUT`
+
+        """
+        self.connection = self.transport.connect(None, None, None,
+                                                 self.on_connected)
+        self.listener = threading.Thread(target=self.connection.ioloop.start)
+        self.listener.daemon = True
+        self.listener.start()
+        return self._consuming.wait(self.START_TIMEOUT)
+
+    def stop(self):
+        """Closes the connection, deleting the access point's queue."""
+        self._consuming.clear()
+        if self.connection is not None:
+            self.connection.close()
+            self.listener.join()
+            self.connection = None
+
+    def on_connected(self, connection):
+        connection.channel(self.on_channel_open)
+
+    def on_channel_open(self, channel):
+        self.channel = channel
+        channel.queue_declare(queue=self.queue, auto_delete=True,
+                              callback=self.on_queue_declared)
+
+    def on_queue_declared(self, frame):
+        if self.broadcast_exchange:
+            self.channel.exchange_declare(self.on_exchange_declared,
+                                          self.broadcast_exchange, 'fanout')
+        else:
+            self.on_queue_bound(frame)
+
+    def on_exchange_declared(self, frame):
+        self.channel.queue_bind(self.on_queue_bound, self.queue,
+                                self.broadcast_exchange)
+
+    def on_queue_bound(self, frame):
+        self.channel.basic_consume(self.handle_delivery, queue=self.queue,
+                                   no_ack=True)
+        self._consuming.set()
+        if self.telemetry:
+            # Spread the pushes of agents starting together
+            interval = self.broker.telemetry_interval or 1
+            self.connection.add_timeout(random.uniform(0, interval),
+                                        self._push_telemetry)
+
+    def _push_telemetry(self):
+        """Pushes stats once the manager announced where to, then
+        schedules the next push.  Runs on the IOLoop thread.
+
+        """
+        queue = self.broker.telemetry_queue
+        interval = self.broker.telemetry_interval
+        if queue and interval and self.channel is not None and \
+                self.channel.is_open:
+            self._telemetry_sequence += 1
+            slice_stats = {}
+            if self.slice_stats is not None:
+                slice_stats = self.slice_stats()
+            data_for_sender = {'successful': True,
+                               'message': {'ap_slice_stats': slice_stats,
+                                           'memory_stats': {}},
+                               'interval': interval,
+                               'sequence': self._telemetry_sequence,
+                               'ap': self.queue}
+            self._publish(queue, data_for_sender,
+                          known_version=self.manager_version)
+            # The manager holds what was pushed, unless it asks again
+            self.manager_version = data_for_sender['config']['version']
+            self._counters['pushed'] += 1
+        self.connection.add_timeout(interval or 1, self._push_telemetry)
+
+    def handle_delivery(self, channel, method, properties, body):
+        """Answers a command, runs on the IOLoop thread."""
+        self._counters['received'] += 1
+        message = codec.decode(body, properties.content_type,
+                               properties.content_encoding)
+        self.encoding = codec.negotiate(properties.headers, self.binary,
+                                        self.compress)
+        if self.drop is not None and self.drop(message):
+            self._counters['dropped'] += 1
+            return
+        # Replies to a broadcast are told apart by access point name
+        correlation_id = properties.correlation_id
+        if method.exchange and method.exchange == self.broadcast_exchange:
+            correlation_id = "%s-%s" % (self.queue, correlation_id)
+        known_version = (properties.headers or {}).get(
+            config_versions.CONFIG_VERSION_HEADER
+        )
+        if isinstance(known_version, dict):
+            # Broadcasts hold the versions of every access point
+            known_version = known_version.get(self.queue)
+        self.manager_version = known_version
+        reply = functools.partial(self._reply, message,
+                                  properties.reply_to, correlation_id,
+                                  known_version)
+        if self.delay:
+            self.connection.add_timeout(self.delay, reply)
+        else:
+            reply()
+
+    def _reply(self, message, reply_to, correlation_id, known_version):
+        data_for_sender = {'successful': False, 'message': None,
+                           'ap': self.queue}
+        try:
+            if self.handler is not None:
+                data_for_sender['message'] = self.handler(message)
+            elif message['command'] == 'SYN':
+                data_for_sender['message'] = 'SYN/ACK'
+        except Exception:
+            data_for_sender['message'] = traceback.format_exc()
+        else:
+            data_for_sender['successful'] = True
+        self._publish(reply_to, data_for_sender, correlation_id,
+                      known_version)
+        self._counters['replied'] += 1
+
+    def send_ap_up_status(self, slices_to_recreate=()):
+        """Tells the manager the access point started, from any
+        thread.
+
+        """
+        data_for_sender = {'successful': True, 'message': 'SYN',
+                           'slices_to_recreate': list(slices_to_recreate),
+                           'ap': self.queue}
+        self.connection.add_callback_threadsafe(functools.partial(
+            self._publish, self.broker.reply_queue, data_for_sender
+        ))
+
+    def send_fin(self):
+        """Tells the manager the access point is shutting down, from
+        any thread.
+
+        """
+        data_for_sender = {'successful': True, 'message': 'FIN',
+                           'ap': self.queue}
+        self.connection.add_callback_threadsafe(functools.partial(
+            self._publish, self.broker.reply_queue, data_for_sender
+        ))
+
+    def build_config(self, known_version=None):
+        """Returns the config of a message to the manager, as the
+        agent's ``Receive.build_config`` does.
+
+        """
+        state_hash = config_versions.state_hash(self.database)
+        if state_hash != self.version_hash:
+            self.version += 1
+            self.version_hash = state_hash
+            self.versions[self.version] = copy.deepcopy(self.database)
+            while len(self.versions) > config_versions.HISTORY:
+                self.versions.popitem(last=False)
+        config = {'region': self.region, 'version': self.version,
+                  'hash': self.version_hash}
+        if known_version == self.version:
+            return config
+        if known_version in self.versions:
+            config['base'] = known_version
+            config['diff'] = config_versions.diff(
+                self.versions[known_version], self.versions[self.version]
+            )
+        else:
+            config.update(self.database)
+        return config
+
+    def _publish(self, routing_key, data_for_sender, correlation_id=None,
+                 known_version=None):
+        data_for_sender['config'] = self.build_config(known_version)
+        (content_type, content_encoding) = self.encoding
+        (body, content_encoding) = codec.encode(data_for_sender,
+                                                content_type,
+                                                content_encoding)
+        headers = codec.accept_headers()
+        if config_versions.carries_changes(data_for_sender['config']):
+            headers[config_versions.CONFIG_CHANGED_HEADER] = True
+        self.channel.basic_publish(
+            exchange='', routing_key=routing_key, body=body,
+            properties=self.transport.properties(
+                app_id=self.queue,
+                correlation_id=correlation_id,
+                content_type=content_type,
+                content_encoding=content_encoding,
+                headers=headers
+            )
+        )
+
+    def stats(self):
+        """Returns a snapshot of the agent counters.
+
+        :rtype: dict
+
+        """
+        return dict(self._counters)
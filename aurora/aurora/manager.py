@@ -8,6 +8,8 @@ commands received from a client.
 """
 
 
+import base64
+import datetime
 import json
 import logging
 from pprint import pprint, pformat
@@ -19,13 +21,18 @@ import uuid
 import config
 
 import MySQLdb as mdb
+import MySQLdb.cursors
 
 from aurora.aurora_db import *
 from aurora import ap_monitor
 from aurora import config_db
+from aurora import db_pool
 from aurora.cls_logger import get_cls_logger
 from aurora import dispatcher
+from aurora import metering_history
+from aurora import poll_scheduler
 from aurora import slice_plugin
+from aurora import status_coalescer
 from aurora import query_agent as filter
 from aurora.exc import *
 from aurora.ap_provision import http_srv as provision_srv
@@ -41,6 +48,34 @@ from aurora.hint import sql_Info
 LOGGER = logging.getLogger(__name__)
 
 
+def _encode_cursor(listing, key):
+    """Returns an opaque token which resumes a listing after the
+    row with the given key.
+
+    :param str listing: Name of the listing command
+    :param str key: Key of the last row returned
+    :rtype: str
+
+    """
+    return base64.urlsafe_b64encode(json.dumps([listing, key]))
+
+def _decode_cursor(listing, token):
+    """Returns the key encoded in a token by :func:`_encode_cursor`.
+
+    :raises: InvalidPageCursor
+
+    """
+    try:
+        (token_listing, key) = json.loads(base64.urlsafe_b64decode(
+            str(token)
+        ))
+    except (TypeError, ValueError):
+        raise InvalidPageCursor(cursor=token)
+    if token_listing != listing:
+        raise InvalidPageCursor(cursor=token)
+    return key
+
+
 class Manager(object):
     """High level manager class for handling client requests.
 
@@ -54,6 +89,17 @@ class Manager(object):
     """
     #Dispatcher variables
 
+    #: Rows per page of listings when the client sends no --limit
+    PAGE_SIZE = 100
+    #: Upper bound for --limit
+    MAX_PAGE_SIZE = 1000
+    #: Seconds a command waits for its messages to be published
+    PUBLISH_WAIT = 2
+    #: Hours of usage shown when the client sends no --start
+    USAGE_HOURS = 24
+    #: Formats accepted by --start and --end
+    USAGE_TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
     def __init__(self):
         """Sets up the environment which Manager will use to handle 
         specific tasks.
@@ -79,22 +125,53 @@ class Manager(object):
         self.mysql_username = config.CONFIG['mysql']['mysql_username']
         self.mysql_password = config.CONFIG['mysql']['mysql_password']
         self.mysql_db = config.CONFIG['mysql']['mysql_db']
+        self.db_pool = db_pool.get_pool(self.mysql_host,
+                                        self.mysql_username,
+                                        self.mysql_password,
+                                        self.mysql_db)
 
         #Initialize AuroraDB Object
-        self.aurora_db = AuroraDB(self.mysql_host,
-                                 self.mysql_username,
-                                 self.mysql_password,
-                                 self.mysql_db)
+        self.aurora_db = AuroraDB(
+            self.mysql_host,
+            self.mysql_username,
+            self.mysql_password,
+            self.mysql_db,
+            cache_size=config.CONFIG['mysql'].get('slice_cache_size', 4096),
+            cache_ttl=config.CONFIG['mysql'].get('slice_cache_ttl', 30)
+        )
+        dispatcher_config = config.CONFIG['dispatcher']
         #Comment for testing without AP
-        self.dispatcher = dispatcher.Dispatcher(host,
-                                              username,
-                                              password,
-                                              self.mysql_username,
-                                              self.mysql_password,
-                                              self.aurora_db,
-                                              queue=manager_queue)
+        self.dispatcher = dispatcher.Dispatcher(
+            host,
+            username,
+            password,
+            self.mysql_username,
+            self.mysql_password,
+            self.aurora_db,
+            queue=manager_queue,
+            confirms=dispatcher_config.get('publisher_confirms', False),
+            confirm_window=dispatcher_config.get('confirm_window', 100),
+            publish_retries=dispatcher_config.get('publish_retries', 3),
+            broadcast_exchange=dispatcher_config.get('broadcast_exchange'),
+            compress=dispatcher_config.get('compress_messages', False),
+            binary=dispatcher_config.get('binary_messages', False),
+            telemetry_queue=dispatcher_config.get('telemetry_queue'),
+            telemetry_interval=dispatcher_config.get('telemetry_interval', 30),
+            response_workers=dispatcher_config.get('response_workers', 0),
+            prefetch=dispatcher_config.get('prefetch', 0)
+        )
+
+        apm_settings = poll_scheduler.poll_settings()
+        apm_settings.update(status_coalescer.status_settings())
+        self.apm = ap_monitor.APMonitor(
+            self.dispatcher, self.aurora_db, self.mysql_host,
+            self.mysql_username, self.mysql_password, **apm_settings
+        )
 
-        self.apm = ap_monitor.APMonitor(self.dispatcher, self.aurora_db, self.mysql_host, self.mysql_username, self.mysql_password)
+        self.metering_rollup = metering_history.MeteringRollup(
+            self.db_pool, **metering_history.rollup_settings()
+        )
+        self.metering_rollup.start()
 
         provision_srv.run()
 
@@ -104,8 +181,11 @@ class Manager(object):
 
     def stop(self):
         """Stops the previously constructed service helpers."""
-        self.apm.stop()
+        # Replies and timeouts handled while the dispatcher stops still
+        # update statuses, so the AP Monitor is stopped after it
         self.dispatcher.stop()
+        self.apm.stop()
+        self.metering_rollup.stop()
         provision_srv.stop()
 
     def parseargs(self, function, args, tenant_id, user_id, project_id):
@@ -164,7 +244,7 @@ class Manager(object):
         response = {"status":status, "message":Message}
         return response
 
-    def ap_filter(self, args): 	
+    def ap_filter(self, args, limit=None, after=None): 	
         """A helper method for finding access points based on their 
         SQL entries.  Example argument strings::
 
@@ -173,57 +253,17 @@ class Manager(object):
             num_radio_free=1 
 
         :param str args:
+        :param int limit: Maximum number of access points, ordered by
+                          name
+        :param str after: Only return access points with a greater name
         :rtype: list
 
         """
-        try:
-            self.con = mdb.connect(self.mysql_host,
-                                   self.mysql_username,
-                                   self.mysql_password,
-                                   self.mysql_db)
-        except mdb.Error, e:
-            # self.LOGGER.error("Error %d: %s" % (e.args[0], e.args[1]))
-            # sys.exit(1)
-            traceback.print_exc(file=sys.stdout)
-
         if len(args) == 0: #No filter or tags
-            try:
-                with self.con:
-                    cur = self.con.cursor()
-                    cur.execute("SELECT * FROM ap")
-                    tempList =  cur.fetchall()
-                    #Prune thorugh list
-                    newList = []
-                    for i in range(len(tempList)):
-                        newList.append([])
-                        newList[i].append(tempList[i][0])
-                        newList[i].append({})
-                        newList[i][1]['region'] = tempList[i][1]
-                        newList[i][1]['firmware'] = tempList[i][2]
-                        newList[i][1]['version'] = tempList[i][3]
-                        newList[i][1]['number_radio'] = tempList[i][4]
-                        newList[i][1]['memory_mb'] = tempList[i][5]
-                        newList[i][1]['free_disk'] = tempList[i][6]
-                        newList[i][1]['supported_protocol'] = tempList[i][7]
-                        newList[i][1]['number_radio_free'] = tempList[i][8]
-                        newList[i][1]['number_slice_free'] = tempList[i][9]
-                        newList[i][1]['status'] = tempList[i][10]
-                        #Get a list of tag
-                        cur.execute("SELECT name FROM location_tags WHERE ap_name=\'"+str(tempList[i][0])+"\'")
-                        tagList = cur.fetchall()
-                        tagString = ""
-                        for tag in tagList:
-                            tagString += str(tag[0])+" "
-                        newList[i][1]['tags'] = tagString
-                    return newList
-            except mdb.Error, e:
-                traceback.print_exc(file=sys.stdout)
-                # self.LOGGER.error("Error %d: %s", e.args[0], e.args[1])
+            return self._query_aps(limit=limit, after=after)
         else: #Multiple arguments (name=openflow & firmware=openwrt & region=mcgill & number_radio>1)
-            tag_compare = False #For tags, we need 2 queries and a quick result compare at the end
-            tag_result = []
             args_list = args.split('&')
-            
+
             for (index, entry) in enumerate(args_list):
                 args_list[index] = entry.strip()
                  #Filter for tags (NOT Query is not yet implemented (future work?),
@@ -264,51 +304,63 @@ class Manager(object):
                     else:
                         expression = entry
 
-            #execute query
-            try:
-                with self.con:
-                    cur = self.con.cursor()
-                    tempList = []
-                    if len(expression) != 0:
-                        cur.execute("SELECT * FROM ap WHERE "+expression)
-                    else:
-                        cur.execute("SELECT * FROM ap")
-                    tempList = list(cur.fetchall())
-            except mdb.Error, e:
-                traceback.print_exc(file=sys.stdout)
-                # self.LOGGER.error("Error %d: %s", e.args[0], e.args[1])
-
-            #Compare result with tag_list if necessary
-            if tag_compare:
-                comparedList = []
-                for (index,ap_entry) in enumerate(tempList):
-                    if ap_entry[0] in tag_result:
-                        comparedList.append(ap_entry)
-                tempList = comparedList
-            #Prune thorugh list
-            newList = []
-            for i in range(len(tempList)):
-                newList.append([])
-                newList[i].append(tempList[i][0])
-                newList[i].append({})
-                newList[i][1]['region'] = tempList[i][1]
-                newList[i][1]['firmware'] = tempList[i][2]
-                newList[i][1]['version'] = tempList[i][3]
-                newList[i][1]['number_radio'] = tempList[i][4]
-                newList[i][1]['memory_mb'] = tempList[i][5]
-                newList[i][1]['free_disk'] = tempList[i][6]
-                newList[i][1]['supported_protocol'] = tempList[i][7]
-                newList[i][1]['number_radio_free'] = tempList[i][8]
-                newList[i][1]['number_slice_free'] = tempList[i][9]
-                newList[i][1]['status'] = tempList[i][10]
-                #Get a list of tags
-                cur.execute("SELECT name FROM location_tags WHERE ap_name=\'"+str(tempList[i][0])+"\'")
-                tagList = cur.fetchall()
-                tagString = ""
-                for tag in tagList:
-                    tagString += str(tag[0])+" "
-                newList[i][1]['tags'] = tagString
-            return newList
+            return self._query_aps(expression, limit, after)
+
+    def _query_aps(self, expression='', limit=None, after=None):
+        """Returns access points and their location tags, as used by
+        :func:`ap_filter`.  Tags are gathered by MySQL in the same
+        query and rows are streamed from the server.
+
+        :param str expression: SQL condition on the ap table
+        :param int limit: Maximum number of rows, ordered by name
+        :param str after: Only return rows with a greater name
+        :rtype: list
+
+        """
+        to_execute = """SELECT name, region, firmware, version,
+                               number_radio, memory_mb, free_disk,
+                               supported_protocol, number_radio_free,
+                               number_slice_free, status,
+                               (SELECT GROUP_CONCAT(
+                                           CONCAT(location_tags.name, ' ')
+                                           ORDER BY location_tags.name
+                                           SEPARATOR '')
+                                    FROM location_tags
+                                    WHERE location_tags.ap_name = ap.name)
+                            FROM ap"""
+        criteria = []
+        params = []
+        if len(expression) != 0:
+            # Percent signs are doubled to survive parameter substitution
+            criteria.append(expression.replace('%', '%%'))
+        if after is not None:
+            criteria.append("name > %s")
+            params.append(after)
+        if criteria:
+            to_execute += " WHERE " + " AND ".join(criteria)
+        if limit is not None:
+            to_execute += " ORDER BY name LIMIT %d" % limit
+        newList = []
+        try:
+            with self.db_pool.cursor(mdb.cursors.SSCursor) as cur:
+                cur.execute(to_execute, params)
+                for row in cur:
+                    newList.append([row[0], {
+                        'region': row[1],
+                        'firmware': row[2],
+                        'version': row[3],
+                        'number_radio': row[4],
+                        'memory_mb': row[5],
+                        'free_disk': row[6],
+                        'supported_protocol': row[7],
+                        'number_radio_free': row[8],
+                        'number_slice_free': row[9],
+                        'status': row[10],
+                        'tags': row[11] or "",
+                    }])
+        except mdb.Error, e:
+            traceback.print_exc(file=sys.stdout)
+        return newList
 
     def ap_add(self, args, tenant_id, user_id, project_id):
         """Adds an AP to the SQL database and dispatches a SYN message.
@@ -407,7 +459,15 @@ class Manager(object):
         else:
             arg_filter = []
         arg_i = args['i']
-        toPrint = self.ap_filter(arg_filter)
+        try:
+            (limit, after) = self._page_args(args, 'ap-list')
+        except AuroraException as e:
+            response = {"status":False, "message":e.message}
+            return response
+        (toPrint, next_cursor) = self._paginate(
+            'ap-list', self.ap_filter(arg_filter, limit + 1, after),
+            limit, lambda entry: entry[0]
+        )
         message = ""
 
         pt = prettytable.PrettyTable()
@@ -436,11 +496,142 @@ class Manager(object):
             message = pt.get_string()
         else:
             message = pt.get_string(fields=["Name", "status"])    
+        message += self._page_footer(next_cursor)
 
         #return response
-        response = {"status":True, "message":message}
+        response = {"status":True, "message":message,
+                    "next_cursor":next_cursor}
         return response
 
+    def _page_args(self, args, listing):
+        """Reads the ``limit`` and ``cursor`` arguments of a listing.
+
+        :param dict args: Client arguments
+        :param str listing: Name of the listing command
+        :returns: tuple -- (limit, key of the last row already listed
+                  or None)
+        :raises: InvalidPageSize, InvalidPageCursor
+
+        """
+        limit = args.get('limit')
+        if isinstance(limit, list):
+            limit = limit[0]
+        if limit is None:
+            limit = self.PAGE_SIZE
+        else:
+            try:
+                limit = int(limit)
+            except (TypeError, ValueError):
+                raise InvalidPageSize(limit=limit)
+            if limit < 1:
+                raise InvalidPageSize(limit=limit)
+            limit = min(limit, self.MAX_PAGE_SIZE)
+
+        cursor = args.get('cursor')
+        if isinstance(cursor, list):
+            cursor = cursor[0]
+        after = None
+        if cursor:
+            after = _decode_cursor(listing, cursor)
+        return (limit, after)
+
+    def _paginate(self, listing, rows, limit, key):
+        """Trims rows fetched with one extra row to a page.
+
+        :param str listing: Name of the listing command
+        :param list rows: Up to ``limit + 1`` rows
+        :param int limit: Page size
+        :param key: Callable returning the key of a row
+        :returns: tuple -- (page, cursor for the next page or None)
+
+        """
+        if len(rows) <= limit:
+            return (rows, None)
+        page = rows[:limit]
+        return (page, _encode_cursor(listing, key(page[-1])))
+
+    def _page_footer(self, next_cursor):
+        """Returns the line telling the client how to get the next
+        page, if any.
+
+        :rtype: str
+
+        """
+        if next_cursor is None:
+            return ""
+        return "\nMore results, continue with --cursor %s" % next_cursor
+
+    def _usage_time(self, args, option):
+        """Reads the ``start`` or ``end`` argument of a usage command.
+
+        :returns: :class:`datetime.datetime` -- None if not given
+        :raises: InvalidUsageArgument
+
+        """
+        value = args.get(option)
+        if isinstance(value, list):
+            value = value[0]
+        if value is None:
+            return None
+        for time_format in self.USAGE_TIME_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, time_format)
+            except ValueError:
+                pass
+        raise InvalidUsageArgument(option=option, value=value,
+                                   expected="YYYY-MM-DD [HH:MM[:SS]]")
+
+    def _usage_args(self, args):
+        """Reads the ``start``, ``end`` and ``resolution`` arguments
+        of a usage command.  The range defaults to the last
+        :attr:`USAGE_HOURS` hours.
+
+        :param dict args: Client arguments
+        :returns: tuple -- (start, end, resolution in seconds or None
+                  to choose it from the range)
+        :raises: InvalidUsageArgument
+
+        """
+        end = self._usage_time(args, 'end') or datetime.datetime.now()
+        start = self._usage_time(args, 'start')
+        if start is None:
+            start = end - datetime.timedelta(hours=self.USAGE_HOURS)
+        if start >= end:
+            raise InvalidUsageArgument(option='start', value=start,
+                                       expected="a time before --end")
+        resolution = args.get('resolution')
+        if isinstance(resolution, list):
+            resolution = resolution[0]
+        if resolution is not None:
+            if resolution not in metering_history.RESOLUTION_NAMES:
+                raise InvalidUsageArgument(
+                    option='resolution', value=resolution,
+                    expected=", ".join(sorted(
+                        metering_history.RESOLUTION_NAMES
+                    ))
+                )
+            resolution = metering_history.RESOLUTION_NAMES[resolution]
+        return (start, end, resolution)
+
+    def _usage_table(self, usage, fields):
+        """Returns usage rows of :func:`get_slice_usage \
+            <aurora.aurora_db.AuroraDB.get_slice_usage>` as a table.
+
+        :param list usage: Rows of usage
+        :param list fields: Keys of the rows shown before the traffic
+        :rtype: str
+
+        """
+        if not usage:
+            return " None\n"
+        pt = prettytable.PrettyTable(fields + ["mb_sent", "active_duration"])
+        for entry in usage:
+            pt.add_row([entry[field] for field in fields] +
+                       ["%.3f" % entry['mb_sent'],
+                        seconds_to_duration(entry['active_seconds'])])
+        resolution = datetime.timedelta(seconds=usage[0]['resolution'])
+        return "Buckets of %s\n" % resolution + pt.get_string()
+
     def ap_show(self, args, tenant_id, user_id, project_id):
         """Returns more detailed information about an access point 
         to the client.
@@ -463,6 +654,15 @@ class Manager(object):
                 project_id
         )['message']
 
+        # Requests dispatched to the AP which are awaiting a reply
+        outstanding = self.dispatcher.outstanding_requests(arg_name)
+        pending = outstanding.get(arg_name, [])
+        message += "\nPending requests: %s\n" % len(pending)
+        for request in pending:
+            message += "  %-10s %-36s %5.1fs\n" % (request['command'],
+                                                   request['subject'],
+                                                   request['age'])
+
         #return response
         response = {"status":True, "message":message}
         return response
@@ -951,7 +1151,9 @@ class Manager(object):
             self.LOGGER.debug(json.dumps(entry, indent=4))
 
         add_success = True
-        # Dispatch
+        # Messages are collected and dispatched together once every 
+        # slice is in the database
+        messages = []
         for (index,json_entry) in enumerate(json_list):
             # Generate unique slice_id and add entry to database
             slice_uuid = uuid.uuid4()
@@ -995,16 +1197,7 @@ class Manager(object):
                                 tenant_id, user_id, project_id)
 
             #Dispatch (use slice_uuid as a message identifier)
-            try:
-                self.dispatcher.dispatch(json_entry, 
-                                         aplist[index], 
-                                         str(slice_uuid))
-            except AuroraException as e:
-                message += e.message + '\n'
-                self.LOGGER.warn(e.message)
-            except Exception as e:
-                message += e.message + '\n'
-                traceback.print_exc(file=sys.stdout)
+            messages.append((json_entry, aplist[index], str(slice_uuid)))
             try:
                 config_db.save_config(json_entry['config'], 
                                       json_entry['slice'], 
@@ -1012,10 +1205,60 @@ class Manager(object):
             except AuroraException as e:
                 LOGGER.error(e.message)
 
+        message += self._dispatch_messages(messages)
+
         #Return response (message returns a list of uuids for created slices)
         response = {"status":add_success, "message":message}
         return response
 
+    def _dispatch_messages(self, messages):
+        """Dispatches a batch of messages, see :func:`dispatch_many \
+            <aurora.dispatcher.Dispatcher.dispatch_many>`.
+
+        Messages are published by the IOLoop thread, which is waited
+        on for at most :attr:`PUBLISH_WAIT` seconds so publishing
+        errors reach the client.  A message still unpublished by then
+        is marked failed if it times out.
+
+        :param list messages: ``(config, ap, unique_id)`` tuples
+        :returns: str -- Errors to report to the client, if any
+
+        """
+        if not messages:
+            return ""
+        message = ""
+        self.LOGGER.debug("Launching dispatcher for %s messages", 
+                          len(messages))
+        try:
+            handles = self.dispatcher.dispatch_many(messages)
+        except AuroraException as e:
+            self.LOGGER.warn(e.message)
+            return e.message + '\n'
+        except Exception as e:
+            traceback.print_exc(file=sys.stdout)
+            return e.message + '\n'
+        deadline = time.time() + self.PUBLISH_WAIT
+        pending = 0
+        for handle in handles:
+            published = None
+            if handle.published is not None:
+                published = handle.published.wait(
+                    max(deadline - time.time(), 0)
+                )
+            if handle.error is not None:
+                error = handle.error
+            elif published is False:
+                error = handle.published.error
+            else:
+                if published is None:
+                    pending += 1
+                continue
+            message += "Could not dispatch to %s: %s\n" % (handle.ap, error)
+        if pending:
+            message += ("%s messages not yet sent, their slices are marked "
+                        "failed if they time out\n" % pending)
+        return message
+
     def ap_slice_delete(self, args, tenant_id, user_id, project_id):
         """Deletes a slice from an access point.
 
@@ -1040,10 +1283,10 @@ class Manager(object):
             ap_slice_dict= self.ap_slice_filter(arg_filter, tenant_id)
             ap_slice_list = [entry['ap_slice_id'] for entry in ap_slice_dict]
         elif args_name:
-            conditions = map(lambda x : "ap_slice_ssid = '%s'" % x, args_name)
+            conditions = map(lambda x : ("ap_slice_ssid = %s", x), args_name)
             conditions = query.join_criteria(conditions, "OR")
             result = query.query('ap_slice', ['ap_slice_id'], 
-                                 [conditions, 'tenant_id = "%s"' % tenant_id, 'status <> "DELETED"'])
+                                 [conditions, ('tenant_id = %s', tenant_id), 'status <> "DELETED"'])
             if (len(result) != len(args_name)) and (len(result) != 0):
                 message = "Duplicated ssid exists. Specify slice with its id to delete instead."
                 return {"status": False, "message": message}
@@ -1057,6 +1300,8 @@ class Manager(object):
             message += " None to delete\n"
 
         status = True
+        # Messages are collected and dispatched together
+        messages = []
         for ap_slice_id in ap_slice_list:
             config = {
                 "slice":ap_slice_id, 
@@ -1084,32 +1329,28 @@ class Manager(object):
                 else:
                     ap_name = self.aurora_db.get_wslice_physical_ap(ap_slice_id)
             except Exception as e:
-                response = {"status":False, "message":message + e.message}
                 traceback.print_exc(file=sys.stdout)
+                # Slices already deleted still need their message
+                message += self._dispatch_messages(messages)
+                response = {"status":False, "message":message + e.message}
                 return response
             message += self.aurora_db.wslice_delete(ap_slice_id)
 
             #Dispatch
             #Generate unique message id
-            self.LOGGER.debug("Launching dispatcher")
-            try:
-                self.dispatcher.dispatch(config, ap_name)
-            except AuroraException as e:
-                message += e.message + '\n'
-                self.LOGGER.warn(e.message)
-            except Exception as e:
-                message += e.message + '\n'
-                traceback.print_exc(file=sys.stdout)
+            messages.append((config, ap_name, None))
             try:
                 config_db.delete_config(ap_slice_id, tenant_id)
             except AuroraException, e:
                 LOGGER.error(e.message)
 
+        message += self._dispatch_messages(messages)
+
         #Return response
         response = {"status":status, "message":message}
         return response
 
-    def ap_slice_filter(self, arg_filter, tenant_id):
+    def ap_slice_filter(self, arg_filter, tenant_id, limit=None, after=None):
         """A helper method for finding wireless slices based on their 
         SQL entries.  Example arg_filter strings::
 
@@ -1119,6 +1360,8 @@ class Manager(object):
 
         :param str args:
         :param str tenant_id:
+        :param int limit: Maximum number of slices, ordered by ID
+        :param str after: Only return slices with a greater ID
         :rtype: list
 
         """
@@ -1126,220 +1369,114 @@ class Manager(object):
         #       This means it is possible that by typing a location field,
         #       the user may get results that have the tagged value in
         #       tenant_tags value instead of location_tags exclusively
+        criteria = []
+        params = []
+        if not (tenant_id == "0" or tenant_id == 0):
+            criteria.append("tenant_id = %s")
+            params.append(tenant_id)
+
+        tags = []
+        for entry in arg_filter.split('&'):
+            entry = entry.strip()
+            if entry == '':
+                continue
+            #Filter for tags (NOT Query is not yet implemented (future work?),
+            #multiple tags match slices having any of them)
+            if 'tag' in entry or 'location' in entry:
+                #This now supports filters like --filter tag=mcgill.
+                #Should it be instead --filter location=mcgill?
+                if '=' in entry:
+                    tags.append(entry.split('=')[1])
+                else:
+                    raise Exception("Unexpected character in tag query. "
+                                    "Please check syntax and try again!")
+            # Percent signs are doubled to survive parameter substitution
+            elif '=' in entry:
+                criteria.append("%s='%s'" % (entry.split('=')[0],
+                                             entry.split('=')[1])
+                                .replace('%', '%%'))
+            elif '!' in entry:
+                criteria.append("%s<>'%s'" % (entry.split('!')[0],
+                                              entry.split('!')[1])
+                                .replace('%', '%%'))
+            else:
+                raise Exception("Error: Incorrect filter syntax.\n")
+        if tags:
+            tag_params = ", ".join(["%s"] * len(tags))
+            criteria.append(
+                """ap_slice_id IN
+                       (SELECT ap_slice_id FROM tenant_tags
+                            WHERE name IN (%s)
+                        UNION
+                        SELECT ap_slice_id FROM ap_slice
+                            WHERE physical_ap IN
+                                (SELECT ap_name FROM location_tags
+                                     WHERE name IN (%s)))""" %
+                (tag_params, tag_params)
+            )
+            params.extend(tags + tags)
+        if after is not None:
+            criteria.append("ap_slice.ap_slice_id > %s")
+            params.append(after)
+        self.LOGGER.debug("SQL Filter: %s", criteria)
+        return self._query_slices(criteria, params, limit)
+
+    def _query_slices(self, criteria, params, limit=None):
+        """Returns slices with their metering totals and tags, as used
+        by :func:`ap_slice_filter`.  Tenant and location tags are
+        gathered by MySQL in the same query and rows are streamed
+        from the server.
+
+        :param list criteria: SQL conditions, joined with AND, with
+                              literal percent signs doubled
+        :param list params: Values for the placeholders in criteria
+        :param int limit: Maximum number of rows, ordered by ID
+        :rtype: list
+
+        """
+        to_execute = """SELECT ap_slice_id, ap_slice_ssid, tenant_id,
+                               physical_ap, project_id, wnet_id, status,
+                               total_mb_sent, total_active_seconds,
+                               (SELECT GROUP_CONCAT(
+                                           CONCAT(tenant_tags.name, ' ')
+                                           ORDER BY tenant_tags.name
+                                           SEPARATOR '')
+                                    FROM tenant_tags
+                                    WHERE tenant_tags.ap_slice_id =
+                                        ap_slice.ap_slice_id),
+                               (SELECT GROUP_CONCAT(
+                                           CONCAT(location_tags.name, ' ')
+                                           ORDER BY location_tags.name
+                                           SEPARATOR '')
+                                    FROM location_tags
+                                    WHERE location_tags.ap_name =
+                                        ap_slice.physical_ap)
+                            FROM ap_slice
+                                LEFT JOIN metering USING (ap_slice_id)"""
+        if criteria:
+            to_execute += " WHERE " + " AND ".join(criteria)
+        if limit is not None:
+            to_execute += " ORDER BY ap_slice.ap_slice_id LIMIT %d" % limit
+        newList = [] #Result list
         try:
-            self.con = mdb.connect(self.mysql_host,
-                                   self.mysql_username,
-                                   self.mysql_password,
-                                   self.mysql_db) #Change address
+            with self.db_pool.cursor(mdb.cursors.SSCursor) as cur:
+                self.LOGGER.debug(to_execute)
+                cur.execute(to_execute, params)
+                for row in cur:
+                    newList.append({
+                        'ap_slice_id': row[0],
+                        'ap_slice_ssid': row[1],
+                        'tenant_id': row[2],
+                        'physical_ap': row[3],
+                        'project_id': row[4],
+                        'wnet_id': row[5],
+                        'status': row[6],
+                        'total_mb_sent': row[7],
+                        'total_active_duration': seconds_to_duration(row[8]),
+                        'tags': (row[9] or "") + (row[10] or ""),
+                    })
         except mdb.Error, e:
             traceback.print_exc(file=sys.stdout)
-            # self.LOGGER.error("Error %d: %s", e.args[0], e.args[1])
-            # sys.exit(1)
-        newList = [] #Result list
-        if len(arg_filter) == 0: #No filter or tags
-            try:
-                with self.con:
-                    cur = self.con.cursor()
-
-                    if tenant_id == "0" or tenant_id == 0:
-                        to_execute = """SELECT * 
-                            FROM 
-                                (SELECT ap_slice_id, total_mb_sent, total_active_duration
-                                    FROM
-                                        metering
-                                ) AS A
-                                RIGHT JOIN ap_slice AS B USING (ap_slice_id)"""
-                        self.LOGGER.debug(to_execute)
-                        cur.execute(to_execute)
-                    else:
-                        to_execute = """SELECT * 
-                            FROM 
-                                (SELECT ap_slice_id, total_mb_sent, total_active_duration
-                                    FROM
-                                        metering
-                                ) AS A
-                                RIGHT JOIN ap_slice AS B USING (ap_slice_id)
-                            WHERE 
-                                tenant_id = '%s'""" % tenant_id
-                        self.LOGGER.debug(to_execute)
-                        cur.execute(to_execute)
-
-
-
-
-                    # if tenant_id == 0:
-                    #     cur.execute("SELECT * FROM ap_slice")
-                    # else:
-                    #     cur.execute( "SELECT * FROM ap_slice WHERE "
-                    #                  "tenant_id = '%s'" % tenant_id )
-                    tempList =  cur.fetchall()
-                    #pprint(tempList)
-                    #Prune thorugh list
-                    for i in range(len(tempList)):
-                        newList.append({})
-                        newList[i]['ap_slice_id'] = tempList[i][0]
-                        newList[i]['ap_slice_ssid'] = tempList[i][1]
-                        newList[i]['tenant_id'] = tempList[i][2]
-                        newList[i]['physical_ap'] = tempList[i][3]
-                        newList[i]['project_id'] = tempList[i][4]
-                        newList[i]['wnet_id'] = tempList[i][5]
-                        newList[i]['status'] = tempList[i][6]
-                        newList[i]['total_mb_sent'] = tempList[i][7]
-                        newList[i]['total_active_duration'] = tempList[i][8]
-                        #Get a list of tags
-                        cur.execute( "SELECT name FROM tenant_tags WHERE "
-                                     "ap_slice_id = '%s'" % tempList[i][0] )
-                        tagList = cur.fetchall()
-                        tagString = ""
-                        for tag in tagList:
-                            tagString += str(tag[0])+" "
-                        cur.execute( "SELECT name FROM location_tags WHERE "
-                                     "ap_name = '%s'" % tempList[i][3] )
-                        tagList = cur.fetchall()
-                        for tag in tagList:
-                            tagString += str(tag[0])+" "
-                        newList[i]['tags'] = tagString
-
-            except mdb.Error, e:
-                traceback.print_exc(file=sys.stdout)
-                # self.LOGGER.error("Error %d: %s", e.args[0], e.args[1])
-        else: #Multiple arguments
-            tag_compare = False #For tags, we need 2 queries and a quick result compare at the end
-            tag_result = []
-            args_list = arg_filter.split('&')
-           # print "args_list:", args_list
-            for (index, entry) in enumerate(args_list):
-                args_list[index] = entry.strip()
-                if args_list[index] == '':
-                    continue
-                #Filter for tags (NOT Query is not yet implemented (future work?),
-                #support for only 1 tag (USE 'OR' STATEMENT IN FUTURE FOR MULTIPLE))
-                if 'tag' in args_list[index] or 'location' in args_list[index]:
-                    #This now supports filters like --filter tag=mcgill.
-                    #Should it be instead --filter location=mcgill?
-                    tag_compare = True
-                    try:
-                        with self.con:
-                            cur = self.con.cursor()
-                            if '=' in args_list[index]:
-                                cur.execute( "SELECT ap_slice_id FROM tenant_tags WHERE "
-                                             "name = '%s'" % args_list[index].split('=')[1] )
-                                tempresult = cur.fetchall()
-                                for result in tempresult:
-                                    tag_result.append(result[0])
-                                cur.execute( "SELECT ap_name FROM location_tags WHERE "
-                                             "name = '%s'" % args_list[index].split('=')[1] )
-                                ap_locations = cur.fetchall()
-                                for (i, location) in enumerate(ap_locations):
-                                    self.LOGGER.debug("Looking for location info: %s", location)
-                                    if tenant_id == 0:
-                                        cur.execute( "SELECT ap_slice_id FROM ap_slice WHERE "
-                                                     "physical_ap = '%s'" % location[0] )
-                                    else:
-                                        cur.execute( "SELECT ap_slice_id FROM ap_slice WHERE "
-                                                     "tenant_id = '%s' AND "
-                                                     "physical_ap = '%s'" % (tenant_id, location[0]) )
-                                    phys_ap = cur.fetchall()
-                                    self.LOGGER.debug("phys_ap: %s", phys_ap)
-                                    for result in phys_ap:
-                                        if result[0] not in tag_result:
-                                            tag_result.append(result[0])
-                            else:
-                                raise Exception("Unexpected character in tag query. "
-                                                "Please check syntax and try again!")
-
-                    except mdb.Error, e:
-                        traceback.print_exc(file=sys.stdout)
-                        # self.LOGGER.error("Error %d: %s", e.args[0], e.args[1])
-
-                elif '=' in args_list[index]:
-                    args_list[index] = "%s='%s'" % (args_list[index].split('=')[0],
-                                                    args_list[index].split('=')[1])
-                elif '!' in args_list[index]:
-                    args_list[index] = "%s<>'%s'" % (args_list[index].split('!')[0],
-                                                     args_list[index].split('!')[1])
-                else:
-                    raise Exception("Error: Incorrect filter syntax.\n")
-            #Combine to 1 string
-            expression = args_list[0]
-            if 'tag' in expression or 'location' in expression:
-                expression = ""
-            for (index, entry) in enumerate(args_list):
-                if index != 0 and 'tag' not in entry  and 'location' not in entry:
-                    if len(expression) != 0:
-                        expression = expression+' AND '+ entry
-                    else:
-                        expression = entry
-            self.LOGGER.debug("SQL Filter: %s", expression)
-
-            #Execute Query
-            try:
-                with self.con:
-                    cur = self.con.cursor()
-                    #TODO: Allow admin to see all (tenant_id of 0)
-                    if len(expression) == 0:
-                        expression = ''
-
-                    if tenant_id == "0" or tenant_id == 0:
-                        cur.execute( ("""SELECT * 
-                            FROM 
-                                (SELECT ap_slice_id, total_mb_sent, total_active_duration
-                                    FROM
-                                        metering
-                                ) AS A
-                                RIGHT JOIN ap_slice AS B USING (ap_slice_id)
-                            WHERE """
-                        ) + expression) 
-                    else:
-                        cur.execute( ("""SELECT * 
-                            FROM 
-                                (SELECT ap_slice_id, total_mb_sent, total_active_duration
-                                    FROM
-                                        metering
-                                ) AS A
-                                RIGHT JOIN ap_slice AS B USING (ap_slice_id)
-                            WHERE 
-                                tenant_id = '%s' AND """ % tenant_id
-                        ) + expression)
-                    tempList = list(cur.fetchall())
-                    #Compare result with tag_list if necessary
-                    if tag_compare:
-                        comparedList = []
-                        for (index,slice_entry) in enumerate(tempList):
-                            if slice_entry[0] in tag_result:
-                                comparedList.append(slice_entry)
-                        tempList = comparedList
-                    #Prune thorugh list
-
-                    for i in range(len(tempList)):
-                        newList.append({})
-                        newList[i]['ap_slice_id'] = tempList[i][0]
-                        newList[i]['ap_slice_ssid'] = tempList[i][1]
-                        newList[i]['tenant_id'] = tempList[i][2]
-                        newList[i]['physical_ap'] = tempList[i][3]
-                        newList[i]['project_id'] = tempList[i][4]
-                        newList[i]['wnet_id'] = tempList[i][5]
-                        newList[i]['status'] = tempList[i][6]
-                        # TODO: Append these values from metering table
-                        newList[i]['total_mb_sent'] = tempList[i][7]
-                        newList[i]['total_active_duration'] = tempList[i][8]
-                        #Get a list of tags
-                        cur.execute("SELECT name FROM tenant_tags WHERE ap_slice_id='%s'" % tempList[i][0])
-                        tagList = cur.fetchall()
-                        tagString = ""
-                        for tag in tagList:
-                            tagString += str(tag[0])+" "
-                        newList[i]['tags'] = tagString
-                        cur.execute( "SELECT name FROM location_tags WHERE "
-                                     "ap_name = '%s'" % tempList[i][3] )
-                        tagList = cur.fetchall()
-                        for tag in tagList:
-                            tagString += str(tag[0])+" "
-                        newList[i]['tags'] = tagString
-            except mdb.Error, e:
-                traceback.print_exc(file=sys.stdout)
-                # self.LOGGER.error("Error %d: %s", e.args[0], e.args[1])
-
         return newList
 
     def ap_slice_list(self, args, tenant_id, user_id, project_id):
@@ -1365,7 +1502,15 @@ class Manager(object):
         self.LOGGER.debug("arg_filter: %s", arg_filter)
 
         try:
-            newList = self.ap_slice_filter(arg_filter, tenant_id)
+            (limit, after) = self._page_args(args, 'ap-slice-list')
+            (newList, next_cursor) = self._paginate(
+                'ap-slice-list',
+                self.ap_slice_filter(arg_filter, tenant_id, limit + 1, after),
+                limit, lambda entry: entry['ap_slice_id']
+            )
+        except AuroraException as e:
+            response = {"status":False, "message":e.message}
+            return response
         except Exception as e:
             message += e.message
             self.LOGGER.error(e)
@@ -1390,9 +1535,11 @@ class Manager(object):
                 message = pt.get_string()
             else:
                 message = pt.get_string(fields=["ap_slice_id", "ap_slice_ssid", "physical_ap", "status"])
+            message += self._page_footer(next_cursor)
 
         #Return response
-        response = {"status":True, "message":message}
+        response = {"status":True, "message":message,
+                    "next_cursor":next_cursor}
         return response
 
     def ap_slice_move(self, args, tenant_id, user_id, project_id):
@@ -1492,10 +1639,10 @@ class Manager(object):
         slice_id_list = args['ap-slice-show']
         arg_name = args['ssid']
         if arg_name is not None:
-            conditions = map(lambda x : "ap_slice_ssid = '%s'" % x, arg_name)
+            conditions = map(lambda x : ("ap_slice_ssid = %s", x), arg_name)
             conditions = query.join_criteria(conditions, "OR")
             result = query.query('ap_slice', ['ap_slice_id'], 
-                                 [conditions, 'tenant_id = "%s"' % tenant_id, 'status <> "DELETED"'])
+                                 [conditions, ('tenant_id = %s', tenant_id), 'status <> "DELETED"'])
             slice_id_list += [x[0] for x in result]
 
         message = ""
@@ -1505,7 +1652,7 @@ class Manager(object):
             list_name = args['ap-slice-show']
             filtered_list = list(set(list_name))
             
-            filtered_list = map(lambda x : 'ap_slice_ssid="%s"' % x, filtered_list)
+            filtered_list = map(lambda x : ('ap_slice_ssid=%s', x), filtered_list)
             criteria = filter.join_criteria(filtered_list, 'OR')
             criteria = filter.join_criteria([criteria, 'status != "DELETED"'], 'AND')
             
@@ -1577,6 +1724,60 @@ class Manager(object):
         response = {"status":True, "message":message}
         return response
 
+    def ap_slice_usage(self, args, tenant_id, user_id, project_id):
+        """Returns a table of the traffic and uptime of slices over a 
+        time range, read from the metering rollups.
+
+        Some options are available:
+
+        --start       Start of the range, 24 hours before --end by default
+        --end         End of the range, now by default
+        --resolution  5min, hour or day buckets, chosen from the range 
+                      by default
+
+        :rtype: dict
+
+        """
+        message = ""
+        ap_slice_ids = []
+        for ap_slice_id in args['ap-slice-usage'] or []:
+            if self.aurora_db.wslice_belongs_to(tenant_id, project_id, 
+                                                ap_slice_id):
+                ap_slice_ids.append(ap_slice_id)
+            else:
+                message += "Error: You have no slice '%s'.\n" % ap_slice_id
+        try:
+            (start, end, resolution) = self._usage_args(args)
+        except AuroraException as e:
+            return {"status":False, "message":e.message}
+        if not ap_slice_ids:
+            return {"status":False, "message":message}
+
+        usage = self.aurora_db.get_slice_usage(ap_slice_ids, start, end, 
+                                               resolution)
+        message += self._usage_table(usage, ["ap_slice_id", "bucket_start"])
+        response = {"status":True, "message":message}
+        return response
+
+    def tenant_usage(self, args, tenant_id, user_id, project_id):
+        """Returns a table of the traffic and uptime of all of a 
+        tenant's slices over a time range, with the options of 
+        :func:`ap_slice_usage`.
+
+        :rtype: dict
+
+        """
+        try:
+            (start, end, resolution) = self._usage_args(args)
+        except AuroraException as e:
+            return {"status":False, "message":e.message}
+
+        usage = self.aurora_db.get_tenant_usage(tenant_id, start, end, 
+                                                resolution)
+        message = self._usage_table(usage, ["bucket_start"])
+        response = {"status":True, "message":message}
+        return response
+
     def wnet_add_wslice(self, args, tenant_id, user_id, project_id):
         """Adds a wireless slice to a wnet.
 
@@ -1595,9 +1796,9 @@ class Manager(object):
             response = {"status":False, "message":err_msg}
             return response
         elif args['ssid']:
-            conditions = map(lambda x : "ap_slice_ssid = '%s'" % x, args['ssid'])
+            conditions = map(lambda x : ("ap_slice_ssid = %s", x), args['ssid'])
             conditions = query.join_criteria(conditions, 'OR')
-            conditions = query.join_criteria([conditions, 'tenant_id = "%s"' % tenant_id, 'status <> "DELETED"'], 'AND')
+            conditions = query.join_criteria([conditions, ('tenant_id = %s', tenant_id), 'status <> "DELETED"'], 'AND')
             result = query.query('ap_slice', ['ap_slice_id'], [conditions])
             slice_id_list += [x[0] for x in result]
 
@@ -1713,10 +1914,10 @@ class Manager(object):
             return response
         else:
             if arg_ssid:
-                conditions = map(lambda x : "ap_slice_ssid = '%s'" % x, args['ssid'])
+                conditions = map(lambda x : ("ap_slice_ssid = %s", x), args['ssid'])
                 conditions = query.join_criteria(conditions, "OR")
                 result = query.query('ap_slice', ['ap_slice_id'], 
-                                     [conditions, 'tenant_id = "%s"' % tenant_id, 'status <> "DELETED"'])
+                                     [conditions, ('tenant_id = %s', tenant_id), 'status <> "DELETED"'])
                 list_from_ssid = [x[0] for x in result]
             else:
                 list_from_ssid = []
@@ -1831,18 +2032,19 @@ class Manager(object):
         arg_wnet = args['wnet-show'][0]
 
         try:
+            (limit, after) = self._page_args(args, 'wnet-show')
             wnet_to_print = self.aurora_db.get_wnet_list(tenant_id, arg_wnet)
-            if arg_a:
-                slices_to_print = self.aurora_db.get_wnet_slices(
+            (slices_to_print, next_cursor) = self._paginate(
+                'wnet-show',
+                self.aurora_db.get_wnet_slices(
                     arg_wnet, 
                     tenant_id,
-                    include_deleted=True
+                    include_deleted=bool(arg_a),
+                    limit=limit + 1,
+                    after=after
+                ),
+                limit, lambda entry: entry['ap_slice_id']
             )
-            else:
-                slices_to_print = self.aurora_db.get_wnet_slices(
-                    arg_wnet, 
-                    tenant_id
-                )
         except AuroraException as e:
             response = {"status":False, "message":e.message}
             return response
@@ -1900,8 +2102,10 @@ class Manager(object):
                         "status"
                     ]
                 )
+            message += self._page_footer(next_cursor)
 
-        response = {"status":True, "message":message}
+        response = {"status":True, "message":message,
+                    "next_cursor":next_cursor}
         return response
 
     def wnet_update_ssid(self, args, tenant_id, user_id, project_id):
@@ -0,0 +1,363 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Traffic and uptime history of slices.
+
+Every slice stats report appends one row per slice to the
+``metering_samples`` table (see
+:func:`aurora.aurora_db.AuroraDB.ap_slice_bulk_update_stats`), holding
+the traffic and uptime accrued since the previous report.
+:class:`MeteringRollup` periodically sums the samples into
+``metering_rollup`` buckets of five minutes, then rolls those into
+hourly and daily buckets, and discards data older than the retention
+configured for each level.
+
+Range queries should read the coarsest level which still gives a
+useful number of points, see :func:`choose_resolution`, so reports
+spanning months only touch a few hundred rows per slice.
+
+The retention and rollup interval are read from the optional
+``metering`` section of the configuration file::
+
+    "metering": {
+        "rollup_interval": 60,
+        "sample_retention_days": 7,
+        "five_minute_retention_days": 35,
+        "hourly_retention_days": 400,
+        "daily_retention_days": 0
+    }
+
+A retention of 0 keeps data forever.
+
+"""
+import datetime
+import logging
+import sys
+import traceback
+
+import MySQLdb as mdb
+
+import config
+
+from aurora.cls_logger import get_cls_logger
+from aurora.stop_thread import *
+
+LOGGER = logging.getLogger(__name__)
+
+FIVE_MINUTES = 300
+HOUR = 3600
+DAY = 86400
+
+#: Rollup levels, finest first.  Each level is built from the one
+#: before it, the first from the raw samples.
+RESOLUTIONS = (FIVE_MINUTES, HOUR, DAY)
+#: Rollup levels by the name clients give with --resolution
+RESOLUTION_NAMES = {'5min': FIVE_MINUTES, 'hour': HOUR, 'day': DAY}
+
+#: Retention key for the raw samples
+SAMPLES = 'samples'
+
+#: Days of data kept at each level, 0 keeps data forever
+DEFAULT_RETENTION = {
+    SAMPLES: 7,
+    FIVE_MINUTES: 35,
+    HOUR: 400,
+    DAY: 0,
+}
+
+#: Upper bound on the buckets per slice returned for a range
+MAX_BUCKETS = 500
+
+#: Days of sample partitions created in advance
+PARTITIONS_AHEAD = 3
+
+_RETENTION_KEYS = {
+    SAMPLES: 'sample_retention_days',
+    FIVE_MINUTES: 'five_minute_retention_days',
+    HOUR: 'hourly_retention_days',
+    DAY: 'daily_retention_days',
+}
+
+
+def rollup_settings():
+    """Reads the optional ``metering`` section of the configuration
+    file.
+
+    :returns: dict -- Keyword arguments for :class:`MeteringRollup`
+
+    """
+    metering_config = config.CONFIG.get('metering', {})
+    retention = dict(DEFAULT_RETENTION)
+    for (level, key) in _RETENTION_KEYS.items():
+        retention[level] = metering_config.get(key, retention[level])
+    return {
+        'interval': metering_config.get('rollup_interval', 60),
+        'retention': retention,
+    }
+
+
+def floor_time(moment, resolution):
+    """Returns the start of the bucket containing ``moment``.
+
+    Buckets are aligned on local midnight, matching :func:`bucket_sql`.
+
+    :param :class:`datetime.datetime` moment:
+    :param int resolution: Bucket size in seconds, dividing a day
+    :rtype: :class:`datetime.datetime`
+
+    """
+    midnight = datetime.datetime.combine(moment.date(), datetime.time())
+    seconds = (moment - midnight).seconds
+    return midnight + datetime.timedelta(
+        seconds=seconds - seconds % resolution
+    )
+
+
+def bucket_sql(column, resolution):
+    """Returns an SQL expression for the start of the bucket
+    containing the DATETIME ``column``, see :func:`floor_time`.
+
+    :rtype: str
+
+    """
+    return ("TIMESTAMP(DATE(%s)) + INTERVAL "
+            "TIME_TO_SEC(%s) DIV %d * %d SECOND" %
+            (column, column, resolution, resolution))
+
+
+def choose_resolution(start, end, retention=None, now=None):
+    """Returns the finest rollup level which covers ``start`` given
+    the retention, and splits the range in at most
+    :data:`MAX_BUCKETS` buckets.  Falls back to daily buckets.
+
+    :param :class:`datetime.datetime` start:
+    :param :class:`datetime.datetime` end:
+    :param dict retention: Days kept per level, defaults to
+                           :data:`DEFAULT_RETENTION`
+    :rtype: int
+
+    """
+    if retention is None:
+        retention = DEFAULT_RETENTION
+    if now is None:
+        now = datetime.datetime.now()
+    span = (end - start).total_seconds()
+    for resolution in RESOLUTIONS:
+        days = retention.get(resolution, 0)
+        if days and start < now - datetime.timedelta(days=days):
+            continue
+        if span / resolution <= MAX_BUCKETS:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+class MeteringRollup(object):
+    """Builds the rollups of the metering samples and applies the
+    retention policy from a background thread.
+
+    Each run recomputes every bucket from the one which was still
+    open during the previous run, so rerunning is harmless and runs
+    missed while the manager was stopped are caught up.
+
+    """
+    def __init__(self, pool, interval=60, retention=None):
+        """
+        :param pool: :class:`aurora.db_pool.ConnectionPool`
+        :param float interval: Seconds between runs
+        :param dict retention: Days kept per level, see
+                               :data:`DEFAULT_RETENTION`
+
+        """
+        self.LOGGER = get_cls_logger(self)
+        self.pool = pool
+        self.interval = interval
+        self.retention = dict(DEFAULT_RETENTION)
+        if retention:
+            self.retention.update(retention)
+        self.worker = None
+
+    def start(self):
+        """Starts the rollup thread."""
+        self.LOGGER.info("Starting metering rollups every %ss",
+                         self.interval)
+        self.worker = TimerThread(target=self._run)
+        self.worker.start()
+
+    def stop(self):
+        """Stops the rollup thread."""
+        if self.worker is not None:
+            self.worker.stop()
+
+    def _run(self, stop_event=None):
+        while not stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+            stop_event.wait(self.interval)
+
+    def run_once(self, now=None):
+        """Maintains the sample partitions, updates every rollup
+        level and discards expired data.
+
+        :param :class:`datetime.datetime` now:
+
+        """
+        if now is None:
+            now = datetime.datetime.now()
+        self.maintain_partitions(now)
+        source = None
+        for resolution in RESOLUTIONS:
+            self.rollup(resolution, source, now)
+            source = resolution
+        self.expire(now)
+
+    def rollup(self, resolution, source, now):
+        """Recomputes the buckets of one level from the samples, or
+        from the ``source`` level, since the last run.
+
+        :param int resolution: Level to build
+        :param int source: Finer level to read, None for the samples
+        :param :class:`datetime.datetime` now:
+        :returns: int -- Rows written
+
+        """
+        if source is None:
+            source_sql = """SELECT ap_slice_id, %s AS bucket,
+                                SUM(mb_delta), SUM(active_seconds), COUNT(*)
+                            FROM metering_samples
+                            WHERE sampled_at >= %%s AND sampled_at < %%s
+                            GROUP BY ap_slice_id, bucket""" % (
+                bucket_sql('sampled_at', resolution),
+            )
+            first_sql = "SELECT MIN(sampled_at) FROM metering_samples"
+            source_params = []
+        else:
+            source_sql = """SELECT ap_slice_id, %s AS bucket,
+                                SUM(mb_sent), SUM(active_seconds),
+                                SUM(samples)
+                            FROM metering_rollup
+                            WHERE resolution = %d AND
+                                bucket_start >= %%s AND bucket_start < %%s
+                            GROUP BY ap_slice_id, bucket""" % (
+                bucket_sql('bucket_start', resolution), source
+            )
+            first_sql = ("SELECT MIN(bucket_start) FROM metering_rollup "
+                         "WHERE resolution = %s")
+            source_params = [source]
+
+        written = 0
+        try:
+            with self.pool.cursor() as cur:
+                cur.execute("""SELECT rolled_until FROM metering_rollup_state
+                                   WHERE resolution=%s""", (resolution,))
+                row = cur.fetchone()
+                start = row[0] if row is not None else None
+                if start is None:
+                    cur.execute(first_sql, source_params)
+                    start = cur.fetchone()[0]
+                    if start is None:
+                        return 0
+                start = floor_time(start, resolution)
+                current = floor_time(now, resolution)
+                end = current + datetime.timedelta(seconds=resolution)
+
+                written = cur.execute(
+                    """INSERT INTO metering_rollup
+                           (ap_slice_id, bucket_start, mb_sent,
+                            active_seconds, samples, resolution)
+                       SELECT source.*, %s FROM (""" + source_sql +
+                    """) AS source
+                       ON DUPLICATE KEY UPDATE
+                           mb_sent=VALUES(mb_sent),
+                           active_seconds=VALUES(active_seconds),
+                           samples=VALUES(samples)""",
+                    (resolution, start, end)
+                )
+                # The current bucket is still open, recompute it next run
+                cur.execute("""REPLACE INTO metering_rollup_state
+                                   VALUES (%s, %s)""", (resolution, current))
+            self.LOGGER.debug("Rolled up %s rows at %ss from %s",
+                              written, resolution, start)
+        except mdb.Error:
+            traceback.print_exc(file=sys.stdout)
+        return written
+
+    def expire(self, now):
+        """Deletes rollup buckets older than their level's retention.
+
+        :param :class:`datetime.datetime` now:
+
+        """
+        try:
+            with self.pool.cursor() as cur:
+                for resolution in RESOLUTIONS:
+                    days = self.retention.get(resolution, 0)
+                    if not days:
+                        continue
+                    cutoff = floor_time(now - datetime.timedelta(days=days),
+                                        resolution)
+                    deleted = cur.execute(
+                        """DELETE FROM metering_rollup
+                               WHERE resolution=%s AND bucket_start < %s""",
+                        (resolution, cutoff)
+                    )
+                    if deleted:
+                        self.LOGGER.info("Expired %s rollups at %ss",
+                                         deleted, resolution)
+        except mdb.Error:
+            traceback.print_exc(file=sys.stdout)
+
+    def maintain_partitions(self, now):
+        """Splits a partition per day off ``p_future`` for the next
+        :data:`PARTITIONS_AHEAD` days and drops the partitions of
+        days past the sample retention.
+
+        :param :class:`datetime.datetime` now:
+
+        """
+        today = now.date()
+        try:
+            with self.pool.cursor() as cur:
+                cur.execute("""SELECT partition_name
+                                   FROM information_schema.partitions
+                                   WHERE table_schema=DATABASE() AND
+                                       table_name='metering_samples' AND
+                                       partition_name IS NOT NULL""")
+                days = []
+                for (name,) in cur.fetchall():
+                    if name != 'p_future':
+                        days.append(
+                            datetime.datetime.strptime(name, 'p%Y%m%d').date()
+                        )
+                days.sort()
+
+                last = days[-1] if days else today - datetime.timedelta(1)
+                while last < today + datetime.timedelta(PARTITIONS_AHEAD):
+                    last += datetime.timedelta(1)
+                    self.LOGGER.info("Adding metering partition for %s", last)
+                    cur.execute(
+                        """ALTER TABLE metering_samples
+                               REORGANIZE PARTITION p_future INTO (
+                                   PARTITION %s VALUES LESS THAN
+                                       (TO_DAYS('%s')),
+                                   PARTITION p_future VALUES LESS THAN
+                                       MAXVALUE
+                               )""" % (last.strftime('p%Y%m%d'),
+                                       last + datetime.timedelta(1))
+                    )
+
+                keep = self.retention.get(SAMPLES, 0)
+                if keep:
+                    cutoff = today - datetime.timedelta(keep)
+                    for day in days:
+                        if day >= cutoff:
+                            break
+                        self.LOGGER.info("Dropping metering partition for %s",
+                                         day)
+                        cur.execute("""ALTER TABLE metering_samples
+                                           DROP PARTITION %s""" %
+                                    day.strftime('p%Y%m%d'))
+        except mdb.Error:
+            traceback.print_exc(file=sys.stdout)
@@ -0,0 +1,273 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Versioned schema upgrades for the Aurora MySQL database.
+
+Each migration has a version number and is recorded in the
+``schema_version`` table once applied.  Migrations only ever add to
+the schema and check ``information_schema`` before changing anything,
+so running them against a database which was created or upgraded by
+hand is safe::
+
+    with pool.cursor() as cur:
+        migrations.upgrade(cur, 'aurora')
+
+New migrations are appended to :data:`MIGRATIONS` with the next
+version number, existing entries must never be changed.
+
+"""
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _table_exists(cur, database, table):
+    cur.execute("""SELECT COUNT(*) FROM information_schema.tables
+                       WHERE table_schema=%s AND table_name=%s""",
+                (database, table))
+    return cur.fetchone()[0] > 0
+
+
+def _column_exists(cur, database, table, column):
+    cur.execute("""SELECT COUNT(*) FROM information_schema.columns
+                       WHERE table_schema=%s AND table_name=%s AND
+                           column_name=%s""",
+                (database, table, column))
+    return cur.fetchone()[0] > 0
+
+
+def _index_exists(cur, database, table, index):
+    cur.execute("""SELECT COUNT(*) FROM information_schema.statistics
+                       WHERE table_schema=%s AND table_name=%s AND
+                           index_name=%s""",
+                (database, table, index))
+    return cur.fetchone()[0] > 0
+
+
+def _add_index(cur, database, table, index, columns):
+    """Creates an index unless one of the same name exists."""
+    if _index_exists(cur, database, table, index):
+        LOGGER.info("Index %s.%s already exists", table, index)
+        return
+    LOGGER.warn("Creating index %s.%s (%s)", table, index,
+                ", ".join(columns))
+    cur.execute("ALTER TABLE %s ADD INDEX %s (%s)" %
+                (table, index, ", ".join(columns)))
+
+
+def _base_tables(cur, database):
+    """The schema as originally created by :mod:`aurora.sqldb_create`."""
+    cur.execute("""CREATE TABLE IF NOT EXISTS ap
+(
+    name VARCHAR(255) NOT NULL PRIMARY KEY,
+    region VARCHAR(255),
+    firmware VARCHAR(255),
+    version VARCHAR(255),
+    number_radio INT(11),
+    memory_mb INT(11),
+    free_disk INT(11),
+    supported_protocol VARCHAR(255) DEFAULT 'a/b/g',
+    number_radio_free INT(11),
+    number_slice_free INT(11),
+    status ENUM('UP','DOWN','UNKNOWN')
+)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS ap_slice
+(
+    ap_slice_id VARCHAR(40) NOT NULL PRIMARY KEY,
+    ap_slice_ssid VARCHAR(255),
+    tenant_id VARCHAR(255),
+    physical_ap VARCHAR(255),
+    project_id VARCHAR(255),
+    wnet_id VARCHAR(40),
+    status ENUM('PENDING','ACTIVE','FAILED','DOWN','DELETING','DELETED')
+)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS metering
+(
+    ap_slice_id VARCHAR(40) NOT NULL PRIMARY KEY,
+    current_mb_sent FLOAT DEFAULT 0.0,
+    total_mb_sent FLOAT DEFAULT 0.0,
+    current_active_duration TIME DEFAULT '00:00:00',
+    total_active_duration TIME DEFAULT '00:00:00',
+    last_time_activated DATETIME,
+    last_time_updated DATETIME
+)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS wnet
+(
+    wnet_id VARCHAR(40) NOT NULL PRIMARY KEY,
+    name VARCHAR(255) UNIQUE,
+    tenant_id VARCHAR(255),
+    project_id VARCHAR(40)
+)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS location_tags
+(
+    name VARCHAR(255),
+    ap_name VARCHAR(255),
+    PRIMARY KEY(name, ap_name)
+)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS tenant_tags
+(
+    name VARCHAR(255),
+    ap_slice_id VARCHAR(40),
+    PRIMARY KEY(name, ap_slice_id)
+)""")
+
+
+def _metering_seconds(cur, database):
+    """Stores metering durations as seconds instead of TIME values."""
+    if not _column_exists(cur, database, 'metering',
+                          'current_active_seconds'):
+        cur.execute("""ALTER TABLE metering
+    ADD COLUMN current_active_seconds INT UNSIGNED NOT NULL DEFAULT 0
+        AFTER total_mb_sent""")
+    if not _column_exists(cur, database, 'metering', 'total_active_seconds'):
+        cur.execute("""ALTER TABLE metering
+    ADD COLUMN total_active_seconds BIGINT UNSIGNED NOT NULL DEFAULT 0
+        AFTER current_active_seconds""")
+    if _column_exists(cur, database, 'metering', 'current_active_duration'):
+        cur.execute("""UPDATE metering SET
+    current_active_seconds=
+        COALESCE(TIME_TO_SEC(current_active_duration), 0)""")
+        cur.execute("""ALTER TABLE metering
+    DROP COLUMN current_active_duration""")
+    if _column_exists(cur, database, 'metering', 'total_active_duration'):
+        cur.execute("""UPDATE metering SET
+    total_active_seconds=
+        COALESCE(TIME_TO_SEC(total_active_duration), 0)""")
+        cur.execute("""ALTER TABLE metering
+    DROP COLUMN total_active_duration""")
+
+
+def _lookup_indexes(cur, database):
+    """Secondary indexes for the columns slices and tags are looked
+    up by.  The tag tables' primary keys lead with the tag name, so
+    lookups by AP or slice need an index of their own.
+
+    """
+    _add_index(cur, database, 'ap_slice', 'idx_ap_slice_physical_ap',
+               ['physical_ap', 'status'])
+    _add_index(cur, database, 'ap_slice', 'idx_ap_slice_tenant',
+               ['tenant_id', 'status'])
+    _add_index(cur, database, 'ap_slice', 'idx_ap_slice_wnet',
+               ['wnet_id'])
+    _add_index(cur, database, 'ap_slice', 'idx_ap_slice_ssid',
+               ['ap_slice_ssid', 'physical_ap'])
+    _add_index(cur, database, 'location_tags', 'idx_location_tags_ap',
+               ['ap_name', 'name'])
+    _add_index(cur, database, 'tenant_tags', 'idx_tenant_tags_slice',
+               ['ap_slice_id', 'name'])
+    _add_index(cur, database, 'wnet', 'idx_wnet_tenant',
+               ['tenant_id', 'name'])
+
+
+def _metering_history(cur, database):
+    """Append-only traffic samples and their rollups, see
+    :mod:`aurora.metering_history`.
+
+    Samples are partitioned by day so expired days can be dropped
+    without deleting rows one by one.  The catch-all ``p_future``
+    partition is split as days go by.
+
+    """
+    if not _table_exists(cur, database, 'metering_samples'):
+        cur.execute("""CREATE TABLE metering_samples
+(
+    ap_slice_id VARCHAR(40) NOT NULL,
+    sampled_at DATETIME NOT NULL,
+    mb_sent FLOAT NOT NULL DEFAULT 0.0,
+    mb_delta FLOAT NOT NULL DEFAULT 0.0,
+    active_seconds INT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY(ap_slice_id, sampled_at),
+    INDEX idx_metering_samples_time (sampled_at)
+)
+PARTITION BY RANGE (TO_DAYS(sampled_at))
+(
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS metering_rollup
+(
+    resolution INT UNSIGNED NOT NULL,
+    ap_slice_id VARCHAR(40) NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    mb_sent DOUBLE NOT NULL DEFAULT 0.0,
+    active_seconds BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    samples INT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY(resolution, ap_slice_id, bucket_start),
+    INDEX idx_metering_rollup_time (resolution, bucket_start)
+)""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS metering_rollup_state
+(
+    resolution INT UNSIGNED NOT NULL PRIMARY KEY,
+    rolled_until DATETIME
+)""")
+
+
+#: Ordered list of (version, description, function) tuples
+MIGRATIONS = [
+    (1, "Base tables", _base_tables),
+    (2, "Metering durations in seconds", _metering_seconds),
+    (3, "Lookup indexes", _lookup_indexes),
+    (4, "Metering samples and rollups", _metering_history),
+]
+
+
+def _ensure_version_table(cur):
+    cur.execute("""CREATE TABLE IF NOT EXISTS schema_version
+(
+    version INT NOT NULL PRIMARY KEY,
+    description VARCHAR(255),
+    applied_at DATETIME
+)""")
+
+
+def current_version(cur):
+    """Returns the highest migration version applied to the database
+    selected by the cursor, 0 if none are recorded.
+
+    :param cur: :mod:`MySQLdb` cursor
+    :rtype: int
+
+    """
+    _ensure_version_table(cur)
+    cur.execute("SELECT MAX(version) FROM schema_version")
+    return cur.fetchone()[0] or 0
+
+
+def pending(cur):
+    """Returns the migrations not yet applied.
+
+    :param cur: :mod:`MySQLdb` cursor
+    :rtype: list
+
+    """
+    version = current_version(cur)
+    return [migration for migration in MIGRATIONS
+            if migration[0] > version]
+
+
+def upgrade(cur, database, target=None):
+    """Applies pending migrations in order, up to and including
+    ``target`` if given.
+
+    MySQL commits DDL statements implicitly, so each migration is
+    recorded as soon as it completes and an interrupted upgrade
+    resumes from the failed migration.
+
+    :param cur: :mod:`MySQLdb` cursor
+    :param str database: Name of the Aurora database
+    :param int target: Last version to apply
+    :returns: int -- Version of the database after the upgrade
+
+    """
+    cur.execute("USE %s" % database)
+    version = current_version(cur)
+    for (number, description, migrate) in pending(cur):
+        if target is not None and number > target:
+            break
+        LOGGER.warn("Applying migration %s: %s", number, description)
+        migrate(cur, database)
+        cur.execute("""INSERT INTO schema_version VALUES (%s, %s, NOW())""",
+                    (number, description))
+        version = number
+    LOGGER.info("Database %s is at version %s", database, version)
+    return version
@@ -0,0 +1,223 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Periodic polling of access points from a single thread, see
+:class:`aurora.ap_monitor.APMonitor`.
+
+Each access point polled is a pending timeout of a
+:class:`aurora.timeout_scheduler.TimeoutScheduler`, keyed by its name,
+so adding or removing one costs O(log n) whatever the size of the
+fleet.  Polls are spread out so that access points coming up together
+do not stay in phase:
+
+* the first poll of an access point happens at a random point of its
+  interval,
+* each following poll is ``interval * (1 +- jitter)`` after the last,
+* and with ``max_rate`` set, polls coming due faster than that many
+  per second are deferred to the next free slot.
+
+The defaults are read from the optional ``polling`` section of the
+configuration file, intervals in seconds::
+
+    "polling": {
+        "interval": 50,
+        "jitter": 0.1,
+        "max_polls_per_second": 20,
+        "intervals": {"slow-ap": 300}
+    }
+
+"""
+import logging
+import random
+import sys
+import threading
+import time
+import traceback
+
+from aurora import config
+from aurora.cls_logger import get_cls_logger
+from aurora.timeout_scheduler import TimeoutScheduler
+
+LOGGER = logging.getLogger(__name__)
+
+
+def poll_settings():
+    """Reads the optional ``polling`` section of the configuration
+    file.
+
+    :returns: dict -- Keyword arguments for
+              :class:`aurora.ap_monitor.APMonitor`, the interval is
+              None if not configured
+
+    """
+    polling_config = config.CONFIG.get('polling', {})
+    return {
+        'poll_interval': polling_config.get('interval'),
+        'poll_jitter': polling_config.get('jitter', 0.1),
+        'max_polls_per_second': polling_config.get('max_polls_per_second'),
+        'poll_intervals': polling_config.get('intervals', {}),
+    }
+
+
+class PollScheduler(object):
+    """Calls ``poll(ap)`` for every access point added, each at its own
+    interval, from one background thread.
+
+    """
+    def __init__(self, poll, interval, jitter=0.1, max_rate=None):
+        """
+        :param callable poll: Called with the name of an access point,
+                              should return quickly
+        :param float interval: Default seconds between polls
+        :param float jitter: Fraction by which each interval is randomly
+                             lengthened or shortened
+        :param float max_rate: Most polls sent per second, None for no
+                               limit
+
+        """
+        self.LOGGER = get_cls_logger(self)
+        self.poll = poll
+        self.interval = interval
+        self.jitter = jitter
+        self.max_rate = max_rate
+
+        self._lock = threading.Lock()
+        # ap -> interval, None for the default one
+        self._intervals = {}
+        # Earliest time the next poll may be sent when rate limited
+        self._next_slot = 0.0
+        self._timeouts = TimeoutScheduler()
+
+        self._counters = {
+            'polls': 0,
+            'deferred': 0,
+            'failed': 0,
+        }
+
+    def __contains__(self, ap):
+        with self._lock:
+            return ap in self._intervals
+
+    def __len__(self):
+        with self._lock:
+            return len(self._intervals)
+
+    def start(self):
+        """Starts the scheduler thread."""
+        self._timeouts.start()
+
+    def stop(self):
+        """Stops the scheduler thread.  No further polls are sent."""
+        self.remove_all()
+        self._timeouts.stop()
+
+    def add(self, ap, interval=None):
+        """Starts polling an access point.  The first poll is sent at a
+        random point of its interval.
+
+        :param str ap: Name of the access point
+        :param float interval: Seconds between polls, None for the
+                               default
+        :returns: bool -- False if the access point was already polled
+
+        """
+        with self._lock:
+            if ap in self._intervals:
+                return False
+            self._intervals[ap] = interval
+            delay = random.uniform(0, self._interval_of(ap))
+            self._timeouts.schedule(ap, delay, self._fire, args=(ap,))
+        return True
+
+    def remove(self, ap):
+        """Stops polling an access point.
+
+        :param str ap:
+        :returns: bool -- False if the access point was not polled
+
+        """
+        with self._lock:
+            if self._intervals.pop(ap, False) is False:
+                return False
+            self._timeouts.cancel(ap)
+        return True
+
+    def remove_all(self):
+        """Stops polling every access point.
+
+        :returns: list -- Names of the access points no longer polled
+
+        """
+        with self._lock:
+            aps = self._intervals.keys()
+            self._intervals.clear()
+            self._timeouts.cancel_all()
+        return aps
+
+    def set_interval(self, ap, interval):
+        """Changes the interval of an access point from its next poll
+        on.  Access points not yet polled are left alone.
+
+        :param str ap:
+        :param float interval: Seconds between polls, None for the
+                               default
+
+        """
+        with self._lock:
+            if ap in self._intervals:
+                self._intervals[ap] = interval
+
+    def _interval_of(self, ap):
+        """Must be called with the lock held."""
+        interval = self._intervals.get(ap)
+        if interval is None:
+            return self.interval
+        return interval
+
+    def _fire(self, ap, reserved=False):
+        """Timeout callback sending a poll, or deferring it to the next
+        free slot when polls come due too fast.
+
+        """
+        with self._lock:
+            if ap not in self._intervals:
+                return
+            if self.max_rate and not reserved:
+                now = time.time()
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + 1.0 / self.max_rate
+                if slot > now:
+                    self._counters['deferred'] += 1
+                    self._timeouts.schedule(ap, slot - now, self._fire,
+                                            args=(ap, True))
+                    return
+            self._counters['polls'] += 1
+
+        try:
+            self.poll(ap)
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+            with self._lock:
+                self._counters['failed'] += 1
+
+        with self._lock:
+            # Removed while polling, or removed and added back, in which
+            # case add() already scheduled the next poll
+            if ap not in self._intervals or ap in self._timeouts:
+                return
+            delay = self._interval_of(ap) * random.uniform(
+                1 - self.jitter, 1 + self.jitter
+            )
+            self._timeouts.schedule(ap, delay, self._fire, args=(ap,))
+
+    def stats(self):
+        """Returns a snapshot of the poll counters.
+
+        :rtype: dict
+
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['aps'] = len(self._intervals)
+        return stats
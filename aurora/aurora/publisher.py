@@ -0,0 +1,407 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Single writer publish path of :class:`aurora.dispatcher.Dispatcher`.
+
+pika channels are not thread-safe.  Any thread may call
+:func:`Publisher.publish`, which only appends the message to a queue
+and returns a :class:`PublishFuture`.  The queue is drained by pika's
+IOLoop thread, the only thread which touches the channel::
+
+    publisher = Publisher()
+    # From the IOLoop thread, once the channel is open
+    publisher.attach(connection, channel)
+    # From any thread
+    future = publisher.publish('ap1', body, properties)
+    future.wait(5)
+
+The IOLoop drains the queue on a short timer.  Versions of pika which
+provide ``add_callback_threadsafe`` are also woken up as soon as a
+message is queued.
+
+Messages are published as mandatory, so the broker returns those for
+which no access point queue exists and they fail straight away with
+:exc:`aurora.exc.MessageReturned`.  With publisher confirms enabled,
+at most ``window`` messages await a confirm at any time, a future
+completes once the broker acks its message, and nacked messages are
+published again up to ``max_retries`` times before failing with
+:exc:`aurora.exc.MessageNacked`.
+
+Consumer callbacks which run off the IOLoop thread are given a
+:class:`DeferredAckChannel`, whose acks are queued the same way.
+
+"""
+import collections
+import logging
+import sys
+import threading
+import traceback
+
+from aurora.cls_logger import get_cls_logger
+from aurora.exc import *
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PublishFuture(object):
+    """Completion of one publish.
+
+    ``published`` is True once the message was written to the channel,
+    or acked by the broker when publisher confirms are enabled, and False
+    if it could not be, in which case ``error`` holds the reason.
+    ``confirmed`` is True once acked, False once nacked too many times
+    and stays None unless the broker confirms publishes.
+
+    """
+    def __init__(self, routing_key, correlation_id=None):
+        self.routing_key = routing_key
+        self.correlation_id = correlation_id
+        self.published = None
+        self.confirmed = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._callbacks = []
+
+    def __repr__(self):
+        if self.published is None:
+            state = 'queued'
+        elif self.published:
+            state = 'published'
+        else:
+            state = 'failed'
+        return "<PublishFuture %s %s>" % (self.correlation_id, state)
+
+    def done(self):
+        """Returns True once the publish succeeded or failed."""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Waits for the publish to complete.
+
+        :param float timeout: Seconds to wait, None waits forever
+        :returns: bool -- ``published``, None if the timeout expired
+
+        """
+        self._done.wait(timeout)
+        return self.published
+
+    def add_done_callback(self, callback):
+        """Calls ``callback(future)`` once the publish completes, right
+        away if it already has.
+
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _complete(self, published, error=None):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.published = published
+            self.error = error
+            callbacks = self._callbacks
+            self._callbacks = []
+            self._done.set()
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+
+
+class DeferredAckChannel(object):
+    """Stands in for the channel passed to a consumer callback run by
+    another thread than the IOLoop.  Acks are queued on a
+    :class:`Publisher`, which sends them from the IOLoop thread.
+
+    """
+    def __init__(self, publisher, channel):
+        self.publisher = publisher
+        self.channel = channel
+        self.acked = False
+
+    def __repr__(self):
+        return "<DeferredAckChannel %r>" % self.channel
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.acked = True
+        self.publisher.ack(self.channel, delivery_tag, multiple)
+
+
+class Publisher(object):
+    """Queues messages from any thread and publishes them from the
+    IOLoop thread.
+
+    """
+    #: Seconds between drains of the queue by the IOLoop
+    DRAIN_INTERVAL = 0.01
+
+    def __init__(self, exchange='', confirms=False, window=100,
+                 max_retries=3, on_returned=None):
+        """
+        :param str exchange: Default exchange of the messages
+        :param bool confirms: Enables publisher confirms
+        :param int window: Most messages awaiting a confirm at once
+        :param int max_retries: Times a nacked message is published
+                                again
+        :param on_returned: Callable taking the correlation ID and
+                            :exc:`aurora.exc.MessageReturned` of a
+                            returned message whose future had already
+                            completed, ie. without confirms
+
+        """
+        self.LOGGER = get_cls_logger(self)
+        self.exchange = exchange
+        self.confirms = confirms
+        self.window = window
+        self.max_retries = max_retries
+        self.on_returned = on_returned
+        # deque.append and deque.popleft are atomic, no lock is needed.
+        # Entries are
+        # [routing_key, body, properties, future, attempts, exchange]
+        self._queue = collections.deque()
+        # (channel, delivery_tag, multiple) of consumed messages
+        self._acks = collections.deque()
+        self._connection = None
+        self._channel = None
+        self._wakeup_pending = False
+        # The following are only used from the IOLoop thread
+        self._delivery_tag = 0
+        # delivery tag -> entry, awaiting a confirm, oldest first
+        self._unconfirmed = collections.OrderedDict()
+        # correlation ID -> delivery tag of the unconfirmed entries
+        self._tags = {}
+
+    def __len__(self):
+        return len(self._queue)
+
+    def attach(self, connection, channel):
+        """Starts draining the queue onto a channel.  Must be called
+        from the IOLoop thread.
+
+        """
+        self._connection = connection
+        self._channel = channel
+        channel.add_on_return_callback(self._on_return)
+        if self.confirms:
+            # Delivery tags restart from 1 on every channel
+            self._delivery_tag = 0
+            channel.confirm_delivery(self._on_confirm)
+        self._schedule_drain()
+
+    def detach(self):
+        """Stops publishing, failing every queued message and every 
+        message awaiting a confirm.
+
+        """
+        self._connection = None
+        self._channel = None
+        error = RuntimeError("Channel closed")
+        while True:
+            try:
+                (tag, entry) = self._unconfirmed.popitem(last=False)
+            except KeyError:
+                break
+            self._tags.pop(entry[3].correlation_id, None)
+            entry[3]._complete(False, error)
+        self._fail_queued(error)
+        # The broker redelivers the messages of the closed channel
+        self._acks.clear()
+
+    @property
+    def in_flight(self):
+        """Number of messages awaiting a confirm."""
+        return len(self._unconfirmed)
+
+    def publish(self, routing_key, body, properties, correlation_id=None,
+                exchange=None):
+        """Queues a message for the IOLoop thread to publish.
+
+        :param str routing_key: Queue of the access point
+        :param str body:
+        :param properties: :class:`pika.BasicProperties`
+        :param str correlation_id: Identifies the future in logs
+        :param str exchange: Overrides the default exchange
+        :rtype: :class:`PublishFuture`
+
+        """
+        if exchange is None:
+            exchange = self.exchange
+        future = PublishFuture(routing_key, correlation_id)
+        self._queue.append([routing_key, body, properties, future, 0,
+                            exchange])
+        # Published once a channel is attached, or failed on detach
+        self._wake()
+        return future
+
+    def ack(self, channel, delivery_tag, multiple=False):
+        """Queues the ack of a consumed message for the IOLoop 
+        thread.  Acks for a channel which has since been replaced are 
+        dropped, its messages are redelivered.
+
+        :param channel: Channel the message was delivered on
+        :param int delivery_tag:
+        :param bool multiple:
+
+        """
+        self._acks.append((channel, delivery_tag, multiple))
+        self._wake()
+
+    def _wake(self):
+        """Drains the queues right away on pika versions which allow 
+        it, the timer drains them otherwise.
+
+        """
+        connection = self._connection
+        if connection is None:
+            return
+        add_callback = getattr(connection, 'add_callback_threadsafe', None)
+        if add_callback is not None and not self._wakeup_pending:
+            self._wakeup_pending = True
+            try:
+                add_callback(self._drain_now)
+            except Exception:
+                # The timer drains the queue anyway
+                self._wakeup_pending = False
+
+    def _schedule_drain(self):
+        if self._connection is not None:
+            self._connection.add_timeout(self.DRAIN_INTERVAL, self._drain)
+
+    def _drain_now(self):
+        self._wakeup_pending = False
+        self.drain()
+
+    def _drain(self):
+        self.drain()
+        self._schedule_drain()
+
+    def drain(self):
+        """Sends every queued ack, then publishes every queued
+        message.  Must be called from the IOLoop thread.
+
+        :returns: int -- Number of messages published
+
+        """
+        channel = self._channel
+        while channel is not None:
+            try:
+                (ack_channel, delivery_tag, multiple) = self._acks.popleft()
+            except IndexError:
+                break
+            if ack_channel is not channel:
+                continue
+            try:
+                channel.basic_ack(delivery_tag=delivery_tag,
+                                  multiple=multiple)
+            except Exception:
+                # Left to the Dispatcher's channel monitor, as for
+                # publishes
+                traceback.print_exc(file=sys.stdout)
+                break
+        published = 0
+        while channel is not None:
+            if self.confirms and len(self._unconfirmed) >= self.window:
+                # Drained again as confirms arrive
+                break
+            try:
+                entry = self._queue.popleft()
+            except IndexError:
+                break
+            (routing_key, body, properties, future, attempts, exchange) = \
+                entry
+            try:
+                channel.basic_publish(exchange=exchange,
+                                      routing_key=routing_key,
+                                      body=body,
+                                      properties=properties,
+                                      mandatory=True)
+            except Exception as e:
+                # The channel is broken, the Dispatcher's channel
+                # monitor restarts it
+                traceback.print_exc(file=sys.stdout)
+                future._complete(False, e)
+                self._channel = None
+                self._fail_queued(e)
+                try:
+                    self.LOGGER.info("Forcing a channel close")
+                    channel.close()
+                except Exception:
+                    traceback.print_exc(file=sys.stdout)
+                break
+            published += 1
+            if self.confirms:
+                self._delivery_tag += 1
+                self._unconfirmed[self._delivery_tag] = entry
+                self._tags[future.correlation_id] = self._delivery_tag
+            else:
+                future._complete(True)
+        return published
+
+    def _on_confirm(self, frame):
+        """Handles a Basic.Ack or Basic.Nack from the broker, then
+        publishes the messages the window can now take.
+
+        """
+        method = frame.method
+        if method.multiple:
+            tags = []
+            for tag in self._unconfirmed:
+                if tag > method.delivery_tag:
+                    break
+                tags.append(tag)
+        else:
+            tags = [method.delivery_tag]
+        acked = method.NAME == 'Basic.Ack'
+
+        retries = []
+        for tag in tags:
+            entry = self._unconfirmed.pop(tag, None)
+            if entry is None:
+                continue
+            future = entry[3]
+            self._tags.pop(future.correlation_id, None)
+            if acked:
+                future.confirmed = True
+                future._complete(True)
+            elif entry[4] < self.max_retries:
+                self.LOGGER.warn("Message for %s nacked, retrying",
+                                 entry[0])
+                entry[4] += 1
+                retries.append(entry)
+            else:
+                future.confirmed = False
+                future._complete(False, MessageNacked(ap=entry[0],
+                                                      attempts=entry[4] + 1))
+        # Retries go ahead of newer messages, in their original order
+        self._queue.extendleft(reversed(retries))
+        self.drain()
+
+    def _on_return(self, channel, method, properties, body):
+        """Fails a message the broker could not route."""
+        correlation_id = properties.correlation_id
+        error = MessageReturned(ap=method.routing_key,
+                                reason=method.reply_text)
+        self.LOGGER.warn(error.message)
+        tag = self._tags.pop(correlation_id, None)
+        if tag is not None:
+            # The broker still acks a returned message, which is
+            # ignored since the entry is gone
+            entry = self._unconfirmed.pop(tag)
+            entry[3]._complete(False, error)
+            self.drain()
+        elif self.on_returned is not None:
+            self.on_returned(correlation_id, error)
+
+    def _fail_queued(self, error):
+        while True:
+            try:
+                future = self._queue.popleft()[3]
+            except IndexError:
+                break
+            future._complete(False, error)
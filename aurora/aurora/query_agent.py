@@ -2,37 +2,70 @@
 # SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
 #              Mike Kobierski and Hoai Phuoc Truong
 #
+"""Small query layer over the Aurora MySQL database.
 
-import MySQLdb as mdb
+Criteria are either plain SQL strings or tuples of an SQL fragment
+followed by the values for its ``%s`` placeholders, which are bound
+by :mod:`MySQLdb` instead of being formatted into the statement::
+
+    query('ap_slice', ['ap_slice_id'],
+          [('tenant_id = %s', tenant_id), 'status <> "DELETED"'])
+
+"""
 import traceback
 import sys
 import logging
 
-from aurora import config
+from aurora import db_pool
 LOGGER = logging.getLogger(__name__)
 
 def _database_connection():
-        return mdb.connect(config.CONFIG['mysql']['mysql_host'],
-                                   config.CONFIG['mysql']['mysql_username'],
-                                   config.CONFIG['mysql']['mysql_password'],
-                                   config.CONFIG['mysql']['mysql_db'])
+    """Returns a pooled cursor context for the configured database.
+
+    :rtype: :class:`aurora.db_pool.PooledCursor`
+
+    """
+    return db_pool.get_default_pool().cursor()
+
+def _split_criterion(criterion):
+    """Returns the SQL fragment and parameters of a criterion.
+
+    Percent signs in plain string criteria are escaped so they are
+    not mistaken for placeholders.
+
+    :param criterion: str or tuple (fragment, param, ...)
+    :rtype: tuple -- (str, list)
+
+    """
+    if isinstance(criterion, tuple):
+        return (criterion[0], list(criterion[1:]))
+    return (criterion.replace('%', '%%'), [])
+
+def _build_query(table_name, fields, criteria, appendix=''):
+    """Returns the statement and parameters for a query.
+
+    :rtype: tuple -- (str, list)
+
+    """
+    fragments = []
+    params = []
+    for criterion in criteria:
+        (fragment, criterion_params) = _split_criterion(criterion)
+        fragments.append(fragment)
+        params.extend(criterion_params)
 
-def _build_query(table_name, fields, criteria):
     if len(fields) == 0:
         to_execute = """SELECT * FROM (%s)""" % table_name
     else:
         to_execute = "SELECT " + ",".join(fields) + " FROM (%s)" % table_name
 
     #Now parse the criteria
-    if len(criteria) != 0:
+    if len(fragments) != 0:
         to_execute += " WHERE "
-        to_execute += ' AND '.join(criteria)
-    return to_execute 
-
-def join_criteria(criteria_list, joiner = 'AND'):
-    joiner = " %s " % joiner
-    output = joiner.join(criteria_list)
-    return  "(%s)" % output
+        to_execute += ' AND '.join(fragments)
+    if appendix:
+        to_execute += " " + appendix.replace('%', '%%')
+    return (to_execute, params)
 
 def join_table(table1, table2, field1, field2, type = "inner join"):
     type = " " + type.upper() + " "
@@ -40,29 +73,40 @@ def join_table(table1, table2, field1, field2, type = "inner join"):
     return out
 
 def join_criteria(criteria_list, criteria_joiner):
+    """Combines criteria into a single parenthesised criterion.
+
+    :param list criteria_list: Criteria as accepted by :func:`query`
+    :param str criteria_joiner: 'AND' or 'OR'
+    :rtype: tuple -- (fragment, param, ...)
+
+    """
     joiner = " %s " % criteria_joiner
-    return joiner.join(map(lambda x : "(%s)" % x, criteria_list))
+    fragments = []
+    params = []
+    for criterion in criteria_list:
+        (fragment, criterion_params) = _split_criterion(criterion)
+        fragments.append("(%s)" % fragment)
+        params.extend(criterion_params)
+    return tuple([joiner.join(fragments)] + params)
 
 def query(table_name, fields = [], criteria = [], appendix = ''):
     """Interface to query the mysql database.
 
         :param str table_name: name of the table to query
         :param list fields: selected fields of the table that will be queried. This is a list os strings
-        :param list criteria: criteria used for filtering (e.g. fields1 > 3). This is a list of strings
+        :param list criteria: criteria used for filtering (e.g. fields1 > 3). This is a list of strings,
+                              or of tuples of a fragment followed by its parameters
+                              (e.g. ('field1 > %s', 3))
+        :param str appendix: SQL appended after the criteria (e.g. ORDER BY field1)
 
         :rtype: tuple
     """
-    connection = _database_connection()
     try:
-        with connection:
-            cursor = connection.cursor()
-
-            to_execute = _build_query(table_name, fields, criteria)
-            if to_execute is None:
-                return None
-
-            print to_execute
-            cursor.execute(to_execute)
+        with _database_connection() as cursor:
+            (to_execute, params) = _build_query(table_name, fields,
+                                                criteria, appendix)
+            LOGGER.debug("%s %s", to_execute, params)
+            cursor.execute(to_execute, params)
             information = cursor.fetchall()
             return information
     except:
@@ -0,0 +1,295 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Tracking of the requests dispatched to access points which are
+waiting for a reply, see :class:`aurora.dispatcher.Dispatcher`.
+
+Requests are indexed by correlation ID and by access point, so
+finding the request of a reply, or every request of an access point
+which restarted, does not depend on how many requests are in flight.
+
+Each request carries a :class:`DispatchHandle` which is resolved once
+the request is answered, times out, is cancelled or fails to publish,
+so callers can wait on the requests they sent::
+
+    handles = dispatcher.dispatch_many(messages)
+    outcomes = wait_all(handles, timeout=60)
+
+"""
+import collections
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+#: An in-flight request.  The first three fields keep the layout of
+#: the ``(correlation_id, timer, ap_slice_id)`` tuples used before.
+Request = collections.namedtuple(
+    'Request',
+    ['correlation_id', 'timer', 'subject', 'ap', 'command', 'sent_at',
+     'handle']
+)
+
+#: Outcomes of a dispatched request
+REPLIED = 'replied'
+TIMED_OUT = 'timed_out'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+
+class DispatchHandle(object):
+    """The outcome of one dispatched message, which can be waited
+    on.  Only the first outcome given to :func:`resolve` is kept.
+
+    ``published`` holds the :class:`aurora.publisher.PublishFuture` of
+    the message once it is queued.
+
+    """
+    def __init__(self, correlation_id, ap, subject):
+        self.correlation_id = correlation_id
+        self.ap = ap
+        self.subject = subject
+        self.published = None
+        self.outcome = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return "<DispatchHandle %s %s>" % (self.correlation_id,
+                                           self.outcome or 'pending')
+
+    def done(self):
+        """Returns True once the outcome is known."""
+        return self._done.is_set()
+
+    def resolve(self, outcome, error=None):
+        """Sets the outcome, unless one is already set.
+
+        :param str outcome: One of :data:`REPLIED`, :data:`TIMED_OUT`,
+                            :data:`CANCELLED` or :data:`FAILED`
+        :param Exception error: Why the request failed
+        :returns: bool -- True if this call set the outcome
+
+        """
+        with self._lock:
+            if self.outcome is not None:
+                return False
+            self.outcome = outcome
+            self.error = error
+        self._done.set()
+        return True
+
+    def wait(self, timeout=None):
+        """Waits for the outcome.
+
+        :param float timeout: Seconds to wait, None waits forever
+        :returns: str -- The outcome, or None if the timeout expired
+
+        """
+        self._done.wait(timeout)
+        return self.outcome
+
+
+def wait_all(handles, timeout=None):
+    """Waits for the outcome of several handles, sharing one timeout.
+
+    :param list handles: :class:`DispatchHandle` objects
+    :param float timeout: Seconds to wait in total, None waits forever
+    :returns: list -- The outcome of each handle, None for those still
+              pending when the timeout expired
+
+    """
+    deadline = None
+    if timeout is not None:
+        deadline = time.time() + timeout
+    for handle in handles:
+        if deadline is None:
+            handle.wait()
+        elif not handle.wait(max(deadline - time.time(), 0)):
+            break
+    return [handle.outcome for handle in handles]
+
+
+class Broadcast(object):
+    """Requests sent to many access points with one message, which
+    share one deadline.  The :class:`Request` of each access point has
+    a :class:`BroadcastMember` in place of its timer.
+
+    """
+    def __init__(self, broadcast_id, aps):
+        self.broadcast_id = broadcast_id
+        self._lock = threading.Lock()
+        self._pending = set(aps)
+
+    def __repr__(self):
+        return "<Broadcast %s %s pending>" % (self.broadcast_id,
+                                              len(self._pending))
+
+    def member(self, ap):
+        """Returns the timer stand-in of an access point's request."""
+        return BroadcastMember(self, ap)
+
+    def answered(self, ap):
+        """Stops waiting for an access point."""
+        with self._lock:
+            self._pending.discard(ap)
+
+    def take_pending(self):
+        """Stops waiting, returning the access points which did not
+        answer.
+
+        :rtype: set
+
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = set()
+        return pending
+
+
+class BroadcastMember(object):
+    """Has the ``cancel()`` method of a timer, which marks the access
+    point as answered.
+
+    """
+    __slots__ = ('broadcast', 'ap')
+
+    def __init__(self, broadcast, ap):
+        self.broadcast = broadcast
+        self.ap = ap
+
+    def __repr__(self):
+        return "<BroadcastMember %s of %s>" % (self.ap,
+                                               self.broadcast.broadcast_id)
+
+    def cancel(self):
+        self.broadcast.answered(self.ap)
+
+
+class RequestRegistry(object):
+    """Thread-safe registry of in-flight requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = {}
+        # ap -> OrderedDict of correlation_id -> Request, oldest first
+        self._by_ap = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+    def __repr__(self):
+        with self._lock:
+            return "<RequestRegistry %s requests for %s APs>" % (
+                len(self._by_id), len(self._by_ap)
+            )
+
+    def add(self, correlation_id, timer, subject, ap, command,
+            handle=None):
+        """Registers a request which was just sent.
+
+        :param str correlation_id:
+        :param timer: Reply timeout, has a ``cancel()`` method
+        :param str subject: ap_slice_id the request is about, 'SYN'
+                            or 'admin'
+        :param str ap: Access point the request was sent to
+        :param str command: Command of the request
+        :param handle: :class:`DispatchHandle` of the request
+        :rtype: :class:`Request`
+
+        """
+        request = Request(correlation_id, timer, subject, ap, command,
+                          time.time(), handle)
+        with self._lock:
+            self._remove(correlation_id)
+            self._by_id[correlation_id] = request
+            self._by_ap.setdefault(
+                ap, collections.OrderedDict()
+            )[correlation_id] = request
+        return request
+
+    def _remove(self, correlation_id):
+        """Must be called with the lock held."""
+        request = self._by_id.pop(correlation_id, None)
+        if request is not None:
+            requests = self._by_ap[request.ap]
+            del requests[correlation_id]
+            if not requests:
+                del self._by_ap[request.ap]
+        return request
+
+    def get(self, correlation_id):
+        """Returns the request of a correlation ID, or None.
+
+        :rtype: :class:`Request`
+
+        """
+        return self._by_id.get(correlation_id)
+
+    def pop(self, correlation_id):
+        """Removes and returns the request of a correlation ID, or
+        None.
+
+        :rtype: :class:`Request`
+
+        """
+        with self._lock:
+            return self._remove(correlation_id)
+
+    def pop_ap(self, ap):
+        """Removes and returns every request sent to an access point.
+
+        :param str ap:
+        :returns: list -- :class:`Request` objects, oldest first
+
+        """
+        with self._lock:
+            requests = self._by_ap.pop(ap, {})
+            for correlation_id in requests:
+                del self._by_id[correlation_id]
+            return requests.values()
+
+    def pop_all(self):
+        """Removes and returns every request.
+
+        :returns: list -- :class:`Request` objects
+
+        """
+        with self._lock:
+            requests = self._by_id.values()
+            self._by_id.clear()
+            self._by_ap.clear()
+            return requests
+
+    def outstanding(self, ap=None):
+        """Describes the requests waiting for a reply, per access
+        point.
+
+        :param str ap: Only describe the requests of this access point
+        :returns: dict -- Access point names mapped to lists of dicts
+                  with the correlation ID, command, subject and age in
+                  seconds of each request, oldest first
+
+        """
+        now = time.time()
+        with self._lock:
+            if ap is not None:
+                aps = {ap: self._by_ap.get(ap, {})}
+            else:
+                aps = self._by_ap
+            outstanding = {}
+            for (ap_name, requests) in aps.iteritems():
+                outstanding[ap_name] = [
+                    {
+                        'correlation_id': request.correlation_id,
+                        'command': request.command,
+                        'subject': request.subject,
+                        'age': now - request.sent_at,
+                    } for request in requests.itervalues()
+                ]
+        return outstanding
@@ -33,7 +33,7 @@ class RequestVerification():
     
     @staticmethod
     def ap_name_exists(physical_ap):
-        ap_names = filter.query('ap', ['name'], ['name = "%s"' % physical_ap])
+        ap_names = filter.query('ap', ['name'], [('name = %s', physical_ap)])
         if len(ap_names) != 0:
             return True
         return False
@@ -76,8 +76,8 @@ class APSliceSSIDVerification(RequestVerification):
                         new_ssid = entry['attributes']['name']
 
                 result = filter.query('ap_slice', ['COUNT(ap_slice_ssid)'], ['status <> "DELETED"', \
-                                                                             'physical_ap = "%s"' % request['physical_ap'],\
-                                                                             'ap_slice_ssid = "%s"' % new_ssid])
+                                                                             ('physical_ap = %s', request['physical_ap']),\
+                                                                             ('ap_slice_ssid = %s', new_ssid)])
 
                 if result[0][0] != 0: #Meaning there is already a slice with "new_ssid" as ssid
                     return "Duplicated slice ssid " + str(new_ssid)
@@ -114,7 +114,7 @@ class APSliceNumberVerification(RequestVerification):
                 if not RequestVerification.ap_name_exists(request['physical_ap']):
                     raise exceptions.NoSuchAPExists(str(request['physical_ap']))
 
-                result = filter.query('ap', ['name', 'number_slice_free', 'number_radio'], ['name = "%s"' % request['physical_ap']])
+                result = filter.query('ap', ['name', 'number_slice_free', 'number_radio'], [('name = %s', request['physical_ap'])])
 
                 ap = result[0] #We only expect 1 result
                 if ap[slice_left] - _ADDITIONAL_SLICE[command] < 0:
@@ -167,7 +167,7 @@ class RadioConfigExistedVerification(RequestVerification):
                     return "Radio for the ap " + request['physical_ap'] + " has not been configured. An initial configuration is required."
                 else: #Check for pending slices. Reject slice creation if previous slice creation has not been completed
                     number_pending_slice = filter.query('ap_slice', ['COUNT(*)'], 
-                                                        ['status = "PENDING"', 'physical_ap = "%s"' % request['physical_ap']])
+                                                        ['status = "PENDING"', ('physical_ap = %s', request['physical_ap'])])
                     if number_pending_slice[0][0] > 0:
                         raise exceptions.RadioConfigLocked('Radio config is pending. Try again later...')
 
@@ -234,8 +234,8 @@ class AccessConflictVerification(RequestVerification):
                 physical_ap = request['physical_ap']                    
 
                 #Get all of his slices
-                slice_list = filter.query('ap_slice', ['ap_slice_id'], ['tenant_id = "%s"' % tenant_id, \
-                                                                        'physical_ap = "%s"' % physical_ap, \
+                slice_list = filter.query('ap_slice', ['ap_slice_id'], [('tenant_id = %s', tenant_id), \
+                                                                        ('physical_ap = %s', physical_ap), \
                                                                         'status <> "DELETED"'])
                 
                 #Get the client's slices
@@ -339,8 +339,8 @@ class ValidDeleteVerification(RequestVerification):
                 return None
             else:
                 #Check for validity of deletion
-                result = filter.query('ap_slice', ['physical_ap'], ['tenant_id = "%s"' % request['tenant_id'], \
-                                                                    'ap_slice_id = "%s"' % request['slice'], \
+                result = filter.query('ap_slice', ['physical_ap'], [('tenant_id = %s', request['tenant_id']), \
+                                                                    ('ap_slice_id = %s', request['slice']), \
                                                                     'status <> "DELETED"'])
 
                 if len(result) == 0:
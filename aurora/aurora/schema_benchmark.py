@@ -0,0 +1,202 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Shows MySQL query plans and timings for the queries Aurora runs
+most, before and after the schema migrations which add indexes.
+
+Typical use is against a scratch database filled with synthetic
+data, since the configured database is never populated::
+
+    python schema_benchmark.py --database aurora_bench --populate 500 \\
+        --upgrade
+
+``--populate N`` recreates the scratch database at the schema version
+preceding the lookup indexes and adds N access points with 16 slices
+each.  ``--upgrade`` applies the pending migrations after the first
+report and reports again.
+
+"""
+import argparse
+import logging
+import time
+import uuid
+
+import MySQLdb as mdb
+
+import config
+from aurora import migrations
+
+LOGGER = logging.getLogger(__name__)
+
+#: Schema version before secondary indexes were introduced
+UNINDEXED_VERSION = 2
+
+SLICES_PER_AP = 16
+
+#: (label, statement) pairs, statements take the sample values
+QUERIES = [
+    ("Slices on an AP",
+     """SELECT ap_slice_id FROM ap_slice
+            WHERE physical_ap=%(physical_ap)s AND
+                status<>'DELETED' AND status<>'DELETING'"""),
+    ("Tenant slice listing",
+     """SELECT ap_slice_id, ap_slice_ssid, status FROM ap_slice
+            WHERE tenant_id=%(tenant_id)s AND status<>'DELETED'"""),
+    ("Slices in a wnet",
+     """SELECT ap_slice.ap_slice_id FROM ap_slice
+            INNER JOIN metering ON ap_slice.ap_slice_id=metering.ap_slice_id
+            WHERE wnet_id=%(wnet_id)s"""),
+    ("Duplicate SSID check",
+     """SELECT COUNT(ap_slice_ssid) FROM ap_slice
+            WHERE status<>'DELETED' AND physical_ap=%(physical_ap)s AND
+                ap_slice_ssid=%(ap_slice_ssid)s"""),
+    ("Location tags of an AP",
+     """SELECT name FROM location_tags WHERE ap_name=%(physical_ap)s"""),
+    ("Tenant tags of a slice",
+     """SELECT name FROM tenant_tags WHERE ap_slice_id=%(ap_slice_id)s"""),
+    ("AP down time stats",
+     """SELECT ap_slice_id FROM metering
+            WHERE ap_slice_id IN
+                (SELECT ap_slice_id FROM ap_slice
+                     WHERE physical_ap=%(physical_ap)s AND
+                         status<>'DELETED' AND status<>'DELETING')"""),
+    ("Wnets of a tenant",
+     """SELECT wnet_id, name FROM wnet WHERE tenant_id=%(tenant_id)s"""),
+]
+
+
+def connect(database=None):
+    """Connects with the credentials of the manager configuration."""
+    mysql_config = config.CONFIG['mysql']
+    kwargs = {
+        'host': mysql_config['mysql_host'],
+        'user': mysql_config['mysql_username'],
+        'passwd': mysql_config['mysql_password'],
+    }
+    if database is not None:
+        kwargs['db'] = database
+    return mdb.connect(**kwargs)
+
+
+def populate(con, database, num_aps):
+    """Recreates ``database`` without lookup indexes and fills it
+    with synthetic access points, slices, wnets and tags.
+
+    """
+    with con:
+        cur = con.cursor()
+        cur.execute("DROP DATABASE IF EXISTS %s" % database)
+        cur.execute("CREATE DATABASE %s" % database)
+        migrations.upgrade(cur, database, target=UNINDEXED_VERSION)
+
+        statuses = ['ACTIVE', 'ACTIVE', 'DELETED', 'DOWN', 'PENDING']
+        for ap_index in range(num_aps):
+            ap_name = "bench-ap-%s" % ap_index
+            cur.execute("""INSERT INTO ap SET name=%s, region=%s,
+                               number_radio=2, number_slice_free=8,
+                               status='UP'""",
+                        (ap_name, "region-%s" % (ap_index % 10)))
+            cur.execute("INSERT INTO location_tags VALUES (%s, %s)",
+                        ("region-%s" % (ap_index % 10), ap_name))
+            slices = []
+            tags = []
+            for slice_index in range(SLICES_PER_AP):
+                ap_slice_id = str(uuid.uuid4())
+                tenant_id = "tenant-%s" % ((ap_index + slice_index) % 50)
+                slices.append((ap_slice_id, "ssid-%s" % slice_index,
+                               tenant_id, ap_name, tenant_id,
+                               "wnet-%s" % (ap_index % 100),
+                               statuses[slice_index % len(statuses)]))
+                tags.append(("tag-%s" % (slice_index % 4), ap_slice_id))
+            cur.executemany("""INSERT INTO ap_slice VALUES
+                                   (%s, %s, %s, %s, %s, %s, %s)""", slices)
+            cur.executemany("INSERT INTO metering SET ap_slice_id=%s",
+                            [(entry[0],) for entry in slices])
+            cur.executemany("INSERT INTO tenant_tags VALUES (%s, %s)", tags)
+        for wnet_index in range(100):
+            cur.execute("INSERT INTO wnet VALUES (%s, %s, %s, %s)",
+                        ("wnet-%s" % wnet_index, "wnet-name-%s" % wnet_index,
+                         "tenant-%s" % (wnet_index % 50), "project"))
+
+
+def sample_values(cur):
+    """Picks existing values for the query placeholders."""
+    cur.execute("""SELECT ap_slice_id, ap_slice_ssid, tenant_id,
+                          physical_ap, wnet_id
+                       FROM ap_slice LIMIT 1""")
+    row = cur.fetchone()
+    if row is None:
+        row = ('', '', '', '', '')
+    return {
+        'ap_slice_id': row[0],
+        'ap_slice_ssid': row[1],
+        'tenant_id': row[2],
+        'physical_ap': row[3],
+        'wnet_id': row[4],
+    }
+
+
+def report(cur, runs):
+    """Prints the plan and best time of every benchmark query."""
+    values = sample_values(cur)
+    print "Schema version %s" % migrations.current_version(cur)
+    for (label, statement) in QUERIES:
+        cur.execute("EXPLAIN " + statement, values)
+        columns = [column[0] for column in cur.description]
+        plans = [dict(zip(columns, row)) for row in cur.fetchall()]
+
+        best = None
+        for _ in range(runs):
+            start = time.time()
+            cur.execute(statement, values)
+            cur.fetchall()
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+
+        print "\n%s: %.3f ms" % (label, best * 1000)
+        for plan in plans:
+            print "    %-14s type=%-7s key=%-28s rows=%-8s %s" % (
+                plan.get('table'), plan.get('type'), plan.get('key'),
+                plan.get('rows'), plan.get('Extra') or '')
+
+
+def main():
+    """Interface for running the schema benchmark."""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--database',
+                        default=config.CONFIG['mysql']['mysql_db'])
+    parser.add_argument('--populate', type=int, metavar='N',
+                        help="Recreate the database with N synthetic APs")
+    parser.add_argument('--upgrade', action='store_true',
+                        help="Apply pending migrations and report again")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    if (args.populate is not None and
+            args.database == config.CONFIG['mysql']['mysql_db']):
+        parser.error("--populate drops the database, use a scratch "
+                     "--database instead of the configured one")
+
+    con = connect()
+    try:
+        if args.populate is not None:
+            populate(con, args.database, args.populate)
+        with con:
+            cur = con.cursor()
+            cur.execute("USE %s" % args.database)
+            report(cur, args.runs)
+            if args.upgrade:
+                migrations.upgrade(cur, args.database)
+                cur.execute("ANALYZE TABLE ap_slice, location_tags, "
+                            "tenant_tags, wnet")
+                cur.fetchall()
+                print "\n--- after upgrade ---"
+                report(cur, args.runs)
+    finally:
+        con.close()
+
+if __name__ == '__main__':
+    main()
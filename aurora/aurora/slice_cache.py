@@ -0,0 +1,177 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""In-memory cache of the ``ap_slice`` columns used for ownership and
+placement checks, see :class:`aurora.aurora_db.AuroraDB`.
+
+Entries expire after a fixed time and the least recently used entry
+is dropped once the cache is full.  :class:`AuroraDB
+<aurora.aurora_db.AuroraDB>` invalidates entries whenever it writes
+to a slice, the expiry bounds how long changes made by other
+processes can go unnoticed.
+
+A lookup which misses reads the database and then caches the row.  It
+passes the :attr:`SliceCache.generation` it saw before reading to
+:func:`SliceCache.put`, which drops the row if anything was
+invalidated in the meantime, since the row may predate that write::
+
+    generation = cache.generation
+    record = read_slice(ap_slice_id)
+    cache.put(ap_slice_id, record, generation)
+
+"""
+import collections
+import logging
+import threading
+import time
+
+from aurora.cls_logger import get_cls_logger
+
+LOGGER = logging.getLogger(__name__)
+
+#: Columns of ap_slice kept for each cached slice
+SLICE_FIELDS = ('tenant_id', 'project_id', 'physical_ap',
+                'ap_slice_ssid', 'status')
+
+
+class SliceCache(object):
+    """A bounded, thread-safe LRU cache with expiry, keyed by
+    ``ap_slice_id``.
+
+    """
+    def __init__(self, max_size=4096, ttl=30):
+        """
+        :param int max_size: Maximum number of cached slices
+        :param float ttl: Seconds an entry stays valid
+
+        """
+        self.LOGGER = get_cls_logger(self)
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        # ap_slice_id -> (expiry, record), least recently used first
+        self._entries = collections.OrderedDict()
+        # physical_ap -> set of cached ap_slice_ids
+        self._by_ap = {}
+        # Bumped by every invalidation
+        self._generation = 0
+
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evicted': 0,
+            'invalidated': 0,
+            'stale_puts': 0,
+        }
+
+    @property
+    def generation(self):
+        """Number of invalidations so far, see :func:`put`."""
+        with self._lock:
+            return self._generation
+
+    def _unindex(self, ap_slice_id, record):
+        slices = self._by_ap.get(record['physical_ap'])
+        if slices is not None:
+            slices.discard(ap_slice_id)
+            if not slices:
+                del self._by_ap[record['physical_ap']]
+
+    def _remove(self, ap_slice_id):
+        """Drops an entry.  Must be called with the lock held."""
+        entry = self._entries.pop(ap_slice_id, None)
+        if entry is not None:
+            self._unindex(ap_slice_id, entry[1])
+        return entry
+
+    def get(self, ap_slice_id):
+        """Returns a copy of the cached record for a slice, or None
+        if it is not cached or has expired.
+
+        :param str ap_slice_id:
+        :rtype: dict
+
+        """
+        with self._lock:
+            entry = self._entries.get(ap_slice_id)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            if entry[0] < time.time():
+                self._remove(ap_slice_id)
+                self._counters['expired'] += 1
+                self._counters['misses'] += 1
+                return None
+            # Mark as most recently used
+            del self._entries[ap_slice_id]
+            self._entries[ap_slice_id] = entry
+            self._counters['hits'] += 1
+            return dict(entry[1])
+
+    def put(self, ap_slice_id, record, generation=None):
+        """Caches the record of a slice.
+
+        :param str ap_slice_id:
+        :param dict record: Values for :data:`SLICE_FIELDS`
+        :param int generation: :attr:`generation` read before the
+                               record, which is not cached if an
+                               invalidation happened since
+
+        """
+        record = dict((field, record.get(field)) for field in SLICE_FIELDS)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._counters['stale_puts'] += 1
+                return
+            self._remove(ap_slice_id)
+            while len(self._entries) >= self.max_size:
+                (oldest_id, oldest) = self._entries.popitem(last=False)
+                self._unindex(oldest_id, oldest[1])
+                self._counters['evicted'] += 1
+            self._entries[ap_slice_id] = (time.time() + self.ttl, record)
+            self._by_ap.setdefault(record['physical_ap'],
+                                   set()).add(ap_slice_id)
+
+    def invalidate(self, *ap_slice_ids):
+        """Drops the given slices from the cache."""
+        with self._lock:
+            self._generation += 1
+            for ap_slice_id in ap_slice_ids:
+                if self._remove(ap_slice_id) is not None:
+                    self._counters['invalidated'] += 1
+
+    def invalidate_ap(self, physical_ap):
+        """Drops every cached slice located on an access point."""
+        with self._lock:
+            self._generation += 1
+            for ap_slice_id in list(self._by_ap.get(physical_ap, ())):
+                self._remove(ap_slice_id)
+                self._counters['invalidated'] += 1
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._generation += 1
+            self._counters['invalidated'] += len(self._entries)
+            self._entries.clear()
+            self._by_ap.clear()
+
+    def stats(self):
+        """Returns a snapshot of the cache counters.
+
+        :rtype: dict
+
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['size'] = len(self._entries)
+            stats['max_size'] = self.max_size
+        lookups = stats['hits'] + stats['misses']
+        if lookups:
+            stats['hit_ratio'] = float(stats['hits']) / lookups
+        else:
+            stats['hit_ratio'] = 0.0
+        return stats
@@ -2,7 +2,13 @@
 # SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
 #              Mike Kobierski and Hoai Phuoc Truong
 #
-"""A Quick Script for creating the Aurora database tables/schema."""
+"""A Quick Script for creating the Aurora database tables/schema.
+
+By default the database is created if missing and its tables are
+brought up to date with :mod:`aurora.migrations`, keeping existing
+data.  Run with ``--drop`` to delete the database first.
+
+"""
 import logging
 import sys
 import traceback
@@ -10,20 +16,23 @@ import config
 
 import MySQLdb as mdb
 
+from aurora import migrations
+
 LOGGER = logging.getLogger(__name__)
 
 class SQLDBCreate(object):
-    """Class responsible for setting up SQL connection, database, and 
+    """Class responsible for setting up SQL connection, database, and
     tables.
 
     """
     def __init__(self):
         """Step 0: Connecto to mySQL.  Uses :mod:`MySQLdb` :mod:`mysqldb`"""
+        self.database = config.CONFIG['mysql']['mysql_db']
         #Connect to Aurora mySQL database
         try:
-            self.con = mdb.connect(host=config.CONFIG['mysql']['mysql_host'], 
-                                   user=config.CONFIG['mysql']['user_name'], 
-                                   passwd=config.CONFIG['mysql']['password']) #Change address
+            self.con = mdb.connect(host=config.CONFIG['mysql']['mysql_host'],
+                                   user=config.CONFIG['mysql']['mysql_username'],
+                                   passwd=config.CONFIG['mysql']['mysql_password'])
 
         except mdb.Error, e:
 
@@ -37,102 +46,35 @@ class SQLDBCreate(object):
         else:
             print('Connection already closed!')
 
+    def drop_database(self):
+        """Deletes the database and all of its data."""
+        try:
+            with self.con:
+                cur = self.con.cursor()
+                LOGGER.warn("Dropping database %s", self.database)
+                cur.execute("DROP DATABASE IF EXISTS %s" % self.database)
+
+        except mdb.Error, e:
+            print "Error %d: %s" % (e.args[0], e.args[1])
+
     def create_database(self):
-        """Step 1: Create the database."""
+        """Step 1: Create the database if it does not exist."""
         try:
             with self.con:
                 cur = self.con.cursor()
-                LOGGER.warn("Creating database")
-                cur.execute("DROP DATABASE IF EXISTS aurora")
-                cur.execute("CREATE DATABASE aurora")
+                LOGGER.warn("Creating database %s", self.database)
+                cur.execute("CREATE DATABASE IF NOT EXISTS %s" %
+                            self.database)
 
         except mdb.Error, e:
             print "Error %d: %s" % (e.args[0], e.args[1])
 
     def create_tables(self):
-        """Step 2: Create the tables."""
+        """Step 2: Create the tables or upgrade existing ones."""
         try:
             with self.con:
                 cur = self.con.cursor()
-                #Switch to aurora database
-                cur.execute("USE aurora")
-
-                #Create ap table
-                LOGGER.warn("Creating table ap")
-                ap = """CREATE TABLE ap 
-(
-    name VARCHAR(255) NOT NULL PRIMARY KEY, 
-    region VARCHAR(255), 
-    firmware VARCHAR(255), 
-    version VARCHAR(255), 
-    number_radio INT(11), 
-    memory_mb INT(11), 
-    free_disk INT(11), 
-    supported_protocol VARCHAR(255) DEFAULT 'a/b/g', 
-    number_radio_free INT(11), 
-    number_slice_free INT(11), 
-    status ENUM('UP','DOWN','UNKNOWN')
-)"""
-                cur.execute(ap)
-
-                #Create ap_slice table
-                LOGGER.warn("Creating table ap_slice")
-                ap_slice = """CREATE TABLE ap_slice 
-(
-    ap_slice_id VARCHAR(40) NOT NULL PRIMARY KEY, 
-    ap_slice_ssid VARCHAR(255), 
-    tenant_id VARCHAR(255),
-    physical_ap VARCHAR(255), 
-    project_id VARCHAR(255), 
-    wnet_id VARCHAR(40), 
-    status ENUM('PENDING','ACTIVE','FAILED','DOWN','DELETING','DELETED')
-)"""
-                cur.execute(ap_slice)
-
-                #Create metering table
-                LOGGER.warn("Creating table metering")
-                metering = """CREATE TABLE metering 
-(
-    ap_slice_id VARCHAR(40) NOT NULL PRIMARY KEY, 
-    current_mb_sent FLOAT DEFAULT 0.0, 
-    total_mb_sent FLOAT DEFAULT 0.0, 
-    current_active_duration TIME DEFAULT '00:00:00', 
-    total_active_duration TIME DEFAULT '00:00:00', 
-    last_time_activated DATETIME, 
-    last_time_updated DATETIME
-)"""
-                cur.execute(metering)
-
-                #Create wnet table
-                LOGGER.warn("Creating table wnet")
-                wnet = """CREATE TABLE wnet 
-(
-    wnet_id VARCHAR(40) NOT NULL PRIMARY KEY, 
-    name VARCHAR(255) UNIQUE, 
-    tenant_id VARCHAR(255), 
-    project_id VARCHAR(40)
-)"""
-                cur.execute(wnet)
-
-                #Create location_tags table
-                LOGGER.warn("Creating table location_tags")
-                location_tags = """CREATE TABLE location_tags 
-(
-    name VARCHAR(255), 
-    ap_name VARCHAR(255), 
-    PRIMARY KEY(name, ap_name)
-)"""
-                cur.execute(location_tags)
-
-                #Create tenant_tags table
-                LOGGER.warn("Creating table tenant_tags")
-                tenant_tags = """CREATE TABLE tenant_tags 
-(
-    name VARCHAR(255), 
-    ap_slice_id VARCHAR(40), 
-    PRIMARY KEY(name, ap_slice_id)
-)"""
-                cur.execute(tenant_tags)
+                migrations.upgrade(cur, self.database)
 
         except mdb.Error, e:
             traceback.print_exc(file=sys.stdout)
@@ -141,9 +83,11 @@ def main():
     """Interface for setting up the aurora database and tables."""
     logging.basicConfig()
     newDB = SQLDBCreate()
+    if '--drop' in sys.argv[1:]:
+        newDB.drop_database()
     newDB.create_database()
     newDB.create_tables()
     newDB.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,298 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Write-behind buffer for the status updates of
+:class:`aurora.ap_monitor.APMonitor`.
+
+Updates are queued per access point as an ordered list of segments,
+each a ``[kind, payload]`` pair.  A new update is merged into the last
+segment of its access point when that does not change the outcome:
+
+* ``'stats'`` -- payload maps slice IDs to the MB they have sent.
+  Counters are cumulative, so the latest report of a slice replaces
+  earlier ones.
+* ``'result'`` -- payload is a list of ``(ap_slice_id, success)``
+  command results, which are appended in order.
+* ``'up'`` -- payload is the list of slices known to run on the
+  access point, which announced itself or answered a 'SYN'.
+* ``'down'``, ``'up'`` and ``'reset'`` -- applying them twice is the
+  same as applying them once, so a repeat of the last segment is
+  dropped.
+
+A single thread flushes the buffer after a short interval, or sooner
+once enough updates are pending, handing each access point's segments
+to one of several workers, see :mod:`aurora.worker_pool`, which pass
+them in order to a callback.  An access point always goes to the same
+worker, so it is never updated concurrently and sees its updates in
+the order they were made, while different access points are updated
+in parallel.
+
+Worker queues are bounded.  When they are full the flusher waits,
+updates keep being coalesced in the meantime, and the waits are
+counted in :func:`StatusCoalescer.stats`.  Stopping applies every
+pending update first, and an update submitted once the coalescer is
+stopped is applied before :func:`StatusCoalescer.submit` returns.
+
+The number of workers and the size of their queues are read from the
+optional ``status`` section of the configuration file::
+
+    "status": {
+        "workers": 4,
+        "queue_size": 100
+    }
+
+"""
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from aurora import config
+from aurora.cls_logger import get_cls_logger
+from aurora.stop_thread import *
+from aurora.worker_pool import ShardedWorkerPool
+
+LOGGER = logging.getLogger(__name__)
+
+#: Segment kinds whose payloads are merged with dict.update
+LATEST_KINDS = ('stats',)
+#: Segment kinds whose payloads are lists extended in order
+APPEND_KINDS = ('result',)
+
+
+def status_settings():
+    """Reads the optional ``status`` section of the configuration
+    file.
+
+    :returns: dict -- Keyword arguments for
+              :class:`aurora.ap_monitor.APMonitor`
+
+    """
+    status_config = config.CONFIG.get('status', {})
+    return {
+        'status_workers': status_config.get('workers', 4),
+        'status_queue_size': status_config.get('queue_size', 100),
+    }
+
+
+class StatusCoalescer(object):
+    """Coalesces status updates per access point and applies them in
+    batches from a background thread.
+
+    """
+    def __init__(self, apply_segments, flush_interval=0.5, flush_size=200,
+                 workers=1, queue_size=100):
+        """
+        :param apply_segments: Callable taking an access point name and
+                               the list of its pending segments,
+                               returning how many could not be
+                               applied, or None
+        :param float flush_interval: Seconds between flushes
+        :param int flush_size: Number of pending updates which triggers
+                               an early flush
+        :param int workers: Threads calling ``apply_segments``
+        :param int queue_size: Most access points waiting per worker
+
+        """
+        self.LOGGER = get_cls_logger(self)
+        self.apply_segments = apply_segments
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+
+        self._lock = threading.Lock()
+        # Serializes flushes so access points stay in order
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = collections.OrderedDict()
+        self._pending_updates = 0
+        self._pending_segments = 0
+        self._stopped = False
+
+        self._counters = {
+            'submitted': 0,
+            'coalesced': 0,
+            'applied_after_stop': 0,
+            'applied_segments': 0,
+            'failed_segments': 0,
+            'flushes': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_max': 0.0,
+            'flush_seconds_last': 0.0,
+            'apply_seconds_total': 0.0,
+            'apply_seconds_max': 0.0,
+        }
+        self.worker = None
+        self.workers = ShardedWorkerPool(workers, queue_size=queue_size)
+
+    def start(self):
+        """Starts the flusher and worker threads."""
+        self.workers.start()
+        self.worker = StoppableThread(target=self._run)
+        self.worker.start()
+
+    def stop(self):
+        """Stops the flusher thread after a last flush, and the
+        workers once they applied everything flushed.
+
+        """
+        with self._lock:
+            # Updates queued before this are caught by the last flush
+            self._stopped = True
+        if self.worker is not None:
+            self.worker.stop()
+            self._wakeup.set()
+            if self.worker is not threading.current_thread():
+                self.worker.join()
+        self.workers.stop()
+
+    def _run(self, stop_event=None):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # Checked first, so the last flush starts after stop() and
+            # catches updates made while a flush waited on the workers
+            stopping = stop_event.is_set()
+            self.flush()
+            if stopping:
+                self.LOGGER.info("Status coalescer caught stop event")
+                break
+
+    def submit(self, ap_name, kind, payload):
+        """Queues an update for an access point, or applies it straight
+        away once the coalescer is stopped.
+
+        :param str ap_name:
+        :param str kind: Segment kind, see module documentation
+        :param payload:
+
+        """
+        with self._lock:
+            self._counters['submitted'] += 1
+            stopped = self._stopped
+            if stopped:
+                self._counters['applied_after_stop'] += 1
+            else:
+                self._queue(ap_name, kind, payload)
+        if stopped:
+            self.LOGGER.warn("Applying %s update for %s after stop",
+                             kind, ap_name)
+            with self._flush_lock:
+                self._hand_over(ap_name, [[kind, payload]])
+
+    def _queue(self, ap_name, kind, payload):
+        """Merges an update into the pending segments of its access
+        point.  Must be called with the lock held.
+
+        """
+        self._pending_updates += 1
+        segments = self._pending.setdefault(ap_name, [])
+        last = segments[-1] if segments else None
+        if last is not None and last[0] == kind:
+            if kind in LATEST_KINDS:
+                last[1].update(payload)
+                self._counters['coalesced'] += 1
+                return self._check_size()
+            if kind in APPEND_KINDS:
+                last[1].extend(payload)
+                return self._check_size()
+            if last[1] == payload:
+                self._counters['coalesced'] += 1
+                return self._check_size()
+        if kind in LATEST_KINDS:
+            payload = dict(payload)
+        elif kind in APPEND_KINDS:
+            payload = list(payload)
+        segments.append([kind, payload])
+        self._pending_segments += 1
+        self._check_size()
+
+    def _check_size(self):
+        """Wakes the flusher early.  Must be called with the lock held."""
+        if self._pending_updates >= self.flush_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Hands every pending segment to the worker of its access
+        point, waiting while that worker's queue is full.
+
+        :returns: int -- Number of segments handed over
+
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = collections.OrderedDict()
+                self._pending_updates = 0
+                self._pending_segments = 0
+            if not pending:
+                return 0
+
+            start = time.time()
+            flushed = 0
+            for (ap_name, segments) in pending.iteritems():
+                if self._hand_over(ap_name, segments):
+                    flushed += len(segments)
+            elapsed = time.time() - start
+
+            with self._lock:
+                self._counters['flushes'] += 1
+                self._counters['flush_seconds_total'] += elapsed
+                self._counters['flush_seconds_last'] = elapsed
+                if elapsed > self._counters['flush_seconds_max']:
+                    self._counters['flush_seconds_max'] = elapsed
+            self.LOGGER.debug("Flushed %s segments for %s APs in %.3fs",
+                              flushed, len(pending), elapsed)
+            return flushed
+
+    def _hand_over(self, ap_name, segments):
+        """Queues segments on the worker of their access point.  Once
+        the workers are stopping, they are applied by the caller after
+        the workers are done, so they still follow the earlier segments
+        of the access point.  Must be called with the flush lock held.
+
+        :returns: bool -- False if the segments were applied here
+
+        """
+        if self.workers.submit(ap_name, self._apply,
+                               args=(ap_name, segments)):
+            return True
+        self.workers.join()
+        self._apply(ap_name, segments)
+        return False
+
+    def _apply(self, ap_name, segments):
+        """Applies the segments of an access point, on its worker."""
+        start = time.time()
+        try:
+            failed = self.apply_segments(ap_name, segments) or 0
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+            with self._lock:
+                self._counters['failed_segments'] += len(segments)
+            return
+        elapsed = time.time() - start
+        with self._lock:
+            self._counters['applied_segments'] += len(segments) - failed
+            self._counters['failed_segments'] += failed
+            self._counters['apply_seconds_total'] += elapsed
+            if elapsed > self._counters['apply_seconds_max']:
+                self._counters['apply_seconds_max'] = elapsed
+
+    def stats(self):
+        """Returns a snapshot of the queue depth and flush counters,
+        and under ``workers`` those of the workers, see
+        :func:`aurora.worker_pool.ShardedWorkerPool.stats`.
+
+        :rtype: dict
+
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending_updates'] = self._pending_updates
+            stats['pending_segments'] = self._pending_segments
+            stats['pending_aps'] = len(self._pending)
+        stats['workers'] = self.workers.stats()
+        return stats
@@ -0,0 +1,268 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""A single thread running the reply timeouts of dispatched messages,
+see :class:`aurora.dispatcher.Dispatcher`.
+
+Pending timeouts are kept in a heap ordered by deadline, and indexed
+by key and by group (the access point) so they can be cancelled one at
+a time or a whole access point at once.  Cancelling only drops the
+index entries, the heap entry is skipped when it comes due::
+
+    timeouts = TimeoutScheduler()
+    timeouts.start()
+    timeouts.schedule('ap1-1234', 45, on_timeout, args=('ap1',),
+                      group='ap1')
+    timeouts.cancel('ap1-1234')
+    timeouts.stop()
+
+Callbacks run on the scheduler thread and should return quickly.
+
+"""
+import heapq
+import itertools
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from aurora.cls_logger import get_cls_logger
+from aurora.stop_thread import *
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Timeout(object):
+    """A pending timeout, returned by :func:`TimeoutScheduler.schedule`.
+    Has the ``cancel()`` method of :class:`threading.Timer`.
+
+    """
+    __slots__ = ('scheduler', 'key', 'group', 'deadline', 'callback',
+                 'args', 'cancelled')
+
+    def __init__(self, scheduler, key, group, deadline, callback, args):
+        self.scheduler = scheduler
+        self.key = key
+        self.group = group
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __repr__(self):
+        return "<Timeout %s in %.1fs>" % (self.key,
+                                          self.deadline - time.time())
+
+    def cancel(self):
+        """Stops the timeout from firing, if it has not yet."""
+        self.scheduler._cancel(self)
+
+
+class TimeoutScheduler(object):
+    """Runs callbacks after a delay from one background thread."""
+
+    #: Rebuild the heap when more than this share of it is cancelled
+    COMPACT_RATIO = 0.5
+
+    def __init__(self):
+        self.LOGGER = get_cls_logger(self)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # (deadline, sequence, Timeout), sequence breaks ties
+        self._heap = []
+        self._sequence = itertools.count()
+        self._by_key = {}
+        # group -> {key: Timeout}
+        self._by_group = {}
+        self._cancelled_in_heap = 0
+
+        self._counters = {
+            'scheduled': 0,
+            'cancelled': 0,
+            'fired': 0,
+        }
+        self.worker = None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._by_key
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_key)
+
+    def start(self):
+        """Starts the scheduler thread."""
+        self.worker = StoppableThread(target=self._run)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def stop(self):
+        """Stops the scheduler thread.  Pending timeouts do not fire."""
+        if self.worker is not None:
+            self.worker.stop()
+            with self._lock:
+                self._wakeup.notify()
+
+    def schedule(self, key, delay, callback, args=(), group=None):
+        """Calls ``callback(*args)`` after ``delay`` seconds unless
+        cancelled.  A pending timeout with the same key is replaced.
+
+        :param str key: Identifies the timeout, eg. a correlation ID
+        :param float delay: Seconds to wait
+        :param callable callback:
+        :param tuple args:
+        :param str group: Timeouts sharing a group can be cancelled
+                          together, see :func:`cancel_group`
+        :rtype: :class:`Timeout`
+
+        """
+        return self.schedule_many([(key, delay, callback, args, group)])[0]
+
+    def schedule_many(self, entries):
+        """Schedules several timeouts at once, see :func:`schedule`.
+
+        :param list entries: ``(key, delay, callback, args, group)``
+                             tuples
+        :returns: list -- :class:`Timeout` objects, in order
+
+        """
+        now = time.time()
+        timeouts = []
+        with self._lock:
+            earliest = self._heap[0][0] if self._heap else None
+            for (key, delay, callback, args, group) in entries:
+                previous = self._by_key.get(key)
+                if previous is not None:
+                    self._drop(previous)
+                deadline = now + delay
+                timeout = Timeout(self, key, group, deadline, callback, args)
+                self._by_key[key] = timeout
+                self._by_group.setdefault(group, {})[key] = timeout
+                heapq.heappush(self._heap,
+                               (deadline, next(self._sequence), timeout))
+                timeouts.append(timeout)
+            self._counters['scheduled'] += len(timeouts)
+            # Only an earlier deadline changes how long to sleep
+            if self._heap and (earliest is None or
+                               self._heap[0][0] < earliest):
+                self._wakeup.notify()
+        return timeouts
+
+    def _unindex(self, timeout):
+        """Removes a timeout from the key and group indexes.  Must be
+        called with the lock held.
+
+        """
+        del self._by_key[timeout.key]
+        group = self._by_group[timeout.group]
+        del group[timeout.key]
+        if not group:
+            del self._by_group[timeout.group]
+
+    def _drop(self, timeout):
+        """Cancels a pending timeout, leaving its heap entry to be
+        skipped.  Must be called with the lock held.
+
+        """
+        timeout.cancelled = True
+        self._unindex(timeout)
+        self._cancelled_in_heap += 1
+        self._counters['cancelled'] += 1
+        if self._cancelled_in_heap > len(self._heap) * self.COMPACT_RATIO:
+            self._heap = [entry for entry in self._heap
+                          if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled_in_heap = 0
+
+    def _cancel(self, timeout):
+        with self._lock:
+            if self._by_key.get(timeout.key) is timeout:
+                self._drop(timeout)
+
+    def cancel(self, key):
+        """Cancels the timeout of a key.
+
+        :param str key:
+        :returns: :class:`Timeout` -- The cancelled timeout, or None
+                  if there was none pending
+
+        """
+        with self._lock:
+            timeout = self._by_key.get(key)
+            if timeout is not None:
+                self._drop(timeout)
+            return timeout
+
+    def cancel_group(self, group):
+        """Cancels every timeout of a group.
+
+        :param str group:
+        :returns: list -- Keys of the cancelled timeouts
+
+        """
+        with self._lock:
+            timeouts = self._by_group.get(group, {}).values()
+            for timeout in timeouts:
+                self._drop(timeout)
+            return [timeout.key for timeout in timeouts]
+
+    def cancel_all(self):
+        """Cancels every pending timeout."""
+        with self._lock:
+            self._counters['cancelled'] += len(self._by_key)
+            self._by_key.clear()
+            self._by_group.clear()
+            for entry in self._heap:
+                entry[2].cancelled = True
+            self._heap = []
+            self._cancelled_in_heap = 0
+
+    def _run(self, stop_event=None):
+        while not stop_event.is_set():
+            with self._lock:
+                due = self._pop_due()
+                if not due:
+                    if self._heap:
+                        self._wakeup.wait(self._heap[0][0] - time.time())
+                    else:
+                        self._wakeup.wait()
+                    continue
+            for timeout in due:
+                try:
+                    timeout.callback(*timeout.args)
+                except Exception:
+                    traceback.print_exc(file=sys.stdout)
+        self.LOGGER.info("Timeout scheduler caught stop event")
+
+    def _pop_due(self):
+        """Removes and returns the timeouts whose deadline has passed.
+        Must be called with the lock held.
+
+        """
+        due = []
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            timeout = heapq.heappop(self._heap)[2]
+            if timeout.cancelled:
+                self._cancelled_in_heap -= 1
+                continue
+            self._unindex(timeout)
+            self._counters['fired'] += 1
+            due.append(timeout)
+        return due
+
+    def stats(self):
+        """Returns a snapshot of the scheduler counters.
+
+        :rtype: dict
+
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._by_key)
+            stats['pending_groups'] = len(self._by_group)
+            stats['heap_size'] = len(self._heap)
+        return stats
@@ -0,0 +1,108 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""Transports carry the AMQP traffic of
+:class:`aurora.dispatcher.Dispatcher`.
+
+A transport opens connections which follow the subset of pika's
+asynchronous API used by the dispatcher and the access point agents:
+``connection.channel()``, ``connection.ioloop``, ``add_timeout``,
+the channel methods used to declare queues and exchanges, consume and
+publish, and callbacks taking pika-like frames.  The same callback
+chain therefore runs over a RabbitMQ server with
+:class:`PikaTransport`, or without any server over the in-process
+broker of :mod:`aurora.local_broker`::
+
+    broker = LocalBroker()
+    dispatcher = Dispatcher(host, username, password, mysql_username,
+                            mysql_password, aurora_db,
+                            transport=LocalTransport(broker))
+
+"""
+import logging
+
+import pika
+
+from aurora.ap_provision import writer as provision
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Transport(object):
+    """Interface of a transport."""
+
+    def connect(self, host, username, password, on_connected):
+        """Starts connecting to a broker.  The connection's callbacks,
+        starting with ``on_connected(connection)``, run on the thread
+        calling ``connection.ioloop.start()``.
+
+        :param str host:
+        :param str username:
+        :param str password:
+        :param callable on_connected:
+        :returns: A connection with the interface of
+                  :class:`pika.adapters.select_connection.SelectConnection`
+
+        """
+        raise NotImplementedError()
+
+    def properties(self, **kwargs):
+        """Returns message properties, eg. ``reply_to`` and
+        ``correlation_id``, taking the keywords of
+        :class:`pika.BasicProperties`.
+
+        """
+        raise NotImplementedError()
+
+    def announce_reply_queue(self, queue):
+        """Tells access points the queue on which the manager expects
+        replies.  Does nothing by default, access points also learn it
+        from the ``reply_to`` of the messages they receive.
+
+        :param str queue:
+
+        """
+        pass
+
+    def announce_telemetry(self, queue, interval):
+        """Tells access points to push their stats to a telemetry 
+        queue every ``interval`` seconds, see 
+        :func:`aurora.ap_monitor.APMonitor.process_telemetry`.  Does 
+        nothing by default.
+
+        :param str queue:
+        :param float interval:
+
+        """
+        pass
+
+
+class PikaTransport(Transport):
+    """Connects to a RabbitMQ server with pika."""
+
+    def connect(self, host, username, password, on_connected):
+        credentials = pika.PlainCredentials(username, password)
+        return pika.SelectConnection(
+            pika.ConnectionParameters(
+                host=host,
+                credentials=credentials
+            ),
+            on_connected)
+
+    def properties(self, **kwargs):
+        return pika.BasicProperties(**kwargs)
+
+    def announce_reply_queue(self, queue):
+        """Writes the reply queue to the access point provision files,
+        which are served to access points as they start.
+
+        """
+        provision.update_reply_queue(queue)
+
+    def announce_telemetry(self, queue, interval):
+        """Writes the telemetry settings to the access point 
+        provision files.
+
+        """
+        provision.update_telemetry(queue, interval)
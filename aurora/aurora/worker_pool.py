@@ -0,0 +1,203 @@
+# 2014
+# SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith,
+#              Mike Kobierski and Hoai Phuoc Truong
+#
+"""A fixed set of worker threads, each running the tasks of the keys
+hashed to it in the order they were submitted.
+
+Work about an access point is submitted with its name as the key, so
+two access points are handled in parallel while the tasks of one
+never run concurrently or out of order::
+
+    pool = ShardedWorkerPool(workers=4, queue_size=200)
+    pool.start()
+    pool.submit('ap1', handle_reply, args=(reply,))
+    pool.stop()
+
+Each worker has a bounded queue.  Submitting to a full queue waits for
+room, or fails straight away when ``block`` is False, and both are
+counted in :func:`ShardedWorkerPool.stats`.  Stopping the pool lets
+the workers finish the tasks already queued, including those of
+submits still in progress, and rejects the tasks submitted afterwards.
+
+"""
+import logging
+import Queue
+import sys
+import threading
+import time
+import traceback
+import zlib
+
+from aurora.cls_logger import get_cls_logger
+from aurora.stop_thread import *
+
+LOGGER = logging.getLogger(__name__)
+
+# Queued to a worker to make it exit
+_STOP = object()
+
+
+def shard_of(key, shards):
+    """Returns the shard of a key, the same on every run and every
+    manager, unlike :func:`hash` of a string across Python versions.
+
+    :param key: str or unicode
+    :param int shards: Number of shards
+    :rtype: int
+
+    """
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return zlib.crc32(str(key)) % shards
+
+
+class ShardedWorkerPool(object):
+    """Runs tasks on worker threads, tasks sharing a key on the same
+    thread in submission order.
+
+    """
+    def __init__(self, workers=4, queue_size=1000):
+        """
+        :param int workers: Number of threads
+        :param int queue_size: Most tasks waiting per thread
+
+        """
+        self.LOGGER = get_cls_logger(self)
+        self._queues = [Queue.Queue(maxsize=queue_size)
+                        for i in range(workers)]
+        self._workers = []
+        self._lock = threading.Lock()
+        # Notified when no submit is in progress
+        self._idle = threading.Condition(self._lock)
+        self._submitting = 0
+        self._stopping = False
+        self._counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'blocked': 0,
+            'blocked_seconds': 0.0,
+        }
+        self._max_depths = [0] * workers
+
+    def __len__(self):
+        return len(self._queues)
+
+    def start(self):
+        """Starts the worker threads."""
+        for queue in self._queues:
+            worker = StoppableThread(target=self._run, args=(queue,))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout=None):
+        """Stops the workers once they finish the tasks already
+        queued.  Tasks submitted afterwards are rejected.
+
+        :param float timeout: Seconds to wait for each worker, None
+                              waits until it is done
+
+        """
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = True
+            # Submits past the check are queued ahead of _STOP
+            while self._submitting:
+                self._idle.wait()
+        for queue in self._queues:
+            queue.put(_STOP)
+        for worker in self._workers:
+            worker.stop()
+        self.join(timeout)
+
+    def join(self, timeout=None):
+        """Waits for the workers to exit, once :func:`stop` was called.
+
+        :param float timeout: Seconds to wait for each worker, None
+                              waits until it is done
+
+        """
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join(timeout)
+
+    def submit(self, key, task, args=(), block=True):
+        """Queues ``task(*args)`` on the worker of ``key``.
+
+        :param key: Tasks with equal keys run in order on one thread
+        :param callable task:
+        :param tuple args:
+        :param bool block: Waits for room if the worker's queue is
+                           full, otherwise the task is rejected
+        :returns: bool -- False if the task was rejected
+
+        """
+        index = shard_of(key, len(self._queues))
+        queue = self._queues[index]
+        with self._lock:
+            if self._stopping:
+                self._counters['rejected'] += 1
+                return False
+            self._submitting += 1
+        blocked = None
+        try:
+            try:
+                queue.put_nowait((task, args))
+            except Queue.Full:
+                if not block:
+                    with self._lock:
+                        self._counters['rejected'] += 1
+                    return False
+                start = time.time()
+                queue.put((task, args))
+                blocked = time.time() - start
+        finally:
+            with self._lock:
+                self._submitting -= 1
+                if not self._submitting:
+                    self._idle.notify_all()
+        depth = queue.qsize()
+        with self._lock:
+            self._counters['submitted'] += 1
+            if blocked is not None:
+                self._counters['blocked'] += 1
+                self._counters['blocked_seconds'] += blocked
+            if depth > self._max_depths[index]:
+                self._max_depths[index] = depth
+        return True
+
+    def _run(self, queue, stop_event=None):
+        while True:
+            item = queue.get()
+            if item is _STOP:
+                break
+            (task, args) = item
+            try:
+                task(*args)
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+                with self._lock:
+                    self._counters['failed'] += 1
+            else:
+                with self._lock:
+                    self._counters['completed'] += 1
+        self.LOGGER.debug("Worker caught stop event")
+
+    def stats(self):
+        """Returns a snapshot of the pool counters and of the depth of
+        each worker's queue.
+
+        :rtype: dict
+
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['max_depths'] = list(self._max_depths)
+        stats['workers'] = len(self._queues)
+        stats['depths'] = [queue.qsize() for queue in self._queues]
+        stats['pending'] = sum(stats['depths'])
+        return stats
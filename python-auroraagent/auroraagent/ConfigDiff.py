@@ -0,0 +1,53 @@
+"""ConfigDiff module hashes and diffs database states, mirroring the
+manager's aurora.config_versions module, whose apply_diff rebuilds the
+new state from the one it holds."""
+
+import json, hashlib
+
+# Header in which the manager sends the version it holds, -1 if none
+CONFIG_VERSION_HEADER = 'x-aurora-config-version'
+# Header set on messages whose config holds a diff or the full state,
+# which the manager does not drop
+CONFIG_CHANGED_HEADER = 'x-aurora-config-changed'
+# Versions kept to diff from, must match the manager's
+HISTORY = 8
+
+
+def state_hash(state):
+    """Content hash of a state, identical on the manager"""
+    return hashlib.sha1(json.dumps(state, sort_keys=True, separators=(',', ':'))).hexdigest()
+
+def known_version(headers, ap):
+    """Returns the version the manager holds of ap from the headers of
+    one of its messages, or None.  Broadcasts hold a table of versions
+    by access point name."""
+    version = (headers or {}).get(CONFIG_VERSION_HEADER)
+    if isinstance(version, dict):
+        version = version.get(ap)
+    return version
+
+def carries_changes(config):
+    """True if a config sent to the manager holds a diff or the full
+    state, not only the version and hash"""
+    return config is not None and ('diff' in config or 'init_database' in config)
+
+def diff(old, new, path=()):
+    """Returns the changes turning old into new, as a dict of 'set', a
+    list of [path, value], and 'unset', a list of paths.  Nested
+    dictionaries are compared key by key, other values are replaced
+    whole."""
+    changes = {'set': [], 'unset': []}
+    for key in old:
+        if key not in new:
+            changes['unset'].append(list(path) + [key])
+    for key, value in new.iteritems():
+        if key not in old:
+            changes['set'].append([list(path) + [key], value])
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                nested = diff(old[key], value, tuple(path) + (key,))
+                changes['set'].extend(nested['set'])
+                changes['unset'].extend(nested['unset'])
+            else:
+                changes['set'].append([list(path) + [key], value])
+    return changes
@@ -1,6 +1,7 @@
 # SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith
 
-import json, sys, exception, pprint, copy
+import json, sys, exception, pprint, copy, collections
+import ConfigDiff
 class Database:
     """Generic database for all class data.
     Format for slice data::
@@ -77,6 +78,39 @@ class Database:
         self.DEFAULT_ACTIVE_SLICE = config["default_config"]["default_active_slice"]
         
         self.hw_database = config["default_config"]["init_hardware_database"]
+
+        # Version of the state sent to the manager, bumped whenever
+        # its content hash changes, and copies of the last versions
+        # to diff from
+        self.version = 0
+        self.version_hash = None
+        self.versions = collections.OrderedDict()
+
+    def get_state(self):
+        """Returns the state sent to the manager."""
+        return {"init_database": self.database,
+                "init_user_id_database": self.user_id_data,
+                "init_hardware_database": self.hw_database}
+
+    def update_version(self):
+        """Bumps the version if the state changed since the last call.
+        Returns the version and its content hash."""
+        state = self.get_state()
+        state_hash = ConfigDiff.state_hash(state)
+        if state_hash != self.version_hash:
+            self.version += 1
+            self.version_hash = state_hash
+            self.versions[self.version] = copy.deepcopy(state)
+            while len(self.versions) > ConfigDiff.HISTORY:
+                self.versions.popitem(last=False)
+        return (self.version, self.version_hash)
+
+    def get_version_diff(self, base):
+        """Returns the changes from version base to the current 
+        version, or None if base is no longer known."""
+        if base not in self.versions:
+            return None
+        return ConfigDiff.diff(self.versions[base], self.versions[self.version])
     
     def backup_current_config(self):
         """Stores the current configuration in the backup 
@@ -0,0 +1,82 @@
+"""MessageCodec module encodes the message bodies exchanged with the
+manager, mirroring the manager's aurora.codec module.
+
+Bodies are JSON, or msgpack if the msgpack package is installed, and
+may be compressed with zlib.  The content_type and content_encoding
+AMQP properties say which; messages without them are plain JSON.
+Each side advertises what it decodes in the ACCEPT_HEADER and
+ACCEPT_ENCODING_HEADER headers, and only uses what the other side
+advertised."""
+
+import json, zlib, exception
+
+# Optional, not installed on most access points
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+DEFLATE = 'deflate'
+
+ACCEPT_HEADER = 'x-aurora-accept'
+ACCEPT_ENCODING_HEADER = 'x-aurora-accept-encoding'
+
+# Bodies shorter than this are not worth compressing
+COMPRESS_MIN_SIZE = 256
+COMPRESS_LEVEL = 6
+
+
+def content_types():
+    """Content types we decode, preferred first"""
+    if msgpack is not None:
+        return [MSGPACK, JSON]
+    return [JSON]
+
+def accept_headers():
+    """Headers advertising what we decode"""
+    return {ACCEPT_HEADER: ','.join(content_types()),
+            ACCEPT_ENCODING_HEADER: DEFLATE}
+
+def negotiate(headers, binary=False, compress=False):
+    """Returns the (content_type, content_encoding) to use for a peer
+    given the headers of its last message.  content_encoding is None
+    for uncompressed bodies."""
+    if not headers:
+        return (JSON, None)
+    accepted = headers.get(ACCEPT_HEADER, '').split(',')
+    encodings = headers.get(ACCEPT_ENCODING_HEADER, '').split(',')
+    content_type = JSON
+    if binary and MSGPACK in accepted and msgpack is not None:
+        content_type = MSGPACK
+    content_encoding = None
+    if compress and DEFLATE in encodings:
+        content_encoding = DEFLATE
+    return (content_type, content_encoding)
+
+def encode(message, content_type=JSON, content_encoding=None):
+    """Returns the body and the content encoding actually used, None if
+    the body was too short to be worth compressing"""
+    if content_type == MSGPACK and msgpack is not None:
+        body = msgpack.packb(message)
+    elif content_type in (JSON, None):
+        body = json.dumps(message)
+    else:
+        raise exception.UnsupportedEncoding(what="content type", value=content_type)
+    if content_encoding == DEFLATE and len(body) >= COMPRESS_MIN_SIZE:
+        return (zlib.compress(body, COMPRESS_LEVEL), DEFLATE)
+    return (body, None)
+
+def decode(body, content_type=None, content_encoding=None):
+    """Decompresses and deserializes a message body"""
+    if content_encoding == DEFLATE:
+        body = zlib.decompress(body)
+    elif content_encoding not in (None, '', 'identity'):
+        raise exception.UnsupportedEncoding(what="content encoding",
+                                            value=content_encoding)
+    if content_type in (None, '', JSON):
+        return json.loads(body)
+    if content_type == MSGPACK and msgpack is not None:
+        return msgpack.unpackb(body)
+    raise exception.UnsupportedEncoding(what="content type", value=content_type)
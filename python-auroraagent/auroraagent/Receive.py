@@ -6,7 +6,7 @@ received message content to SliceAgent.
 #!/usr/bin/python -tt
 # SAVI McGill: Heming Wen, Prabhat Tiwary, Kevin Han, Michael Smith
 
-import sys, json, threading, traceback, os, signal, time
+import sys, threading, traceback, os, signal, time, random
 import install_dependencies
 from pprint import pprint
 
@@ -29,8 +29,27 @@ except ImportError:
     from ifconfig import ifconfig
 
 import SliceAgent
+import MessageCodec
+import ConfigDiff
 import logging
 
+# Fanout exchange on which the manager broadcasts to all access points
+BROADCAST_EXCHANGE = 'aurora_broadcast'
+
+
+class PikaTransport():
+    """Connects to RabbitMQ with pika.  Receive takes any object with 
+    the same methods, such as the manager's in-process broker 
+    transport (aurora.local_broker.LocalTransport)."""
+
+    def connect(self, host, username, password, on_connected):
+        credentials = pika.PlainCredentials(username, password)
+        parameters = pika.ConnectionParameters(host=host, credentials=credentials)
+        return pika.SelectConnection(parameters, on_connected)
+
+    def properties(self, **kwargs):
+        return pika.BasicProperties(**kwargs)
+
 
 class Receive():
     """This class connects to RabbitMQ and receives messages containing
@@ -40,8 +59,15 @@ class Receive():
     
     def __init__(self, region, queue, config, 
                  rabbitmq_host, rabbitmq_username, 
-                 rabbitmq_password, rabbitmq_reply_queue):
-        """Connects to RabbitMQ and initializes Aurora locally."""
+                 rabbitmq_password, rabbitmq_reply_queue, transport=None,
+                 compress=True, binary=True, telemetry_queue=None,
+                 telemetry_interval=None):
+        """Connects to RabbitMQ, or through transport if given, and 
+        initializes Aurora locally.  Messages to the manager are 
+        compressed, and msgpack encoded, if compress and binary are set
+        and the manager advertises it accepts them.  If telemetry_queue
+        and telemetry_interval are set, stats are pushed to the manager
+        every telemetry_interval seconds instead of being polled."""
         
         # Run Pika logger so that error messages get printed
         logging.basicConfig()
@@ -52,10 +78,21 @@ class Receive():
         self.region = region
         self.manager_queue = rabbitmq_reply_queue
         self.channel_open = False
+        self.compress = compress
+        self.binary = binary
+        self.telemetry_queue = telemetry_queue
+        self.telemetry_interval = telemetry_interval
+        self.telemetry_sequence = 0
+        # Plain JSON until the manager tells us what it accepts
+        self.encoding = (MessageCodec.JSON, None)
+        # Config version the manager held in its last message
+        self.manager_version = None
+        if transport is None:
+            transport = PikaTransport()
+        self.transport = transport
         # Connect to RabbitMQ (Step #1)
-        credentials = pika.PlainCredentials(rabbitmq_username, rabbitmq_password)
-        self.parameters = pika.ConnectionParameters(host=rabbitmq_host, credentials=credentials)
-        self.connection = pika.SelectConnection(self.parameters, self.on_connected)
+        self.connection = self.transport.connect(rabbitmq_host, rabbitmq_username,
+                                                 rabbitmq_password, self.on_connected)
 
     
     # Step #2
@@ -86,9 +123,49 @@ class Receive():
     # Step #4
     def on_queue_declared(self, frame):
         """Called when RabbitMQ has told us our Queue has been declared, frame is the response from RabbitMQ"""
+        # Also receive messages broadcast to every access point.
+        # Positional arguments, the keyword for the exchange type
+        # differs between pika versions
+        self.channel.exchange_declare(self.on_exchange_declared,
+                                      BROADCAST_EXCHANGE, 'fanout')
+
+    # Step #4b
+    def on_exchange_declared(self, frame):
+        """Called when the broadcast exchange has been declared"""
+        self.channel.queue_bind(self.on_queue_bound, self.queue,
+                                BROADCAST_EXCHANGE)
+
+    # Step #4c
+    def on_queue_bound(self, frame):
+        """Called when our queue is bound to the broadcast exchange"""
         self.channel_open = True
         self.channel.basic_consume(self.handle_delivery, queue=self.queue, no_ack=True,)
-        
+        if self.telemetry_queue and self.telemetry_interval:
+            # Random first push so access points starting together
+            # do not push together
+            self.connection.add_timeout(random.uniform(0, self.telemetry_interval),
+                                        self.send_telemetry)
+
+    def send_telemetry(self):
+        """Pushes slice stats to the manager's telemetry queue and 
+        schedules the next push.  Runs on the ioloop thread, like 
+        handle_delivery."""
+        try:
+            self.telemetry_sequence += 1
+            data_for_sender = {'successful': True,
+                               'message': self.agent.monitor.get_stats(),
+                               'interval': self.telemetry_interval,
+                               'sequence': self.telemetry_sequence,
+                               'ap': self.queue,
+                               'config': self.build_config(self.manager_version)}
+            self.send_to_manager(data_for_sender, self.telemetry_queue)
+            # The manager holds the version pushed unless it asks for
+            # the full state, as nothing else may come from it
+            self.manager_version = data_for_sender['config']['version']
+        except Exception:
+            print " [x] Telemetry failed"
+            traceback.print_exc(file=sys.stdout)
+        self.connection.add_timeout(self.telemetry_interval, self.send_telemetry)
 
     # Step #5
     def handle_delivery(self, channel, method, header, body):
@@ -104,8 +181,11 @@ class Receive():
             self.manager_queue = header.reply_to
         
         
-        # Convert data to JSON
-        message = json.loads(body)
+        # Decode the message, and reply as the manager asks for
+        message = MessageCodec.decode(body, header.content_type,
+                                      header.content_encoding)
+        self.encoding = MessageCodec.negotiate(header.headers, self.binary,
+                                               self.compress)
 
         # Prepare JSON data to return
         data_for_sender = {'successful': False, 'message': None, 'config': None, 'ap': self.queue}
@@ -131,18 +211,56 @@ class Receive():
             data_for_sender['message'] = return_data
 
             print(" [x] Command executed")
-        data_for_sender['config'] = {}
-        data_for_sender['config']['init_database'] = self.agent.database.database
-        data_for_sender['config']['init_user_id_database'] = self.agent.database.user_id_data
-        data_for_sender['config']['init_hardware_database'] = self.agent.database.hw_database
-        data_for_sender['config']['region'] = self.region
+        # Only what changed since the version the manager holds
+        known_version = ConfigDiff.known_version(header.headers, self.queue)
+        self.manager_version = known_version
+        data_for_sender['config'] = self.build_config(known_version)
         print data_for_sender
-        data_for_sender = json.dumps(data_for_sender)
+        # Replies to a broadcast are told apart by the name of the
+        # access point, as the manager does for messages it sends us
+        correlation_id = header.correlation_id
+        if method.exchange == BROADCAST_EXCHANGE:
+            correlation_id = "%s-%s" % (self.queue, correlation_id)
         # Send response
-        self.channel.basic_publish(exchange='', routing_key=header.reply_to,
-                                    properties=pika.BasicProperties(correlation_id=header.correlation_id,
-                                                                    content_type="application/json"),
-                                    body=data_for_sender)
+        self.send_to_manager(data_for_sender, header.reply_to, correlation_id)
+
+    def build_config(self, known_version=None):
+        """Returns the config sent to the manager: only the version and 
+        hash if the manager holds known_version and it is current, 
+        the changes since known_version, or the full state when 
+        known_version is None or no longer known."""
+        database = self.agent.database
+        (version, version_hash) = database.update_version()
+        config = {'region': self.region, 'version': version, 'hash': version_hash}
+        if known_version == version:
+            return config
+        changes = None
+        if known_version is not None and known_version >= 0:
+            changes = database.get_version_diff(known_version)
+        if changes is not None:
+            config['base'] = known_version
+            config['diff'] = changes
+        else:
+            config.update(database.get_state())
+        return config
+
+    def send_to_manager(self, data_for_sender, routing_key, correlation_id=None):
+        """Encodes and sends a message to the manager's queue"""
+        (content_type, content_encoding) = self.encoding
+        (body, content_encoding) = MessageCodec.encode(data_for_sender, content_type,
+                                                       content_encoding)
+        headers = MessageCodec.accept_headers()
+        if ConfigDiff.carries_changes(data_for_sender.get('config')):
+            # Pushes are dropped when the manager is busy, unless the
+            # next ones would be diffed from what they carry
+            headers[ConfigDiff.CONFIG_CHANGED_HEADER] = True
+        self.channel.basic_publish(exchange='', routing_key=routing_key,
+                                   properties=self.transport.properties(app_id=self.queue,
+                                                                        correlation_id=correlation_id,
+                                                                        content_type=content_type,
+                                                                        content_encoding=content_encoding,
+                                                                        headers=headers),
+                                   body=body)
 
     
     
@@ -175,29 +293,16 @@ class Receive():
                            "config":{},
                            "slices_to_recreate":slices_to_recreate,
                            "ap":self.queue}
-        data_for_sender['config']['init_database'] = self.agent.database.database
-        data_for_sender['config']['init_user_id_database'] = self.agent.database.user_id_data
-        data_for_sender['config']['init_hardware_database'] = self.agent.database.hw_database
-        data_for_sender['config']['region'] = self.region
-        data_for_sender = json.dumps(data_for_sender)
-        self.channel.basic_publish(exchange='', routing_key=self.manager_queue,
-                                   properties=pika.BasicProperties(content_type="application/json"),
-                                   body=data_for_sender)
+        data_for_sender['config'] = self.build_config()
+        self.send_to_manager(data_for_sender, self.manager_queue)
         return
 
     def shutdown_signal_received(self):
-        current_database = {}
-        current_database['init_database'] = self.agent.database.database
-        current_database['init_user_id_database'] = self.agent.database.user_id_data
-        current_database['init_hardware_database'] = self.agent.database.hw_database
-        current_database['region'] = self.region
+        current_database = self.build_config()
         print "Sending current database..."
         print current_database
         data_for_sender = {'successful':True, 'message': 'FIN', 'config': current_database, 'ap': self.queue}
-        data_for_sender = json.dumps(data_for_sender)
-        self.channel.basic_publish(exchange='', routing_key=self.manager_queue,
-                                    properties=pika.BasicProperties(content_type="application/json"),
-                                    body=data_for_sender)
+        self.send_to_manager(data_for_sender, self.manager_queue)
 
 # Executed when run from the command line.
 # *** NORMAL USAGE ***        
@@ -236,6 +341,9 @@ if __name__ == '__main__':
     password = config_full['rabbitmq_password']
     rabbitmq_host = config_full['rabbitmq_host']
     rabbitmq_reply_queue = config_full['rabbitmq_reply_queue']
+    # Push stats if the manager asks for it
+    telemetry_queue = config_full.get('rabbitmq_telemetry_queue')
+    telemetry_interval = config_full.get('telemetry_interval')
     print "config"
     pprint(config)
 
@@ -245,7 +353,9 @@ if __name__ == '__main__':
     print("Joining queue %s" % queue)
     # Establish connection, start listening for commands
     receiver = Receive(region, queue, config, rabbitmq_host, 
-                       username, password, rabbitmq_reply_queue)
+                       username, password, rabbitmq_reply_queue,
+                       telemetry_queue=telemetry_queue,
+                       telemetry_interval=telemetry_interval)
 
     listener = threading.Thread(target=receiver.connection.ioloop.start)
     listener.start()
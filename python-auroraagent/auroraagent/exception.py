@@ -85,4 +85,7 @@ class NoUserIDForSlice(AuroraException):
     message = "No user id was found for the slice in question."
 
 class NotImplementedError(AuroraException):
-    message = "Functionality has not been implemented."
\ No newline at end of file
+    message = "Functionality has not been implemented."
+
+class UnsupportedEncoding(AuroraException):
+    message = "Unsupported message %(what)s %(value)s."
@@ -0,0 +1,228 @@
+"""Round trip of the config versions sent to the manager: the agent's
+Database versions its state, ConfigDiff diffs two versions and
+MessageCodec carries the diff, which the manager's
+aurora.config_versions must turn back into the same state."""
+import copy
+import inspect
+import os
+import sys
+import unittest
+
+# Since this file is for testing, add the parent directory to python
+# path, as SliceAgent_test does, and the manager's package which
+# rebuilds the configs.
+cmd_subfolder = os.path.realpath(
+    os.path.abspath(
+        os.path.join(
+            os.path.split(inspect.getfile(inspect.currentframe()))[0],
+            ".."
+        )
+    )
+)
+manager_folder = os.path.realpath(
+    os.path.join(cmd_subfolder, "..", "..", "aurora")
+)
+for folder in (cmd_subfolder, manager_folder):
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+
+import conf
+import ConfigDiff
+import MessageCodec
+from Database import Database
+from aurora import config_versions
+
+
+def build_config(database, known_version=None):
+    """Same as Receive.build_config, which cannot be imported without
+    pika."""
+    (version, version_hash) = database.update_version()
+    config = {'region': 'test', 'version': version, 'hash': version_hash}
+    if known_version == version:
+        return config
+    changes = None
+    if known_version is not None and known_version >= 0:
+        changes = database.get_version_diff(known_version)
+    if changes is not None:
+        config['base'] = known_version
+        config['diff'] = changes
+    else:
+        config.update(database.get_state())
+    return config
+
+
+class ConfigDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.database = Database(copy.deepcopy(conf.AGENT_INIT_CONFIG))
+
+    def create_slice(self, slice, user='1'):
+        self.database.database[slice] = {"VirtualInterfaces": [],
+                                         "RadioInterfaces": [],
+                                         "VirtualBridges": [{"name": "br-" + slice}]}
+        self.database.user_id_data.setdefault(user, []).append(slice)
+
+    def round_trip(self, content_type, content_encoding):
+        (base, base_hash) = self.database.update_version()
+        manager_state = copy.deepcopy(self.database.get_state())
+        self.create_slice('slice1')
+        self.database.hw_database['memory_mb'] = '128'
+        del self.database.database['default_slice']
+        (version, version_hash) = self.database.update_version()
+        self.assertEqual(version, base + 1)
+
+        changes = self.database.get_version_diff(base)
+        (body, used_encoding) = MessageCodec.encode(
+            {'config': {'version': version, 'hash': version_hash,
+                        'base': base, 'diff': changes}},
+            content_type, content_encoding)
+        config = MessageCodec.decode(body, content_type, used_encoding)['config']
+
+        state = config_versions.apply_diff(manager_state, config['diff'])
+        self.assertEqual(state, self.database.get_state())
+        self.assertEqual(ConfigDiff.state_hash(state), config['hash'])
+
+    def test_round_trip_json(self):
+        self.round_trip(MessageCodec.JSON, None)
+
+    def test_round_trip_deflate(self):
+        self.round_trip(MessageCodec.JSON, MessageCodec.DEFLATE)
+
+    def test_round_trip_msgpack(self):
+        if MessageCodec.msgpack is None:
+            return
+        self.round_trip(MessageCodec.MSGPACK, MessageCodec.DEFLATE)
+
+    def test_version_only_bumps_on_change(self):
+        (version, version_hash) = self.database.update_version()
+        self.assertEqual(self.database.update_version(), (version, version_hash))
+        self.create_slice('slice1')
+        self.assertEqual(self.database.update_version()[0], version + 1)
+
+    def test_unknown_base(self):
+        (first, first_hash) = self.database.update_version()
+        for index in range(ConfigDiff.HISTORY):
+            self.create_slice('slice%s' % index)
+            self.database.update_version()
+        self.assertEqual(self.database.get_version_diff(first), None)
+        self.assertEqual(self.database.get_version_diff(first + 1),
+                         ConfigDiff.diff(self.database.versions[first + 1],
+                                         self.database.get_state()))
+
+    def test_known_version(self):
+        header = ConfigDiff.CONFIG_VERSION_HEADER
+        self.assertEqual(ConfigDiff.known_version(None, 'ap1'), None)
+        self.assertEqual(ConfigDiff.known_version({header: 3}, 'ap1'), 3)
+        # Broadcasts hold the version of every access point
+        broadcast = {header: {'ap1': 4, 'ap2': 7}}
+        self.assertEqual(ConfigDiff.known_version(broadcast, 'ap2'), 7)
+        self.assertEqual(ConfigDiff.known_version(broadcast, 'ap3'), None)
+
+
+class ConfigVersionsTest(unittest.TestCase):
+    """Configs built by the agent, resolved by the manager."""
+
+    def setUp(self):
+        self.database = Database(copy.deepcopy(conf.AGENT_INIT_CONFIG))
+        self.versions = config_versions.ConfigVersions()
+
+    def create_slice(self, slice, user='1'):
+        self.database.database[slice] = {"VirtualInterfaces": [],
+                                         "RadioInterfaces": [],
+                                         "VirtualBridges": [{"name": "br-" + slice}]}
+        self.database.user_id_data.setdefault(user, []).append(slice)
+
+    def resolve(self, config):
+        # Sent as on the wire, so the manager holds copies
+        (body, encoding) = MessageCodec.encode({'config': config},
+                                               MessageCodec.JSON, None)
+        config = MessageCodec.decode(body, MessageCodec.JSON, encoding)
+        return self.versions.resolve('ap1', config['config'])
+
+    def assert_state(self, resolved):
+        self.assertNotEqual(resolved, None)
+        state = dict((key, resolved[key]) for key in config_versions.STATE_KEYS)
+        self.assertEqual(state, self.database.get_state())
+
+    def test_unchanged_reply(self):
+        (config, changed) = self.resolve(build_config(self.database))
+        self.assertTrue(changed)
+        version = self.versions.known_version('ap1')
+        bare = build_config(self.database, version)
+        self.assertEqual(sorted(bare), ['hash', 'region', 'version'])
+        (config, changed) = self.resolve(bare)
+        self.assertFalse(changed)
+        self.assert_state(config)
+
+    def test_diff_reply(self):
+        self.resolve(build_config(self.database))
+        base = self.versions.known_version('ap1')
+        self.create_slice('slice1')
+        del self.database.database['default_slice']
+        config = build_config(self.database, base)
+        self.assertEqual(config['base'], base)
+        (resolved, changed) = self.resolve(config)
+        self.assertTrue(changed)
+        self.assert_state(resolved)
+        self.assertEqual(self.versions.known_version('ap1'), base + 1)
+
+    def test_hash_mismatch(self):
+        self.resolve(build_config(self.database))
+        base = self.versions.known_version('ap1')
+        self.create_slice('slice1')
+        config = build_config(self.database, base)
+        config['hash'] = ConfigDiff.state_hash({'init_database': {}})
+        self.assertEqual(self.resolve(config), (None, False))
+        # Forgotten, so the next message asks for the full config
+        self.assertEqual(self.versions.known_version('ap1'), -1)
+        (resolved, changed) = self.resolve(build_config(self.database, -1))
+        self.assertTrue(changed)
+        self.assert_state(resolved)
+
+    def test_unknown_base(self):
+        self.resolve(build_config(self.database))
+        self.create_slice('slice1')
+        config = build_config(self.database, 1)
+        config['base'] = 7
+        self.assertEqual(self.resolve(config), (None, False))
+
+    def test_agent_restart(self):
+        for index in range(3):
+            self.create_slice('slice%s' % index)
+            self.resolve(build_config(self.database))
+        self.assertEqual(self.versions.known_version('ap1'), 3)
+        # A restarted agent counts versions from 1 again
+        self.database = Database(copy.deepcopy(conf.AGENT_INIT_CONFIG))
+        (resolved, changed) = self.resolve(build_config(self.database))
+        self.assertTrue(changed)
+        self.assert_state(resolved)
+        self.assertEqual(self.versions.known_version('ap1'), 1)
+        # Versions from before the restart are gone
+        self.create_slice('slice9')
+        config = build_config(self.database, 1)
+        config['base'] = 2
+        self.assertEqual(self.resolve(config), (None, False))
+
+    def test_out_of_order_version(self):
+        self.resolve(build_config(self.database))
+        self.create_slice('slice1')
+        late = build_config(self.database, 1)
+        late_state = copy.deepcopy(self.database.get_state())
+        self.create_slice('slice2')
+        self.resolve(build_config(self.database, 1))
+        self.assertEqual(self.versions.known_version('ap1'), 3)
+
+        # The reply with version 2 arrives after the one with version 3
+        (resolved, changed) = self.resolve(late)
+        self.assertFalse(changed)
+        self.assertEqual(dict((key, resolved[key])
+                              for key in config_versions.STATE_KEYS),
+                         late_state)
+        self.assertEqual(self.versions.known_version('ap1'), 3)
+        # Version 2 is held, so it can be diffed from
+        (resolved, changed) = self.resolve(build_config(self.database, 2))
+        self.assert_state(resolved)
+
+
+if __name__ == '__main__':
+    unittest.main()